@@ -1,37 +1,84 @@
 # Credits: R ! Y 4 Z
+import sys
+import config
+
+# Production mode serves on a gevent event loop; the stdlib must be patched
+# before anything else imports socket or threading
+PRODUCTION_MODE = config.PRODUCTION_SERVER or '--production' in sys.argv
+if PRODUCTION_MODE:
+    from gevent import monkey
+    monkey.patch_all()
+    import gevent
+    from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+    gevent.get_hub().threadpool.maxsize = config.WORKER_THREADS
+
 import os
+import errno
 import json
 import socket
+import platform
 import qrcode
 import secrets
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, session
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, send_from_directory, session
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.http import http_date, parse_date, parse_etags, parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Data, Epilogue
 import base64
 from io import BytesIO
 import threading
 import time
+import mimetypes
+import struct
+import zlib
+import hashlib
+import heapq
+import re
+import functools
+import cProfile
+import multiprocessing
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import quote
 import psutil
+from session_store import make_session_store
+from thumbnails import THUMBNAIL_EXTENSIONS, render_thumbnail
+from monitoring import ResourceMonitor
+from metrics import MetricsRegistry, SIZE_BUCKETS, THROUGHPUT_BUCKETS
+from profiling import SamplingProfiler
+from shared_state import Broker, BrokerManager, add_range, make_broker_listener, make_state_backend
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = secrets.token_hex(16)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Engine.IO pings every client and drops one that misses a pong, so a device
+# that goes silent is disconnected DEVICE_TIMEOUT_SECONDS after its last pong
+DEVICE_TIMEOUT_SECONDS = config.DEVICE_TIMEOUT_SECONDS
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent' if PRODUCTION_MODE else None,
+                    ping_interval=DEVICE_TIMEOUT_SECONDS // 2, ping_timeout=DEVICE_TIMEOUT_SECONDS - DEVICE_TIMEOUT_SECONDS // 2)
 
 # Simple uptime tracking - just store start time
 SERVER_START_TIME = time.time()
 
 # Configuration
+SERVER_HOST = config.SERVER_HOST
+SERVER_PORT = config.SERVER_PORT
 UPLOAD_FOLDER = 'static/uploads'
 DOWNLOAD_FOLDER = 'static/downloads'
+BLOB_FOLDER = config.BLOB_FOLDER
+DEDUP_STORAGE = config.DEDUP_STORAGE
+MAX_SEARCH_RESULTS = config.MAX_SEARCH_RESULTS
+SEARCH_INDEX_ENABLED = config.SEARCH_INDEX_ENABLED
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mp3', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv', 'wav', 'aac', 'ogg', 'ppt', 'pptx'}
 
 # Configurable settings
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['DOWNLOAD_FOLDER'] = DOWNLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 0  # 0 = No file size limit (unlimited)
+app.config['MAX_CONTENT_LENGTH'] = None  # None = No file size limit (unlimited)
 app.config['AUTH_ENABLED'] = True
 app.config['AUTH_PIN'] = '1234'  # Default PIN
 app.config['AUTO_REFRESH_INTERVAL'] = 10  # seconds
@@ -39,45 +86,874 @@ app.config['AUTO_REFRESH_INTERVAL'] = 10  # seconds
 # Create directories if they don't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
+if DEDUP_STORAGE:
+    os.makedirs(BLOB_FOLDER, exist_ok=True)
 
-# Store active connections, devices, and file events
+# Devices and events live in shared_state so every worker process sees the same ones
 active_connections = set()
-connected_devices = {}  # Store device information
-file_events = []
-device_events = []
+state_broker_address = None  # Set when shared_state is a broker shared with other processes
+shared_state = make_state_backend(event_log_path=config.EVENT_LOG_FILE)
+DEVICES_KEY = 'devices'  # Hash of device information by Socket.IO sid
+FILE_EVENTS_KEY = 'file_events'  # Event logs, numbered so clients can ask for what they missed
+DEVICE_EVENTS_KEY = 'device_events'
+CHUNKED_UPLOADS_KEY = 'chunked_uploads'  # Chunked upload progress, so any worker can take the next chunk
+MAX_FILE_EVENTS = config.MAX_FILE_EVENT_HISTORY
+MAX_DEVICE_EVENTS = config.MAX_DEVICE_HISTORY
+
+# Device list changes are batched for DEVICE_BROADCAST_WINDOW seconds and sent
+# as one devices_delta keyed by sid, with only the fields the device list shows
+DEVICE_BROADCAST_WINDOW = config.DEVICE_BROADCAST_WINDOW
+DEVICE_SUMMARY_FIELDS = ('sid', 'type', 'display_name', 'device_name', 'os_name', 'pc_username',
+                         'browser', 'browser_version', 'ip', 'connected_at', 'last_seen')
+pending_device_changes = {}  # sid -> device summary, or None when the device left
+device_broadcast_scheduled = False
+device_broadcast_lock = threading.Lock()
 
 # Session management
-active_sessions = {}  # Store active sessions with tokens
-session_tokens = {}  # Map tokens to session data
-session_counter = 0  # Counter for unique session IDs
-
-# Device status tracking
-device_last_seen = {}  # Track last activity for each device
-device_status = {}  # Track online/offline status
-
-def cleanup_offline_devices():
-    """Remove devices that haven't sent heartbeat for more than 30 seconds"""
-    current_time = datetime.now().timestamp()
-    offline_threshold = 30  # 30 seconds - much faster cleanup
-    
-    devices_to_remove = []
-    for sid, last_seen in device_last_seen.items():
-        if current_time - last_seen > offline_threshold:
-            devices_to_remove.append(sid)
-    
-    for sid in devices_to_remove:
-        if sid in connected_devices:
-            del connected_devices[sid]
-        if sid in device_last_seen:
-            del device_last_seen[sid]
-        if sid in device_status:
-            del device_status[sid]
-    
-    if devices_to_remove:
-        # Broadcast updated devices list
-        socketio.emit('devices_update', list(connected_devices.values()))
+SESSION_TIMEOUT = config.SESSION_TIMEOUT
+MAX_SESSIONS = config.MAX_SESSIONS
+session_store = make_session_store(config.SESSION_STORE, SESSION_TIMEOUT, MAX_SESSIONS, config.SESSION_DB_PATH)
 
-def get_local_ip():
+# Presence of this process's devices: when each one times out unless its
+# connection is still up, on the monotonic clock
+presence_deadlines = {}  # sid -> deadline
+presence_heap = []  # (deadline, sid); entries no longer in presence_deadlines are skipped
+presence_lock = threading.Lock()
+
+# Chunked uploads in progress
+chunked_uploads = {}  # upload_id -> upload state
+chunked_uploads_lock = threading.Lock()
+CHUNK_SIZE = 8 * 1024 * 1024  # 8MB chunks suggested to clients
+CHUNK_WRITE_BUFFER = config.UPLOAD_BUFFER_SIZE  # Bytes read from the request stream per write
+UPLOAD_MAX_BYTES = config.MAX_FILE_SIZE_MB * 1024 * 1024 or None  # Per-file cap, None = unlimited
+UPLOAD_TIMEOUT = config.UPLOAD_TIMEOUT  # Seconds a multipart upload may take to arrive
+UPLOAD_PREALLOCATE = config.UPLOAD_PREALLOCATE and hasattr(os, 'posix_fallocate')
+MAX_FORM_FIELD_SIZE = 64 * 1024  # Plain form fields sent alongside upload files
+UPLOAD_MIN_FREE_BYTES = config.UPLOAD_MIN_FREE_MB * 1024 * 1024  # Uploads that would leave less free disk space are refused
+CHUNKED_UPLOAD_EXPIRY = 86400  # Drop unfinished uploads idle for 24 hours
+PART_FILE_SUFFIX = '.part'
+
+# Download delivery
+DOWNLOAD_READ_SIZE = 256 * 1024  # Bytes per read when streaming a file range
+SENDFILE_CHUNK_SIZE = 8 * 1024 * 1024  # Bytes per os.sendfile() call, so one download can't hog the event loop
+MAX_DOWNLOAD_RANGES = 32  # Larger multi-range requests get the full file instead
+
+# Streaming ZIP downloads
+ZIP_READ_SIZE = 1024 * 1024  # Bytes read from each source file at a time
+ZIP_COMPRESSION_LEVEL = 6
+ZIP_STORED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mp3', 'zip', 'rar', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv', 'aac', 'ogg', 'docx', 'xlsx', 'pptx'}  # Already compressed
+ZIP_PARALLEL_DEFLATE = True  # Deflate large files on several threads
+ZIP_PARALLEL_MIN_SIZE = 16 * 1024 * 1024  # Files smaller than this deflate on one thread
+ZIP_DEFLATE_WORKERS = os.cpu_count() or 2
+zip_deflate_executor = None  # Created on first parallel deflate
+
+# Image thumbnails - rendered on a process pool, cached on disk by content hash and size
+THUMBNAILS_ENABLED = config.ENABLE_FILE_PREVIEW
+THUMBNAIL_FOLDER = config.THUMBNAIL_FOLDER
+THUMBNAIL_SIZE = config.THUMBNAIL_SIZE
+THUMBNAIL_WORKERS = config.THUMBNAIL_WORKERS
+THUMBNAIL_TIMEOUT = 30  # seconds a thumbnail request waits for rendering
+thumbnail_executor = None  # Created on first thumbnail
+thumbnail_jobs = {}  # (folder, filename) -> (mtime, size_bytes, future of the thumbnail path)
+thumbnail_lock = threading.Lock()
+
+# Resource monitoring - psutil samples in ring buffers, threshold alerts over Socket.IO
+MONITORING_ENABLED = config.ENABLE_MONITORING
+MONITORING_INTERVAL = config.MONITORING_INTERVAL
+MONITORING_HISTORY = config.MONITORING_HISTORY
+MONITORING_THRESHOLDS = {'cpu': config.ALERT_THRESHOLD_CPU, 'memory': config.ALERT_THRESHOLD_MEMORY, 'disk': config.ALERT_THRESHOLD_DISK}
+resource_monitor = None  # ResourceMonitor, created when monitoring starts
+
+# Request metrics - per-route latency, bytes and throughput plus Socket.IO traffic, served at /metrics
+REQUEST_METRICS_ENABLED = config.ENABLE_REQUEST_METRICS
+TRANSFER_MIN_BYTES = 64 * 1024  # Request and response bodies this big count as transfers
+metrics_registry = MetricsRegistry()
+request_duration = metrics_registry.histogram(
+    'simpleshare_http_request_duration_seconds', 'Time from receiving a request until its response body was sent',
+    ('route', 'method', 'status'))
+requests_in_flight = metrics_registry.gauge(
+    'simpleshare_http_requests_in_flight', 'Requests being handled or still sending their response', ('route',))
+request_bytes = metrics_registry.counter(
+    'simpleshare_http_request_bytes_total', 'Request body bytes received', ('route',))
+response_bytes = metrics_registry.counter(
+    'simpleshare_http_response_bytes_total', 'Response body bytes sent', ('route',))
+transfers_in_flight = metrics_registry.gauge(
+    'simpleshare_transfers_in_flight', 'Uploads and downloads of at least 64 KiB in progress', ('direction',))
+transfer_throughput = metrics_registry.histogram(
+    'simpleshare_transfer_bytes_per_second', 'Throughput of uploads and downloads of at least 64 KiB',
+    ('route', 'direction'), THROUGHPUT_BUCKETS)
+socketio_emits = metrics_registry.counter(
+    'simpleshare_socketio_emits_total', 'Socket.IO events emitted, counted once however many clients get them', ('event',))
+socketio_packet_bytes = metrics_registry.histogram(
+    'simpleshare_socketio_packet_bytes', 'Size of Socket.IO event packets sent to each client', ('event',), SIZE_BUCKETS)
+
+# Profiling - sampling profiler started through the admin API and cProfile of single
+# requests sent with PROFILE_HEADER; results are written to TEMP_FOLDER
+PROFILING_ENABLED = config.ENABLE_PROFILING
+TEMP_FOLDER = config.TEMP_FOLDER
+PROFILER_MAX_SECONDS = config.PROFILER_MAX_SECONDS
+PROFILER_DEFAULT_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_HEADER = 'X-SimpleShare-Profile'
+PROFILE_FILE_HEADER = 'X-SimpleShare-Profile-File'
+sampling_profiler = None
+if PROFILING_ENABLED:
+    os.makedirs(TEMP_FOLDER, exist_ok=True)
+    sampling_profiler = SamplingProfiler(TEMP_FOLDER)
+request_profile_lock = threading.Lock()  # cProfile hooks the whole thread, so one profiled request at a time
+
+# System info - sampled in the background, served and pushed from memory
+SYSTEM_INFO_INTERVAL = config.SYSTEM_INFO_UPDATE_INTERVAL
+SYSTEM_INFO_ROOM = 'system_info'  # Socket.IO room of clients that get each changed snapshot
+SYSTEM_PLATFORM = {'os': platform.system(), 'os_version': platform.version(), 'hostname': platform.node()}
+system_info_snapshot = None  # {'info', 'json', 'etag'} of the latest sample
+system_info_lock = threading.Lock()
+
+# Server page cache - URL, QR code and rendered index page, rebuilt when the IP changes
+server_page_cache = {}
+server_page_lock = threading.Lock()
+NETWORK_WATCH_INTERVAL = 5  # seconds between local IP checks
+
+# Upload digests - SHA-256 and CRC32, computed while uploads stream to disk
+DIGEST_LENGTHS = {'sha256': 64, 'crc32': 8}  # Hex digits of each digest
+DIGEST_XATTR = 'user.simpleshare.digests'  # Extended attribute holding a file's digests
+file_digests = {}  # (folder, filename) -> digests with the size and mtime they belong to
+UPLOAD_HASH_WORKERS = os.cpu_count() or 2
+upload_hash_executor = None  # Created on first upload
+
+# Batch uploads - many small files in one multipart request, announced as one event
+BATCH_OPERATIONS_ENABLED = config.ENABLE_BATCH_OPERATIONS
+BATCH_UPLOAD_MAX_FILES = config.BATCH_UPLOAD_MAX_FILES
+BATCH_UPLOAD_MAX_BYTES = config.BATCH_UPLOAD_MAX_MB * 1024 * 1024  # Clients keep each request under this
+BATCH_UPLOAD_CONCURRENCY = config.BATCH_UPLOAD_CONCURRENCY  # Requests a client keeps in flight
+
+# Content-addressed blob store - shared-folder files are hard links to blobs
+blob_inodes = {}  # blob inode -> SHA-256 digest
+blob_stats = {}  # digest -> (size, mtime in ns) of the blob when it was stored or last verified
+blob_lock = threading.Lock()
+# A duplicate upload is a link to an older blob, so it shares that blob's mtime;
+# the time each such link was added is kept here and in REFERENCES_FILE
+REFERENCES_FILE = os.path.join(BLOB_FOLDER, 'references.json')
+reference_times = {}  # 'folder/filename' -> (inode, upload time)
+reference_times_mtime = None  # mtime (ns) of REFERENCES_FILE when last read
+reference_lock = threading.Lock()
+
+# File catalog - in-memory metadata for both shared folders
+file_catalog = {UPLOAD_FOLDER: {}, DOWNLOAD_FOLDER: {}}  # folder -> {filename: entry}
+catalog_folder_mtimes = {}  # folder -> directory mtime (ns) at last scan
+catalog_lock = threading.Lock()
+CATALOG_WATCH_INTERVAL = 2  # seconds between folder checks for out-of-band changes
+CATALOG_FULL_RESCAN_INTERVAL = 300  # seconds between full resyncs as a safety net
+catalog_sequence = 0  # Bumped on every catalog change
+catalog_changes = deque(maxlen=1000)  # Recent changes for delta sync; older clients get a snapshot
+FILES_ROOM = 'files'  # Socket.IO room of clients subscribed to file list deltas
+FILES_PAGE_SIZE = 100  # Default page size when paginating /api/files
+MAX_FILES_PAGE_SIZE = 1000
+FILE_SORT_KEYS = {
+    'name': lambda entry: entry['name'].lower(),
+    'size': lambda entry: entry['size_bytes'],
+    'mtime': lambda entry: entry['mtime']
+}
+catalog_sort_index = {sort: [] for sort in FILE_SORT_KEYS}  # sort -> sorted [(value, folder, name)]
+
+# Search index over filename tokens, extensions and dates (guarded by catalog_lock)
+search_postings = {}  # token -> {(folder, name)}
+search_doc_tokens = {}  # (folder, name) -> tokens indexed for that file
+search_vocabulary = []  # Sorted tokens, for prefix lookups
+search_trigrams = {}  # trigram -> {token}, for substring and fuzzy lookups
+SEARCH_TOKEN_PATTERN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')  # Splits IMG_2024_holiday and camelCase
+SEARCH_DATE_PATTERN = re.compile(r'\b(\d{4})-(\d{2})(?:-(\d{2}))?\b')
+SEARCH_SCORES = {'exact': 1.0, 'prefix': 0.75, 'substring': 0.5, 'fuzzy': 0.4}
+SEARCH_FUZZY_MIN_LENGTH = 5  # Shorter query tokens, and numbers, get no typo tolerance
+
+def run_blocking(func, *args):
+    """Run blocking disk I/O on the worker thread pool in production mode so the event loop keeps serving"""
+    if PRODUCTION_MODE:
+        return gevent.get_hub().threadpool.apply(func, args)
+    return func(*args)
+
+def make_catalog_entry(folder, filename, stat):
+    """Build a catalog entry from a stat result"""
+    return {
+        'name': filename,
+        'size_bytes': stat.st_size,
+        'mtime': reference_mtime(folder, filename, stat),  # When it was added, for sorting and cleanup
+        'file_mtime': stat.st_mtime,
+        'extension': filename.rsplit('.', 1)[1].lower() if '.' in filename else 'unknown',
+        'source': 'phone' if folder == UPLOAD_FOLDER else 'pc',
+        'folder': folder,
+        'digest': linked_blob_digest(stat)
+    }
+
+def reference_mtime(folder, filename, stat):
+    """When a shared file was added: its upload time if it links to an older blob, else its mtime"""
+    record = reference_times.get(f'{folder}/{filename}')
+    if record and record[0] == stat.st_ino:
+        return record[1]
+    return stat.st_mtime
+
+def refresh_reference_times():
+    """Reread REFERENCES_FILE if it changed, e.g. written by another worker"""
+    global reference_times, reference_times_mtime
+    if not DEDUP_STORAGE:
+        return
+    try:
+        mtime = os.stat(REFERENCES_FILE).st_mtime_ns
+        if mtime == reference_times_mtime:
+            return
+        with open(REFERENCES_FILE) as f:
+            records = {key: tuple(record) for key, record in json.load(f).items()}
+    except FileNotFoundError:
+        mtime, records = None, {}
+    except (OSError, ValueError) as e:
+        print(f"Error reading {REFERENCES_FILE}: {e}")
+        return
+    reference_times, reference_times_mtime = records, mtime
+
+def update_reference_times(changes):
+    """Apply {'folder/filename': (inode, upload time), or None to forget it} and save the result"""
+    global reference_times, reference_times_mtime
+    with reference_lock:
+        refresh_reference_times()  # Keep what other workers recorded
+        records = dict(reference_times)
+        for key, record in changes.items():
+            if record:
+                records[key] = record
+            else:
+                records.pop(key, None)
+        temp_path = f"{REFERENCES_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(records, f)
+        os.replace(temp_path, REFERENCES_FILE)
+        reference_times, reference_times_mtime = records, os.stat(REFERENCES_FILE).st_mtime_ns
+
+def linked_blob_digest(stat):
+    """Digest of the blob a shared file is a link to, unless it was edited in place since"""
+    digest = blob_inodes.get(stat.st_ino)
+    if digest and blob_stats.get(digest, (stat.st_size, stat.st_mtime_ns)) != (stat.st_size, stat.st_mtime_ns):
+        return None
+    return digest
+
+def scan_folder(folder):
+    """Read metadata for every regular file in a folder"""
+    entries = {}
+    if not os.path.exists(folder):
+        return entries
+    refresh_reference_times()
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.name.endswith(PART_FILE_SUFFIX):
+                continue  # Chunked upload still in progress
+            try:
+                if entry.is_file():
+                    entries[entry.name] = make_catalog_entry(folder, entry.name, entry.stat())
+            except FileNotFoundError:
+                continue  # Removed while scanning
+    return entries
+
+def get_folder_mtime(folder):
+    """Directory mtime in nanoseconds, or None if the folder is missing"""
+    try:
+        return os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def index_entry(entry):
+    """Add an entry to every sort index and the search index; call while holding catalog_lock"""
+    for sort, key in FILE_SORT_KEYS.items():
+        insort(catalog_sort_index[sort], (key(entry), entry['folder'], entry['name']))
+    if SEARCH_INDEX_ENABLED:
+        search_index_add(entry)
+
+def unindex_entry(entry):
+    """Remove an entry from every sort index and the search index; call while holding catalog_lock"""
+    for sort, key in FILE_SORT_KEYS.items():
+        index = catalog_sort_index[sort]
+        item = (key(entry), entry['folder'], entry['name'])
+        position = bisect_left(index, item)
+        if position < len(index) and index[position] == item:
+            del index[position]
+    if SEARCH_INDEX_ENABLED:
+        search_index_remove(entry)
+
+def rebuild_sort_index():
+    """Rebuild the sort and search indexes from scratch; call while holding catalog_lock"""
+    global search_vocabulary
+    entries = list(file_catalog[UPLOAD_FOLDER].values()) + list(file_catalog[DOWNLOAD_FOLDER].values())
+    for sort, key in FILE_SORT_KEYS.items():
+        catalog_sort_index[sort] = sorted((key(entry), entry['folder'], entry['name']) for entry in entries)
+    
+    if SEARCH_INDEX_ENABLED:
+        search_postings.clear()
+        search_doc_tokens.clear()
+        search_trigrams.clear()
+        for entry in entries:
+            key = (entry['folder'], entry['name'])
+            tokens = search_doc_tokens[key] = get_entry_search_tokens(entry)
+            for token in tokens:
+                search_postings.setdefault(token, set()).add(key)
+        search_vocabulary = sorted(search_postings)
+        for token in search_vocabulary:
+            for trigram in get_trigrams(token):
+                search_trigrams.setdefault(trigram, set()).add(token)
+
+def tokenize_search_text(text):
+    """Lowercase search tokens of a filename or query: IMG_2024_holiday -> img, 2024, holiday"""
+    return [token.lower() for token in SEARCH_TOKEN_PATTERN.findall(text)]
+
+def get_entry_search_tokens(entry):
+    """Tokens a file is findable by: name parts, extension and modification date as YYYYMMDD"""
+    stem = entry['name'].rsplit('.', 1)[0] if '.' in entry['name'] else entry['name']
+    tokens = set(tokenize_search_text(stem))
+    tokens.add(entry['extension'])
+    tokens.add(datetime.fromtimestamp(entry['mtime']).strftime('%Y%m%d'))
+    return frozenset(tokens)
+
+def get_trigrams(token):
+    """Trigrams of a token padded with $ at both ends, so short tokens get some too"""
+    padded = f'${token}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def search_index_add(entry):
+    """Index a file's tokens; call while holding catalog_lock"""
+    key = (entry['folder'], entry['name'])
+    tokens = search_doc_tokens[key] = get_entry_search_tokens(entry)
+    for token in tokens:
+        postings = search_postings.get(token)
+        if postings is None:
+            postings = search_postings[token] = set()
+            insort(search_vocabulary, token)
+            for trigram in get_trigrams(token):
+                search_trigrams.setdefault(trigram, set()).add(token)
+        postings.add(key)
+
+def search_index_remove(entry):
+    """Drop a file from the search index, and any tokens only it had; call while holding catalog_lock"""
+    key = (entry['folder'], entry['name'])
+    for token in search_doc_tokens.pop(key, ()):
+        postings = search_postings.get(token)
+        if postings is None:
+            continue
+        postings.discard(key)
+        if postings:
+            continue
+        del search_postings[token]
+        position = bisect_left(search_vocabulary, token)
+        if position < len(search_vocabulary) and search_vocabulary[position] == token:
+            del search_vocabulary[position]
+        for trigram in get_trigrams(token):
+            tokens = search_trigrams.get(trigram)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del search_trigrams[trigram]
+
+def within_edit_distance(a, b, max_distance):
+    """Whether a and b are at most max_distance insertions, deletions or substitutions apart"""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return previous[-1] <= max_distance
+
+def match_search_token(query_token):
+    """Indexed tokens matching one query token, mapped to the best score for each"""
+    matches = {}
+    if query_token in search_postings:
+        matches[query_token] = SEARCH_SCORES['exact']
+    
+    position = bisect_left(search_vocabulary, query_token)
+    while position < len(search_vocabulary) and search_vocabulary[position].startswith(query_token):
+        matches.setdefault(search_vocabulary[position], SEARCH_SCORES['prefix'])
+        position += 1
+    
+    if len(query_token) >= 3:
+        # Every trigram inside the query token must occur in a token containing it
+        inner = [query_token[i:i + 3] for i in range(len(query_token) - 2)]
+        candidates = None
+        for trigram in sorted(inner, key=lambda t: len(search_trigrams.get(t, ()))):
+            tokens = search_trigrams.get(trigram)
+            if not tokens:
+                candidates = set()
+                break
+            candidates = set(tokens) if candidates is None else candidates & tokens
+            if not candidates:
+                break
+        for token in candidates or ():
+            if query_token in token:
+                matches.setdefault(token, SEARCH_SCORES['substring'])
+    
+    if len(query_token) >= SEARCH_FUZZY_MIN_LENGTH and query_token.isalpha():
+        # One edit changes at most three padded trigrams, two edits six
+        max_distance = 1 if len(query_token) < 8 else 2
+        trigrams = get_trigrams(query_token)
+        shared = {}
+        for trigram in trigrams:
+            for token in search_trigrams.get(trigram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        needed = len(trigrams) - 3 * max_distance
+        for token, count in shared.items():
+            if count >= needed and token not in matches and within_edit_distance(query_token, token, max_distance):
+                matches[token] = SEARCH_SCORES['fuzzy']
+    return matches
+
+def search_index_query(query):
+    """Files matching every token of query, mapped to a relevance score; call while holding catalog_lock.
+    
+    Each query token matches indexed tokens exactly, by prefix, as a substring or
+    within a small edit distance. Dates like 2024-06-01 or 2024-06 match the
+    modification date.
+    """
+    query = SEARCH_DATE_PATTERN.sub(lambda m: ''.join(part for part in m.groups() if part), query)
+    query_tokens = list(dict.fromkeys(tokenize_search_text(query)))
+    if not query_tokens:
+        return {}
+    
+    per_token = []
+    for query_token in query_tokens:
+        tiers = {}
+        for token, score in match_search_token(query_token).items():
+            tiers.setdefault(score, []).append(search_postings[token])
+        # Best tier first, so a file keeps the best of several matching tokens
+        scores = {}
+        for score in sorted(tiers, reverse=True):
+            keys = set().union(*tiers[score])
+            keys.difference_update(scores)
+            scores.update(dict.fromkeys(keys, score))
+        if not scores:
+            return {}
+        per_token.append(scores)
+    
+    per_token.sort(key=len)
+    results = per_token[0]
+    for scores in per_token[1:]:
+        results = {key: score + scores[key] for key, score in results.items() if key in scores}
+        if not results:
+            break
+    return results
+
+def record_catalog_change(op, folder, filename, entry=None):
+    """Log a catalog change with the next sequence number; call while holding catalog_lock"""
+    global catalog_sequence
+    catalog_sequence += 1
+    change = {'seq': catalog_sequence, 'op': op, 'folder': folder, 'name': filename}
+    if entry is not None:
+        change['file'] = catalog_entry_to_dict(entry)
+    catalog_changes.append(change)
+    return change
+
+def emit_catalog_changes(changes):
+    """Push catalog changes to clients subscribed to the file list.
+    
+    Sequence numbers are per process, so deltas only go to this process's own
+    clients; other workers pick the change up from the folder and send their own.
+    """
+    if len(changes) > catalog_changes.maxlen:
+        # Cheaper for clients to resubscribe and take a snapshot
+        socketio.emit('files_reset', {'seq': changes[-1]['seq']}, to=FILES_ROOM, ignore_queue=True)
+    elif changes:
+        socketio.emit('files_delta', {'seq': changes[-1]['seq'], 'changes': changes}, to=FILES_ROOM, ignore_queue=True)
+
+def catalog_rescan(folder=None):
+    """Rebuild the catalog for one folder, or both when folder is None"""
+    global catalog_sequence
+    if DEDUP_STORAGE and folder is None:
+        collect_garbage_blobs()
+    folders = [folder] if folder else [UPLOAD_FOLDER, DOWNLOAD_FOLDER]
+    changes = []
+    for folder in folders:
+        dir_mtime = get_folder_mtime(folder)
+        entries = scan_folder(folder)
+        with catalog_lock:
+            old_entries = file_catalog[folder]
+            first_scan = folder not in catalog_folder_mtimes
+            file_catalog[folder] = entries
+            catalog_folder_mtimes[folder] = dir_mtime
+            if first_scan:
+                # No client can hold an older list yet, so skip per-file history
+                rebuild_sort_index()
+                catalog_sequence += 1
+                continue
+            added, removed = [], []
+            for filename, entry in entries.items():
+                old = old_entries.get(filename)
+                if old is None:
+                    changes.append(record_catalog_change('add', folder, filename, entry))
+                    added.append(entry)
+                elif (old['size_bytes'], old['mtime'], old['file_mtime']) != (entry['size_bytes'], entry['mtime'], entry['file_mtime']):
+                    changes.append(record_catalog_change('modify', folder, filename, entry))
+                    removed.append(old)
+                    added.append(entry)
+                elif 'api' in old:
+                    entry['api'] = old['api']
+            for filename, old in old_entries.items():
+                if filename not in entries:
+                    changes.append(record_catalog_change('remove', folder, filename))
+                    removed.append(old)
+            if len(added) + len(removed) > len(entries) // 10:
+                rebuild_sort_index()
+            else:
+                # A few out-of-band changes: patch the indexes instead of rebuilding them
+                for entry in removed:
+                    unindex_entry(entry)
+                for entry in added:
+                    index_entry(entry)
+    emit_catalog_changes(changes)
+
+def catalog_add(folder, filename):
+    """Add or refresh a single file in the catalog"""
+    return catalog_add_many(folder, [filename])[0]
+
+def catalog_add_many(folder, filenames):
+    """Add or refresh files of one folder, sent to clients as a single files_delta.
+    
+    Returns their entries in order, None for a file that has disappeared.
+    """
+    entries = []
+    refresh_reference_times()
+    for filename in filenames:
+        try:
+            entries.append(make_catalog_entry(folder, filename, os.stat(os.path.join(folder, filename))))
+        except FileNotFoundError:
+            catalog_remove(folder, filename)
+            entries.append(None)
+    changes = []
+    with catalog_lock:
+        for entry in entries:
+            if entry is None:
+                continue
+            old = file_catalog[folder].get(entry['name'])
+            if old:
+                unindex_entry(old)
+            op = 'modify' if old else 'add'
+            file_catalog[folder][entry['name']] = entry
+            index_entry(entry)
+            changes.append(record_catalog_change(op, folder, entry['name'], entry))
+        # Our own change, so the watcher doesn't need to rescan the folder
+        catalog_folder_mtimes[folder] = get_folder_mtime(folder)
+    if changes:
+        emit_catalog_changes(changes)
+    return entries
+
+def catalog_remove(folder, filename):
+    """Drop a single file from the catalog"""
+    change = None
+    with catalog_lock:
+        entry = file_catalog[folder].pop(filename, None)
+        thumbnail_jobs.pop((folder, filename), None)
+        file_digests.pop((folder, filename), None)
+        if entry is not None:
+            unindex_entry(entry)
+            change = record_catalog_change('remove', folder, filename)
+        catalog_folder_mtimes[folder] = get_folder_mtime(folder)
+    if change:
+        emit_catalog_changes([change])
+    if f'{folder}/{filename}' in reference_times:
+        update_reference_times({f'{folder}/{filename}': None})
+    return entry
+
+def catalog_changes_since(since):
+    """Changes after sequence number since, or None if the history no longer reaches back that far"""
+    with catalog_lock:
+        if since is None or since > catalog_sequence:
+            return None
+        if since == catalog_sequence:
+            return []
+        if not catalog_changes or catalog_changes[0]['seq'] > since + 1:
+            return None
+        return [change for change in catalog_changes if change['seq'] > since]
+
+def encode_file_cursor(sort, order, item):
+    """Opaque pagination cursor for a sort index item, tied to the sort and order it came from"""
+    return base64.urlsafe_b64encode(json.dumps([sort, order, *item]).encode()).decode()
+
+def is_cursor_number(value):
+    """Whether a decoded cursor value is an int or float (JSON true/false are not)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def decode_file_cursor(cursor, sort, order):
+    """Turn a pagination cursor back into a sort index item of that sort and order.
+    
+    Raises ValueError if it is malformed, from another sort or order, or its
+    value can't be compared with that index: a name sorts by str, size and
+    mtime by number, relevance by a (score, mtime) pair of numbers.
+    """
+    try:
+        cursor_sort, cursor_order, value, folder, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if sort == 'name':
+        valid = isinstance(value, str)
+    elif sort == 'relevance':
+        valid = isinstance(value, list) and len(value) == 2 and all(is_cursor_number(part) for part in value)
+        value = tuple(value) if valid else value
+    else:
+        valid = is_cursor_number(value)
+    if (not valid or (cursor_sort, cursor_order) != (sort, order)
+            or not isinstance(folder, str) or not isinstance(name, str)):
+        raise ValueError('Invalid cursor')
+    return (value, folder, name)
+
+def catalog_page(sort='mtime', order='desc', cursor=None, limit=None, match=None, fields=None):
+    """One page of files in sort order, starting after cursor.
+    
+    Walks the pre-sorted index, so a page costs O(log n + limit) when unfiltered.
+    match optionally filters entries. Returns the page with the catalog sequence
+    it was taken at, so clients can follow up with deltas.
+    """
+    with catalog_lock:
+        page = page_sorted_index(catalog_sort_index[sort], sort, order, cursor, limit, match, fields)
+        page['total'] = None if match else len(catalog_sort_index[sort])
+        return page
+
+def catalog_search(query, cursor=None, limit=None, match=None, fields=None):
+    """One page of search results, best match first and newest first among equals.
+    
+    Scores come from the search index; match optionally filters the hits further.
+    Same page shape as catalog_page(), with the total number of hits.
+    """
+    with catalog_lock:
+        index = []
+        for (folder, name), score in search_index_query(query).items():
+            entry = file_catalog[folder][name]
+            if match is None or match(entry):
+                index.append(((score, entry['mtime']), folder, name))
+        index.sort()
+        page = page_sorted_index(index, 'relevance', 'desc', cursor, limit, None, fields)
+        page['total'] = len(index)
+        return page
+
+def page_sorted_index(index, sort, order, cursor, limit, match, fields):
+    """Walk a sorted [(value, folder, name)] index from cursor; call while holding catalog_lock"""
+    if order == 'asc':
+        start = bisect_right(index, cursor) if cursor else 0
+        positions = range(start, len(index))
+    else:
+        start = bisect_left(index, cursor) if cursor else len(index)
+        positions = range(start - 1, -1, -1)
+    
+    files = []
+    last_item = None
+    has_more = False
+    for position in positions:
+        item = index[position]
+        entry = file_catalog[item[1]][item[2]]
+        if match and not match(entry):
+            continue
+        if limit is not None and len(files) >= limit:
+            has_more = True
+            break
+        files.append(catalog_entry_to_dict(entry, fields))
+        last_item = item
+    
+    return {
+        'seq': catalog_sequence,
+        'files': files,
+        'next_cursor': encode_file_cursor(sort, order, last_item) if has_more else None
+    }
+
+def parse_page_args(max_limit, default_sort='mtime', sorts=FILE_SORT_KEYS):
+    """Read sort, order, cursor, limit and fields query parameters; raises ValueError on bad input"""
+    sort = request.args.get('sort', default_sort)
+    order = request.args.get('order', 'desc')
+    if sort not in sorts:
+        raise ValueError(f"Unknown sort '{sort}'")
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"Unknown order '{order}'")
+    if sort == 'relevance':
+        order = 'desc'  # Best match first, whatever was asked
+    
+    cursor = request.args.get('cursor')
+    cursor = decode_file_cursor(cursor, sort, order) if cursor else None
+    
+    limit = request.args.get('limit')
+    limit = min(max(int(limit), 1), max_limit) if limit else max_limit
+    
+    fields = request.args.get('fields')
+    if fields:
+        fields = [field for field in fields.split(',') if field]
+        unknown = [field for field in fields if field not in FILE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return sort, order, cursor, limit, fields or None
+
+def catalog_lookup(filename):
+    """Find a file in the catalog, preferring the downloads folder like download_file()"""
+    with catalog_lock:
+        return file_catalog[DOWNLOAD_FOLDER].get(filename) or file_catalog[UPLOAD_FOLDER].get(filename)
+
+def catalog_lookup_in(folder, filename):
+    """Find a file in one folder of the catalog"""
+    with catalog_lock:
+        return file_catalog[folder].get(filename)
+
+def catalog_files():
+    """Snapshot of all catalog entries, uploads first then downloads"""
+    with catalog_lock:
+        return list(file_catalog[UPLOAD_FOLDER].values()) + list(file_catalog[DOWNLOAD_FOLDER].values())
+
+def catalog_counts():
+    """Number of files in the uploads and downloads folders"""
+    with catalog_lock:
+        return len(file_catalog[UPLOAD_FOLDER]), len(file_catalog[DOWNLOAD_FOLDER])
+
+def check_catalog_folders():
+    """Rescan any folder whose directory mtime changed (files added or removed out-of-band)"""
+    for folder in [UPLOAD_FOLDER, DOWNLOAD_FOLDER]:
+        if get_folder_mtime(folder) != catalog_folder_mtimes.get(folder):
+            catalog_rescan(folder)
+
+FILE_FIELDS = ('name', 'size', 'size_bytes', 'icon', 'modified', 'mtime', 'extension', 'source', 'folder', 'thumbnail',
+               'sha256', 'crc32')
+
+def catalog_entry_to_dict(entry, fields=None):
+    """Convert a catalog entry to the /api/files JSON shape, optionally only some fields.
+    
+    The full dict is built once per entry and reused; entries are replaced, not
+    mutated, when a file changes.
+    """
+    file_dict = entry.get('api')
+    if file_dict is None:
+        file_dict = {
+            'name': entry['name'],
+            'size': format_file_size(entry['size_bytes']),
+            'size_bytes': entry['size_bytes'],
+            'icon': get_file_icon(entry['name']),
+            'modified': datetime.fromtimestamp(entry['mtime']).strftime('%Y-%m-%d %H:%M:%S'),
+            'mtime': entry['mtime'],
+            'extension': entry['extension'],
+            'source': entry['source'],
+            'folder': entry['folder'],
+            'thumbnail': get_thumbnail_url(entry)
+        }
+        file_dict.update(load_file_digests(entry) or dict.fromkeys(DIGEST_LENGTHS))
+        entry['api'] = file_dict
+    if fields:
+        return {field: file_dict[field] for field in fields}
+    return file_dict
+
+def start_catalog_watcher():
+    """Start the background thread that picks up files dropped into the folders directly"""
+    def watch_folders():
+        last_full_rescan = time.time()
+        while True:
+            try:
+                if time.time() - last_full_rescan > CATALOG_FULL_RESCAN_INTERVAL:
+                    catalog_rescan()
+                    last_full_rescan = time.time()
+                else:
+                    check_catalog_folders()
+            except Exception as e:
+                print(f"Error watching folders: {e}")
+            time.sleep(CATALOG_WATCH_INTERVAL)
+
+    watcher_thread = threading.Thread(target=watch_folders, daemon=True)
+    watcher_thread.start()
+    return watcher_thread
+
+def get_connected_devices():
+    """Devices connected to any worker"""
+    return shared_state.hvalues(DEVICES_KEY)
+
+def device_summary(device_info):
+    """The fields of a device that the device list shows"""
+    return {field: device_info.get(field) for field in DEVICE_SUMMARY_FIELDS}
+
+def queue_device_change(sid, device_info=None):
+    """Include a device in the next devices_delta broadcast; device_info None means it left"""
+    global device_broadcast_scheduled
+    with device_broadcast_lock:
+        pending_device_changes[sid] = device_summary(device_info) if device_info else None
+        if device_broadcast_scheduled:
+            return
+        device_broadcast_scheduled = True
+    socketio.start_background_task(flush_device_changes)
+
+def flush_device_changes():
+    """Wait out the batching window, then send every queued device change in one message"""
+    global pending_device_changes, device_broadcast_scheduled
+    socketio.sleep(DEVICE_BROADCAST_WINDOW)
+    with device_broadcast_lock:
+        changes = pending_device_changes
+        pending_device_changes = {}
+        device_broadcast_scheduled = False
+    socketio.emit('devices_delta', {
+        'updated': {sid: summary for sid, summary in changes.items() if summary},
+        'removed': [sid for sid, summary in changes.items() if summary is None]
+    })
+
+def presence_touch(sid):
+    """Give a device another DEVICE_TIMEOUT_SECONDS before it times out"""
+    deadline = time.monotonic() + DEVICE_TIMEOUT_SECONDS
+    with presence_lock:
+        presence_deadlines[sid] = deadline
+        heapq.heappush(presence_heap, (deadline, sid))
+
+def presence_forget(sid):
+    """Stop tracking a device"""
+    with presence_lock:
+        presence_deadlines.pop(sid, None)
+
+def connection_alive(sid):
+    """Whether Engine.IO still has this client's connection open, i.e. it answers pings"""
+    if not socketio.server.manager.is_connected(sid, '/'):
+        return False
+    eio_socket = socketio.server.eio.sockets.get(socketio.server.manager.eio_sid_from_sid(sid, '/'))
+    return eio_socket is None or not eio_socket.closed  # None for in-process test clients
+
+def remove_device(sid):
+    """Drop a device from the shared list and tell clients it left"""
+    presence_forget(sid)
+    device_info = shared_state.hdel(DEVICES_KEY, sid)
+    if device_info:
+        device_info['status'] = 'offline'
+        log_device_event('disconnect', device_info)
+        queue_device_change(sid)
+
+def expire_presence():
+    """Handle devices whose deadline has passed: renew live ones, remove the rest.
+    
+    Returns seconds until the next deadline.
+    """
+    now = time.monotonic()
+    due = []
+    with presence_lock:
+        while presence_heap and presence_heap[0][0] <= now:
+            deadline, sid = heapq.heappop(presence_heap)
+            if presence_deadlines.get(sid) == deadline:
+                due.append(sid)
+    
+    for sid in due:
+        # hupdate leaves alone a device that disconnected meanwhile, where hget then
+        # hset would write it back after remove_device had dropped it
+        if connection_alive(sid) and shared_state.hupdate(DEVICES_KEY, sid, {'last_seen': datetime.now().isoformat()}):
+            presence_touch(sid)
+        else:
+            remove_device(sid)
+    
+    with presence_lock:
+        # New devices always time out after everything already in the heap
+        return presence_heap[0][0] - time.monotonic() if presence_heap else DEVICE_TIMEOUT_SECONDS
+
+def start_presence_watcher():
+    """Sleep until the next device deadline, then expire or renew what is due"""
+    def watch_presence():
+        while True:
+            try:
+                delay = expire_presence()
+            except Exception as e:
+                print(f"Error checking device presence: {e}")
+                delay = DEVICE_TIMEOUT_SECONDS
+            socketio.sleep(max(delay, 0))
+    
+    socketio.start_background_task(watch_presence)
+
+def probe_local_ip():
     """Get the local IP address of the machine"""
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -88,55 +964,137 @@ def get_local_ip():
     except:
         return "127.0.0.1"
 
-def get_system_info():
-    """Get system information with guaranteed working uptime"""
-    import platform
-    import time
-    try:
-        # Get file statistics
-        uploads_dir = os.path.join('static', 'uploads')
-        downloads_dir = os.path.join('static', 'downloads')
-        upload_files = len([f for f in os.listdir(uploads_dir) if os.path.isfile(os.path.join(uploads_dir, f))]) if os.path.exists(uploads_dir) else 0
-        download_files = len([f for f in os.listdir(downloads_dir) if os.path.isfile(os.path.join(downloads_dir, f))]) if os.path.exists(downloads_dir) else 0
-        
-        # GUARANTEED WORKING UPTIME - Always return a working value
-        uptime_str = "0s"  # Start with 0s, frontend will handle the counting
-        
-        return {
-            'os': platform.system(),
-            'os_version': platform.version(),
-            'local_ip': get_local_ip(),
-            'hostname': platform.node(),
-            'session_enabled': True,
-            'active_sessions': len(active_sessions),
-            'connected_devices': len(connected_devices),
-            'devices_list': list(connected_devices.values()),  # Only online devices
-            'upload_files': upload_files,
-            'download_files': download_files,
-            'total_files': upload_files + download_files,
-            'server_time': datetime.now().isoformat(),
-            'max_file_size': 'Unlimited',
-            'server_uptime': uptime_str,
-            'server_start_time': SERVER_START_TIME
-        }
-    except Exception as e:
-        print(f"Error getting system info: {e}")
-        return {
-            'os': platform.system(),
-            'local_ip': get_local_ip(),
-            'hostname': platform.node(),
-            'session_enabled': True,
-            'active_sessions': len(active_sessions),
-            'connected_devices': len(connected_devices),
-            'devices_list': list(connected_devices.values()),
-            'upload_files': 0,
-            'download_files': 0,
-            'total_files': 0,
-            'server_time': datetime.now().isoformat(),
-            'max_file_size': 'Unlimited',
-            'server_uptime': '0s',
-            'server_start_time': SERVER_START_TIME
-        }
+def get_local_ip():
+    """Cached local IP address; the network watcher refreshes it when it changes"""
+    local_ip = server_page_cache.get('local_ip')
+    if local_ip is None:
+        local_ip = refresh_server_page_cache()['local_ip']
+    return local_ip
+
+def build_qr_png(server_url):
+    """Render the connection QR code as PNG bytes"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(server_url)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill_color="cyan", back_color="black")
+    img_buffer = BytesIO()
+    img.save(img_buffer, 'PNG')
+    return img_buffer.getvalue()
+
+def refresh_server_page_cache(local_ip=None):
+    """Rebuild the server URL and QR code; the index page is re-rendered on next request"""
+    local_ip = local_ip or probe_local_ip()
+    server_url = f"http://{local_ip}:{SERVER_PORT}"
+    qr_png = build_qr_png(server_url)
+    cache = {
+        'local_ip': local_ip,
+        'server_url': server_url,
+        'qr_png': qr_png,
+        'qr_code_b64': base64.b64encode(qr_png).decode(),
+        'qr_etag': hashlib.sha1(qr_png).hexdigest()
+    }
+    with server_page_lock:
+        server_page_cache.clear()
+        server_page_cache.update(cache)
+    return cache
+
+def start_network_watcher():
+    """Start the background thread that notices when the machine's IP address changes"""
+    def watch_network():
+        while True:
+            time.sleep(NETWORK_WATCH_INTERVAL)
+            try:
+                local_ip = probe_local_ip()
+                if local_ip != server_page_cache.get('local_ip'):
+                    refresh_server_page_cache(local_ip)
+                    print(f"🌐 Network address changed: http://{local_ip}:{SERVER_PORT}")
+            except Exception as e:
+                print(f"Error watching network address: {e}")
+
+    watcher_thread = threading.Thread(target=watch_network, daemon=True)
+    watcher_thread.start()
+    return watcher_thread
+
+def sample_system_info():
+    """Collect system information; only the sampler calls this, requests read the snapshot"""
+    upload_files, download_files = catalog_counts()
+    return dict(SYSTEM_PLATFORM, **{
+        'local_ip': get_local_ip(),
+        'session_enabled': True,
+        'active_sessions': session_store.count(),
+        'connected_devices': shared_state.hlen(DEVICES_KEY),
+        'upload_files': upload_files,
+        'download_files': download_files,
+        'total_files': upload_files + download_files,
+        'server_time': datetime.now().isoformat(),
+        'max_file_size': 'Unlimited' if not UPLOAD_MAX_BYTES else f"{UPLOAD_MAX_BYTES // (1024 * 1024)}MB",
+        'server_uptime': '0s',  # The frontend counts up from server_start_time
+        'server_start_time': SERVER_START_TIME,
+        'worker_pid': os.getpid()
+    })
+
+def refresh_system_info():
+    """Take a new sample and return the current snapshot.
+    
+    The snapshot, with its JSON body and ETag, is only replaced (and pushed to
+    SYSTEM_INFO_ROOM) when something other than server_time changed, so
+    clients revalidating with If-None-Match keep getting 304s.
+    """
+    global system_info_snapshot
+    info = sample_system_info()
+    etag = hashlib.sha1(json.dumps(dict(info, server_time=None), sort_keys=True).encode()).hexdigest()
+    with system_info_lock:
+        previous = system_info_snapshot
+        if previous and previous['etag'] == etag:
+            return previous
+        system_info_snapshot = {'info': info, 'json': app.json.dumps(info), 'etag': etag}
+        snapshot = system_info_snapshot
+    if previous:
+        # Each worker pushes its own snapshot to its own clients
+        socketio.emit('system_info', info, to=SYSTEM_INFO_ROOM, ignore_queue=True)
+    return snapshot
+
+def get_system_info_snapshot():
+    """Latest system info snapshot, sampled now only if there is none yet"""
+    return system_info_snapshot or refresh_system_info()
+
+def start_resource_monitor():
+    """Start the background thread that samples resource usage and sends threshold alerts"""
+    global resource_monitor
+    resource_monitor = ResourceMonitor({'uploads': UPLOAD_FOLDER, 'downloads': DOWNLOAD_FOLDER},
+                                       MONITORING_HISTORY, MONITORING_THRESHOLDS)
+    
+    def monitor_resources():
+        while True:
+            try:
+                values = resource_monitor.sample()
+                for alert in resource_monitor.check_thresholds(values):
+                    print(f"⚠️ {alert['label']} {alert['value']:.0f}% "
+                          f"({'over' if alert['state'] == 'firing' else 'back under'} {alert['threshold']}%)")
+                    # Every worker samples the same machine, so each only tells its own clients
+                    socketio.emit('resource_alert', alert, ignore_queue=True)
+            except Exception as e:
+                print(f"Error sampling resources: {e}")
+            time.sleep(MONITORING_INTERVAL)
+
+    monitor_thread = threading.Thread(target=monitor_resources, daemon=True)
+    monitor_thread.start()
+    return monitor_thread
+
+def start_system_info_sampler():
+    """Start the background thread that refreshes the system info snapshot"""
+    def sample_periodically():
+        while True:
+            time.sleep(SYSTEM_INFO_INTERVAL)
+            try:
+                refresh_system_info()
+            except Exception as e:
+                print(f"Error getting system info: {e}")
+
+    sampler_thread = threading.Thread(target=sample_periodically, daemon=True)
+    sampler_thread.start()
+    return sampler_thread
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -167,6 +1125,919 @@ def format_file_size(size_bytes):
         i += 1
     return f"{size_bytes:.1f}{size_names[i]}"
 
+def get_blob_path(digest):
+    """Location of a blob in the content-addressed store"""
+    return os.path.join(BLOB_FOLDER, digest[:2], digest)
+
+class UploadHasher:
+    """SHA-256 and CRC32 of the same bytes, fed together as an upload streams in"""
+    
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+        self.crc32 = 0
+    
+    def update(self, data):
+        self.sha256.update(data)
+        self.crc32 = zlib.crc32(data, self.crc32)
+    
+    def digests(self):
+        """Hex digests as {'sha256': ..., 'crc32': ...}"""
+        return {'sha256': self.sha256.hexdigest(), 'crc32': f'{self.crc32:08x}'}
+
+def get_upload_hash_executor():
+    """Thread pool that hashes upload blocks, created on first use"""
+    global upload_hash_executor
+    if upload_hash_executor is None:
+        if PRODUCTION_MODE:
+            # Real OS threads even though the stdlib is monkey-patched
+            upload_hash_executor = GeventThreadPoolExecutor(max_workers=UPLOAD_HASH_WORKERS)
+        else:
+            upload_hash_executor = ThreadPoolExecutor(max_workers=UPLOAD_HASH_WORKERS, thread_name_prefix='upload-hash')
+    return upload_hash_executor
+
+class PartFileWriter:
+    """Writes an upload into a part file, hashing each block on another thread.
+    
+    A block is hashed while it is written and the next one is read; hashlib
+    and zlib release the GIL, so the hashing overlaps the I/O instead of adding
+    to it. preallocate reserves that many bytes up front where the filesystem
+    supports it; close() trims the file to what was written.
+    """
+    
+    def __init__(self, part_path, preallocate=0):
+        self.part_path = part_path
+        self.size = 0
+        self.hasher = UploadHasher()
+        self.hashing = None
+        self.file = open(part_path, 'wb')
+        if preallocate and UPLOAD_PREALLOCATE:
+            try:
+                os.posix_fallocate(self.file.fileno(), 0, preallocate)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    self.discard()
+                    raise
+                # Filesystem without preallocation; the file just grows
+    
+    def write(self, data):
+        if self.hashing:
+            self.hashing.result()  # Blocks must reach the hasher in order
+        self.hashing = get_upload_hash_executor().submit(self.hasher.update, data)
+        run_blocking(self.file.write, data)
+        self.size += len(data)
+    
+    def close(self):
+        """Finish the file; returns its digests"""
+        if self.hashing:
+            self.hashing.result()
+        self.file.truncate(self.size)
+        self.file.close()
+        return self.hasher.digests()
+    
+    def discard(self):
+        """Close and delete the part file"""
+        self.file.close()
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+def hash_file(file_path, hasher=None, start=0):
+    """Feed a file from offset start into a hasher (new UploadHasher by default)"""
+    hasher = hasher or UploadHasher()
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        while True:
+            data = run_blocking(f.read, CHUNK_WRITE_BUFFER)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher
+
+class UploadRejected(Exception):
+    """An upload request refused part way through; status is the HTTP status to answer with"""
+    
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+def check_free_space(folder, size):
+    """Raise UploadRejected if storing size more bytes in folder would leave under UPLOAD_MIN_FREE_BYTES free"""
+    if UPLOAD_MIN_FREE_BYTES and psutil.disk_usage(folder).free - size < UPLOAD_MIN_FREE_BYTES:
+        raise UploadRejected('Not enough disk space', 507)
+
+def receive_multipart_files(folder, file_fields=('file',), max_files=1):
+    """Stream the file parts of a multipart request straight into part files in folder.
+    
+    Werkzeug's form parser would spool each file to a temp file first, so it
+    would be written twice. Here the body is read in CHUNK_WRITE_BUFFER blocks
+    and file data goes directly to a PartFileWriter. For a single-file request
+    that is preallocated to the most the rest of the body could hold; batch
+    parts just grow. A file's extension is checked from its part header before
+    its data is read.
+    
+    Returns (files, fields). files is a list of dicts with the client's
+    filename, part_path, size and digests; fields holds the plain form fields.
+    Raises UploadRejected, after removing any part files, for a bad type, a
+    file over UPLOAD_MAX_BYTES, a body slower than UPLOAD_TIMEOUT or a disk
+    that the upload would fill.
+    """
+    mimetype, options = parse_options_header(request.headers.get('Content-Type', ''))
+    if mimetype != 'multipart/form-data' or not options.get('boundary'):
+        raise UploadRejected('No file provided', 400)
+    content_length = request.content_length
+    if UPLOAD_MAX_BYTES and max_files == 1 and content_length and content_length > UPLOAD_MAX_BYTES + MAX_FORM_FIELD_SIZE:
+        raise UploadRejected('File too large', 413)
+    check_free_space(folder, content_length or 0)
+    
+    decoder = MultipartDecoder(options['boundary'].encode(), max_form_memory_size=None)
+    stream = request.stream
+    deadline = time.monotonic() + UPLOAD_TIMEOUT
+    # In production a stalled read is interrupted; otherwise the deadline is checked between reads
+    timer = gevent.Timeout(UPLOAD_TIMEOUT, UploadRejected('Upload timed out', 408)) if PRODUCTION_MODE else None
+    files, fields = [], {}
+    current = writer = None
+    consumed = 0
+    try:
+        if timer:
+            timer.start()
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                if time.monotonic() > deadline:
+                    raise UploadRejected('Upload timed out', 408)
+                data = stream.read(CHUNK_WRITE_BUFFER)
+                consumed += len(data)
+                decoder.receive_data(data or None)
+            elif isinstance(event, File) and event.name in file_fields:
+                if len(files) >= max_files:
+                    raise UploadRejected('Too many files', 413)
+                if not event.filename:
+                    raise UploadRejected('No file selected', 400)
+                if not allowed_file(event.filename):
+                    raise UploadRejected('File type not allowed', 400)
+                current = {'filename': event.filename,
+                           'part_path': os.path.join(folder, f".{secrets.token_urlsafe(16)}{PART_FILE_SUFFIX}")}
+                files.append(current)
+                # Only a lone file's size is known up front; a batch part would reserve the whole rest of the body
+                preallocate = max((content_length or 0) - consumed, 0) if max_files == 1 else 0
+                writer = PartFileWriter(current['part_path'], preallocate)
+            elif isinstance(event, (Field, File)):
+                current = {'field': event.name, 'data': b''} if isinstance(event, Field) else None
+            elif isinstance(event, Data) and current is not None:
+                if 'field' in current:
+                    current['data'] += event.data
+                    if len(current['data']) > MAX_FORM_FIELD_SIZE:
+                        raise UploadRejected('Form field too large', 413)
+                    if not event.more_data:
+                        fields[current['field']] = current['data'].decode('utf-8', 'replace')
+                        current = None
+                    continue
+                
+                if event.data:
+                    writer.write(event.data)
+                    if UPLOAD_MAX_BYTES and writer.size > UPLOAD_MAX_BYTES:
+                        raise UploadRejected('File too large', 413)
+                    if not content_length and writer.size % (64 * CHUNK_WRITE_BUFFER) < len(event.data):
+                        check_free_space(folder, 0)  # Body of unknown length: recheck every 64 blocks
+                if not event.more_data:
+                    current['size'] = writer.size
+                    current['digests'] = writer.close()
+                    current = writer = None
+            elif isinstance(event, Epilogue):
+                break
+        
+        if not files:
+            raise UploadRejected('No file provided', 400)
+        return files, fields
+    except BaseException as e:
+        if writer:
+            writer.discard()
+        for received in files:
+            try:
+                os.remove(received['part_path'])
+            except OSError:
+                pass
+        if isinstance(e, ValueError):
+            raise UploadRejected('Malformed upload', 400)
+        if isinstance(e, OSError) and e.errno == errno.ENOSPC:
+            raise UploadRejected('Not enough disk space', 507)
+        raise
+    finally:
+        if timer:
+            timer.cancel()
+
+def get_expected_digests(values):
+    """Digests a client expects its upload to have, from sha256/crc32 fields; raises ValueError if malformed"""
+    expected = {}
+    for name, length in DIGEST_LENGTHS.items():
+        value = values.get(name) or request.headers.get(f'X-Content-{name.upper()}')
+        if value:
+            value = value.strip().lower()
+            if len(value) != length or not all(c in '0123456789abcdef' for c in value):
+                raise ValueError(f"Invalid {name} digest")
+            expected[name] = value
+    return expected
+
+def digest_mismatch_response(expected, digests):
+    """422 response if any expected digest differs from what was received, else None"""
+    mismatched = [name for name, value in expected.items() if digests[name] != value]
+    if not mismatched:
+        return None
+    return jsonify({
+        'error': f"Upload corrupted: {', '.join(mismatched)} mismatch",
+        'expected': expected,
+        'received': digests
+    }), 422
+
+def store_file_digests(folder, filename, digests):
+    """Remember a file's digests, in an extended attribute where the filesystem has them"""
+    path = os.path.join(folder, filename)
+    stat = os.stat(path)
+    record = dict(digests, size=stat.st_size, mtime=stat.st_mtime)
+    file_digests[(folder, filename)] = record
+    if hasattr(os, 'setxattr'):
+        try:
+            os.setxattr(path, DIGEST_XATTR, json.dumps(record).encode())
+        except OSError:
+            pass  # e.g. FAT or tmpfs without user xattrs; the in-memory copy still works
+
+def load_file_digests(entry):
+    """Stored digests of a catalog entry, or None if unknown or the file changed since"""
+    record = file_digests.get((entry['folder'], entry['name']))
+    if record is None and hasattr(os, 'getxattr'):
+        try:
+            record = json.loads(os.getxattr(os.path.join(entry['folder'], entry['name']), DIGEST_XATTR))
+        except (OSError, ValueError):
+            return None
+    if not record or record.get('size') != entry['size_bytes'] or record.get('mtime') != entry['file_mtime']:
+        return None
+    return {name: record[name] for name in DIGEST_LENGTHS}
+
+def commit_part_file(part_path, folder, filename, digest):
+    """Move a finished part file into place as folder/filename.
+    
+    With DEDUP_STORAGE the content goes to the blob store, keeping one blob per
+    digest, and the shared file becomes a hard link to it. If the filesystem
+    can't hard link, the part file is moved into place as a plain file.
+    """
+    dest_path = os.path.join(folder, filename)
+    if not DEDUP_STORAGE:
+        os.replace(part_path, dest_path)
+        return
+    
+    blob_path = get_blob_path(digest)
+    link_path = f"{part_path}.link"
+    reference = None  # (inode, upload time) if the file becomes a link to an older blob
+    with blob_lock:
+        if os.path.exists(blob_path) and not blob_is_intact(blob_path, digest, os.path.getsize(part_path)):
+            # A shared file linked to it was edited in place, so the blob no longer
+            # holds this content; drop its name and keep the new upload instead
+            stat = os.stat(blob_path)
+            os.remove(blob_path)
+            blob_inodes.pop(stat.st_ino, None)
+            blob_stats.pop(digest, None)
+        if os.path.exists(blob_path):
+            try:
+                os.link(blob_path, link_path)
+            except OSError:
+                os.replace(part_path, dest_path)
+                return
+            os.remove(part_path)  # Duplicate content, nothing new to keep
+            reference = (os.stat(link_path).st_ino, time.time())
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(part_path, blob_path)
+            try:
+                os.link(blob_path, link_path)
+            except OSError:
+                os.replace(blob_path, dest_path)
+                return
+            stat = os.stat(blob_path)
+            blob_inodes[stat.st_ino] = digest
+            blob_stats[digest] = (stat.st_size, stat.st_mtime_ns)
+        try:
+            os.replace(link_path, dest_path)
+        except OSError:
+            os.remove(link_path)
+            raise
+    key = f'{folder}/{filename}'
+    if reference or key in reference_times:
+        update_reference_times({key: reference})
+
+def blob_is_intact(blob_path, digest, size):
+    """Whether a blob still holds the content its digest names; call with blob_lock held.
+    
+    Every shared file linked to a blob is the same inode, so editing one in
+    place changes the blob. A blob is trusted while its size and mtime match
+    those recorded when it was stored; one this process has no record of
+    (stored before a restart) is hashed once.
+    """
+    stat = os.stat(blob_path)
+    if stat.st_size != size:
+        return False
+    record = blob_stats.get(digest)
+    if record is not None:
+        return record == (stat.st_size, stat.st_mtime_ns)
+    if hash_file(blob_path).digests()['sha256'] != digest:
+        return False
+    blob_stats[digest] = (stat.st_size, stat.st_mtime_ns)
+    return True
+
+def release_blob(digest):
+    """Delete a blob once no shared file references it"""
+    if not DEDUP_STORAGE or not digest:
+        return
+    blob_path = get_blob_path(digest)
+    with blob_lock:
+        try:
+            stat = os.stat(blob_path)
+        except FileNotFoundError:
+            return
+        if stat.st_nlink <= 1:
+            os.remove(blob_path)
+            blob_inodes.pop(stat.st_ino, None)
+            blob_stats.pop(digest, None)
+
+def collect_garbage_blobs():
+    """Sweep the blob store: drop unreferenced blobs and rebuild the inode index"""
+    inodes = {}
+    removed = 0
+    with blob_lock:
+        for prefix in os.listdir(BLOB_FOLDER) if os.path.exists(BLOB_FOLDER) else []:
+            prefix_path = os.path.join(BLOB_FOLDER, prefix)
+            if not os.path.isdir(prefix_path):
+                continue
+            with os.scandir(prefix_path) as it:
+                for entry in it:
+                    stat = entry.stat()
+                    if stat.st_nlink <= 1:
+                        os.remove(entry.path)
+                        blob_stats.pop(entry.name, None)
+                        removed += 1
+                    else:
+                        inodes[stat.st_ino] = entry.name
+        blob_inodes.clear()
+        blob_inodes.update(inodes)
+    
+    # Forget upload times of links that were deleted or replaced
+    refresh_reference_times()
+    stale = {}
+    for key, (inode, _) in reference_times.items():
+        try:
+            if os.stat(key).st_ino == inode:
+                continue
+        except OSError:
+            pass
+        stale[key] = None
+    if stale:
+        update_reference_times(stale)
+    return removed
+
+def make_upload_filename(original_name, source):
+    """Sanitize an upload name; phone uploads get a timestamp to avoid conflicts"""
+    filename = secure_filename(original_name)
+    if source == 'phone':
+        name, ext = os.path.splitext(filename)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"{name}_{timestamp}{ext}"
+    return filename
+
+def get_thumbnail_executor():
+    """Process pool for thumbnails, created by start_thumbnail_workers or on first use"""
+    global thumbnail_executor
+    if thumbnail_executor is None:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # Forked, since spawned workers would re-run this module's startup code;
+            # see start_thumbnail_workers for why that has to happen early
+            context = multiprocessing.get_context('fork')
+            thumbnail_executor = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS, mp_context=context)
+        elif PRODUCTION_MODE:
+            # No fork on Windows: use threads, Pillow releases the GIL while decoding and resizing
+            thumbnail_executor = GeventThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+        else:
+            thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+    return thumbnail_executor
+
+def start_thumbnail_workers():
+    """Fork the thumbnail processes while this is still the only thread.
+    
+    A fork copies the locks other threads hold but not the threads, so a
+    worker forked once the server runs can hang on a lock nobody will release.
+    """
+    get_thumbnail_executor().submit(os.getpid).result()  # A fork pool starts all its processes on the first task
+
+def has_thumbnail(entry):
+    """Whether thumbnails are on and the file is an image type Pillow can read"""
+    return THUMBNAILS_ENABLED and entry['extension'] in THUMBNAIL_EXTENSIONS
+
+def get_thumbnail_url(entry):
+    """Thumbnail URL for a catalog entry, versioned by mtime so it can be cached; None for non-images"""
+    if not has_thumbnail(entry):
+        return None
+    return f"/api/thumbnail/{quote(entry['name'])}?v={int(entry['mtime'])}"
+
+def thumbnail_job(entry, digest=None):
+    """Future of the thumbnail path for a catalog entry, starting a render unless one is current.
+    
+    Never waits for the render, so it is safe to call from an upload request.
+    digest saves the worker re-hashing a file that was just uploaded.
+    """
+    key = (entry['folder'], entry['name'])
+    with thumbnail_lock:
+        job = thumbnail_jobs.get(key)
+        if job and job[:2] == (entry['mtime'], entry['size_bytes']):
+            future = job[2]
+            if not (future.done() and future.exception()):
+                return future
+        future = get_thumbnail_executor().submit(render_thumbnail, os.path.join(*key), THUMBNAIL_FOLDER,
+                                                 THUMBNAIL_SIZE, digest)
+        thumbnail_jobs[key] = (entry['mtime'], entry['size_bytes'], future)
+        return future
+
+def register_uploads(folder, uploads):
+    """Record files just stored in folder, given as (filename, digests) pairs; returns their catalog entries"""
+    for filename, digests in uploads:
+        store_file_digests(folder, filename, digests)
+    entries = catalog_add_many(folder, [filename for filename, _ in uploads])
+    for entry, (filename, digests) in zip(entries, uploads):
+        if entry and has_thumbnail(entry):
+            try:
+                thumbnail_job(entry, digests['sha256'])
+            except Exception as e:
+                print(f"Error queueing thumbnail for {filename}: {e}")
+    return entries
+
+def upload_result(filename, file_size, digests):
+    """API response describing one stored upload"""
+    return {
+        'success': True,
+        'filename': filename,
+        'size': format_file_size(file_size),
+        'size_bytes': file_size,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'icon': get_file_icon(filename),
+        'sha256': digests['sha256'],
+        'crc32': digests['crc32']
+    }
+
+def finish_upload(folder, filename, source, digests):
+    """Register a completed upload, broadcast it and build the API response"""
+    entry, = register_uploads(folder, [(filename, digests)])
+    file_size = entry['size_bytes']
+    
+    # Broadcast file event
+    broadcast_file_event('upload', {
+        'filename': filename,
+        'size': format_file_size(file_size),
+        'source': source
+    })
+    
+    return upload_result(filename, file_size, digests)
+
+def store_received_file(folder, received, source):
+    """Move a file from receive_multipart_files to its final name in folder; returns that name"""
+    filename = make_upload_filename(received['filename'], source)
+    previous = catalog_lookup_in(folder, filename)
+    commit_part_file(received['part_path'], folder, filename, received['digests']['sha256'])
+    if previous:
+        release_blob(previous.get('digest'))  # Overwritten file may have been the last reference
+    return filename
+
+def receive_single_upload(folder, source):
+    """Receive a one-file multipart upload into folder and build the response"""
+    try:
+        (received,), fields = receive_multipart_files(folder)
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    part_path, digests = received['part_path'], received['digests']
+    try:
+        expected = get_expected_digests(dict(request.args, **fields))
+    except ValueError as e:
+        os.remove(part_path)
+        return jsonify({'error': str(e)}), 400
+    mismatch = digest_mismatch_response(expected, digests)
+    if mismatch:
+        os.remove(part_path)
+        return mismatch
+    
+    filename = store_received_file(folder, received, source)
+    return jsonify(finish_upload(folder, filename, source, digests))
+
+def receive_batch_upload(folder, source):
+    """Receive a multipart upload of up to BATCH_UPLOAD_MAX_FILES files into folder.
+    
+    All files are announced in one batch_upload file event and one files_delta,
+    instead of an event and a file list update per file.
+    """
+    try:
+        received, _ = receive_multipart_files(folder, ('file', 'files'), BATCH_UPLOAD_MAX_FILES)
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    stored = [(store_received_file(folder, item, source), item['digests']) for item in received]
+    entries = register_uploads(folder, stored)
+    results = [upload_result(filename, entry['size_bytes'] if entry else 0, digests)
+               for (filename, digests), entry in zip(stored, entries)]
+    total_size = sum(result['size_bytes'] for result in results)
+    
+    broadcast_file_event('batch_upload', {
+        'count': len(results),
+        'filenames': [result['filename'] for result in results],
+        'size': format_file_size(total_size),
+        'source': source
+    })
+    
+    return jsonify({'success': True, 'count': len(results), 'size_bytes': total_size, 'files': results})
+
+def prune_stale_uploads():
+    """Remove chunked uploads that have been idle longer than CHUNKED_UPLOAD_EXPIRY"""
+    # Chunks may be going to another worker, so with a broker the shared last_activity decides
+    cutoff = time.time() - CHUNKED_UPLOAD_EXPIRY
+    with chunked_uploads_lock:
+        stale = [upload_id for upload_id, upload in chunked_uploads.items() if upload['last_activity'] < cutoff]
+    for upload_id in stale:
+        if state_broker_address and shared_state.hdel_older(CHUNKED_UPLOADS_KEY, upload_id, 'last_activity', cutoff) is None:
+            # Still active on another worker, or finished or cancelled there
+            shared = shared_state.hget(CHUNKED_UPLOADS_KEY, upload_id)
+            with chunked_uploads_lock:
+                if shared is None:
+                    chunked_uploads.pop(upload_id, None)
+                elif upload_id in chunked_uploads:
+                    chunked_uploads[upload_id]['last_activity'] = shared['last_activity']
+            continue
+        with chunked_uploads_lock:
+            upload = chunked_uploads.pop(upload_id, None)
+        if upload:
+            try:
+                os.remove(upload['part_path'])
+            except FileNotFoundError:
+                pass
+
+CHUNKED_UPLOAD_SHARED_FIELDS = ('filename', 'source', 'folder', 'size', 'part_path', 'received', 'last_activity', 'expected')
+
+def share_chunked_upload(upload_id, upload):
+    """Publish a chunked upload's progress so any worker process can take its next chunk"""
+    if state_broker_address:
+        shared_state.hset(CHUNKED_UPLOADS_KEY, upload_id, {field: upload[field] for field in CHUNKED_UPLOAD_SHARED_FIELDS})
+
+def find_chunked_upload(upload_id):
+    """State of a chunked upload, taking over one another worker started or advanced"""
+    with chunked_uploads_lock:
+        upload = chunked_uploads.get(upload_id)
+        if not state_broker_address:
+            return upload
+    
+    shared = shared_state.hget(CHUNKED_UPLOADS_KEY, upload_id)
+    with chunked_uploads_lock:
+        if shared is None:
+            chunked_uploads.pop(upload_id, None)  # Finished or cancelled elsewhere
+            return None
+        upload = chunked_uploads.get(upload_id)
+        if upload is None:
+            # Hashing restarts from the beginning on this worker; finalize catches up
+            upload = chunked_uploads[upload_id] = dict(shared, hasher=UploadHasher(), hashed_bytes=0, lock=threading.Lock())
+        else:
+            upload['received'] = shared['received']
+        return upload
+
+def make_file_etag(stat):
+    """Strong ETag derived from inode, size and mtime"""
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+def parse_byte_ranges(range_header, file_size):
+    """Parse a Range header into (start, end) pairs with exclusive ends.
+    
+    Returns None when the header is missing or malformed (serve the whole file)
+    and an empty list when no range is satisfiable (416).
+    """
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+    ranges = []
+    for spec in range_header[6:].split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        first, sep, last = spec.partition('-')
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) + 1 if last else max(file_size, start + 1)
+                if start < 0 or end <= start:
+                    return None
+            else:
+                suffix_length = int(last)
+                if suffix_length <= 0:
+                    continue
+                start = max(file_size - suffix_length, 0)
+                end = file_size
+        except ValueError:
+            return None
+        if start < file_size:
+            ranges.append((start, min(end, file_size)))
+    if len(ranges) > MAX_DOWNLOAD_RANGES:
+        return None
+    return ranges
+
+def iter_file_range(file_path, start, end):
+    """Yield bytes [start, end) of a file in DOWNLOAD_READ_SIZE pieces"""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = run_blocking(f.read, min(DOWNLOAD_READ_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+class SendfileWrapper:
+    """wsgi.file_wrapper of the production server.
+    
+    SendfileWSGIHandler sends the file with os.sendfile() from its current
+    offset; anything else that gets one simply iterates it.
+    """
+
+    def __init__(self, file, block_size=DOWNLOAD_READ_SIZE):
+        self.file = file
+        self.block_size = block_size
+
+    def __iter__(self):
+        while True:
+            data = run_blocking(self.file.read, self.block_size)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        self.file.close()
+
+def sendfile_to_socket(sock, file, count, wait_write):
+    """Send count bytes of file from its current offset; returns bytes sent, short if the file shrank"""
+    out_fd, in_fd = sock.fileno(), file.fileno()
+    offset = file.tell()
+    sent = 0
+    while sent < count:
+        try:
+            n = os.sendfile(out_fd, in_fd, offset + sent, min(count - sent, SENDFILE_CHUNK_SIZE))
+        except BlockingIOError:
+            wait_write(out_fd)
+            continue
+        if n == 0:
+            break
+        sent += n
+    return sent
+
+def iter_multipart_ranges(file_path, parts, boundary):
+    """Yield a multipart/byteranges body for pre-rendered part headers"""
+    for header, start, end in parts:
+        yield header
+        yield from iter_file_range(file_path, start, end)
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+def is_not_modified(stat, etag):
+    """Evaluate If-None-Match / If-Modified-Since against the file"""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag)
+    if_modified_since = parse_date(request.headers.get('If-Modified-Since'))
+    if if_modified_since:
+        return int(stat.st_mtime) <= if_modified_since.timestamp()
+    return False
+
+def if_range_matches(stat, etag):
+    """Whether a Range request may be honored given its If-Range validator"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Weak validators never match for ranges
+        return if_range == f'"{etag}"'
+    if_range_date = parse_date(if_range)
+    return if_range_date is not None and int(stat.st_mtime) == int(if_range_date.timestamp())
+
+def send_file_ranges(folder, filename):
+    """Send a file with conditional GET, single and multi Range support.
+    
+    Full-file and single-range bodies go through the server's wsgi.file_wrapper
+    when it has one: the --production server's sends them with os.sendfile(),
+    as gunicorn's does. The Werkzeug dev server has none, so there they are
+    read and written in DOWNLOAD_READ_SIZE pieces.
+    """
+    file_path = safe_join(folder, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return None
+    
+    stat = os.stat(file_path)
+    file_size = stat.st_size
+    etag = make_file_etag(stat)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'no-cache'
+    }
+    try:
+        filename.encode('latin-1')
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    
+    if is_not_modified(stat, etag):
+        return Response(status=304, headers=headers)
+    
+    ranges = None
+    if if_range_matches(stat, etag):
+        ranges = parse_byte_ranges(request.headers.get('Range'), file_size)
+    
+    if ranges == []:
+        headers['Content-Range'] = f"bytes */{file_size}"
+        return Response(status=416, headers=headers)
+    
+    if ranges and len(ranges) > 1:
+        boundary = secrets.token_hex(16)
+        parts = []
+        content_length = len(f"\r\n--{boundary}--\r\n")
+        for start, end in ranges:
+            part_header = (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {mimetype}\r\n"
+                f"Content-Range: bytes {start}-{end - 1}/{file_size}\r\n\r\n"
+            ).encode()
+            parts.append((part_header, start, end))
+            content_length += len(part_header) + end - start
+        headers['Content-Length'] = str(content_length)
+        return Response(iter_multipart_ranges(file_path, parts, boundary), status=206, headers=headers,
+                        mimetype=f'multipart/byteranges; boundary={boundary}', direct_passthrough=True)
+    
+    start, end = ranges[0] if ranges else (0, file_size)
+    status = 206 if ranges else 200
+    if ranges:
+        headers['Content-Range'] = f"bytes {start}-{end - 1}/{file_size}"
+    headers['Content-Length'] = str(end - start)
+    
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper and request.method != 'HEAD':
+        # Server-provided wrapper sends Content-Length bytes from the current offset
+        f = open(file_path, 'rb')
+        f.seek(start)
+        body = file_wrapper(f, DOWNLOAD_READ_SIZE)
+    else:
+        body = iter_file_range(file_path, start, end)
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+
+def zip_dos_datetime(mtime):
+    """Pack a timestamp into ZIP (MS-DOS) time and date fields"""
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1  # 1980-01-01 00:00
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+def iter_deflate_serial(f):
+    """Yield (raw chunk, deflated bytes) for a file on the current thread"""
+    compressor = zlib.compressobj(ZIP_COMPRESSION_LEVEL, zlib.DEFLATED, -15)
+    while True:
+        data = run_blocking(f.read, ZIP_READ_SIZE)
+        if not data:
+            break
+        yield data, run_blocking(compressor.compress, data)
+    yield b'', compressor.flush()
+
+def deflate_block(data):
+    """Deflate one block as a non-final, byte-aligned raw deflate segment"""
+    compressor = zlib.compressobj(ZIP_COMPRESSION_LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def iter_deflate_parallel(f):
+    """Yield (raw chunk, deflated bytes) with blocks deflated on a thread pool.
+    
+    Each block is compressed independently and sync-flushed, so the segments
+    concatenate into one valid deflate stream. zlib releases the GIL, so the
+    blocks really run in parallel. At most two blocks per worker are in flight.
+    """
+    global zip_deflate_executor
+    if zip_deflate_executor is None:
+        if PRODUCTION_MODE:
+            # Real OS threads even though the stdlib is monkey-patched
+            zip_deflate_executor = GeventThreadPoolExecutor(max_workers=ZIP_DEFLATE_WORKERS)
+        else:
+            zip_deflate_executor = ThreadPoolExecutor(max_workers=ZIP_DEFLATE_WORKERS, thread_name_prefix='zip-deflate')
+    
+    pending = deque()
+    while True:
+        data = run_blocking(f.read, ZIP_READ_SIZE)
+        if data:
+            pending.append((data, zip_deflate_executor.submit(deflate_block, data)))
+        if pending and (not data or len(pending) >= ZIP_DEFLATE_WORKERS * 2):
+            block, future = pending.popleft()
+            yield block, future.result()
+        if not data and not pending:
+            break
+    yield b'', b'\x03\x00'  # Final empty fixed-Huffman block
+
+def iter_zip_stream(entries):
+    """Yield a ZIP archive for (arcname, path, stat) entries as it is built.
+    
+    Entries use data descriptors so nothing has to be seeked back over, and
+    ZIP64 records once sizes or offsets pass 4GB. Memory use is bounded by
+    ZIP_READ_SIZE regardless of how much is selected.
+    """
+    offset = 0
+    central_directory = []
+    
+    for arcname, file_path, stat in entries:
+        name = arcname.encode('utf-8')
+        extension = arcname.rsplit('.', 1)[1].lower() if '.' in arcname else ''
+        method = 0 if extension in ZIP_STORED_EXTENSIONS else 8  # stored / deflated
+        zip64 = stat.st_size * 1.05 > 0xFFFFFFFF
+        dos_time, dos_date = zip_dos_datetime(stat.st_mtime)
+        flags = 0x08 | 0x800  # data descriptor, UTF-8 name
+        version = 45 if zip64 else 20
+        
+        if zip64:
+            extra = struct.pack('<HHQQ', 1, 16, 0, 0)
+            header_sizes = 0xFFFFFFFF
+        else:
+            extra = b''
+            header_sizes = 0
+        local_header = struct.pack('<IHHHHHIIIHH', 0x04034b50, version, flags, method, dos_time, dos_date,
+                                   0, header_sizes, header_sizes, len(name), len(extra)) + name + extra
+        header_offset = offset
+        offset += len(local_header)
+        yield local_header
+        
+        crc = 0
+        file_size = 0
+        compressed_size = 0
+        with open(file_path, 'rb') as f:
+            if method == 0:
+                while True:
+                    data = run_blocking(f.read, ZIP_READ_SIZE)
+                    if not data:
+                        break
+                    crc = zlib.crc32(data, crc)
+                    file_size += len(data)
+                    compressed_size += len(data)
+                    yield data
+            else:
+                if ZIP_PARALLEL_DEFLATE and stat.st_size >= ZIP_PARALLEL_MIN_SIZE:
+                    blocks = iter_deflate_parallel(f)
+                else:
+                    blocks = iter_deflate_serial(f)
+                for data, compressed in blocks:
+                    crc = zlib.crc32(data, crc)
+                    file_size += len(data)
+                    if compressed:
+                        compressed_size += len(compressed)
+                        yield compressed
+        offset += compressed_size
+        
+        if zip64:
+            descriptor = struct.pack('<IIQQ', 0x08074b50, crc, compressed_size, file_size)
+        else:
+            descriptor = struct.pack('<IIII', 0x08074b50, crc, compressed_size, file_size)
+        offset += len(descriptor)
+        yield descriptor
+        
+        central_directory.append((name, method, dos_time, dos_date, crc, compressed_size, file_size, header_offset, stat.st_mode))
+    
+    # Central directory
+    cd_offset = offset
+    cd_size = 0
+    for name, method, dos_time, dos_date, crc, compressed_size, file_size, header_offset, mode in central_directory:
+        zip64_fields = []
+        if file_size >= 0xFFFFFFFF:
+            zip64_fields.append(file_size)
+            file_size = 0xFFFFFFFF
+        if compressed_size >= 0xFFFFFFFF:
+            zip64_fields.append(compressed_size)
+            compressed_size = 0xFFFFFFFF
+        if header_offset >= 0xFFFFFFFF:
+            zip64_fields.append(header_offset)
+            header_offset = 0xFFFFFFFF
+        extra = struct.pack(f'<HH{len(zip64_fields)}Q', 1, 8 * len(zip64_fields), *zip64_fields) if zip64_fields else b''
+        version = 45 if zip64_fields else 20
+        record = struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | version, version, 0x08 | 0x800, method,
+                             dos_time, dos_date, crc, compressed_size, file_size, len(name), len(extra), 0, 0, 0,
+                             (mode & 0xFFFF) << 16, header_offset) + name + extra
+        cd_size += len(record)
+        yield record
+    
+    count = len(central_directory)
+    if count >= 0xFFFF or cd_size >= 0xFFFFFFFF or cd_offset >= 0xFFFFFFFF:
+        zip64_end_offset = cd_offset + cd_size
+        yield struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset)
+        yield struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1)
+        yield struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0)
+    else:
+        yield struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count, cd_size, cd_offset, 0)
+
 def broadcast_file_event(event_type, data):
     """Broadcast file events to all connected clients"""
     event_data = {
@@ -174,22 +2045,22 @@ def broadcast_file_event(event_type, data):
         'data': data,
         'timestamp': datetime.now().isoformat()
     }
-    file_events.append(event_data)
-    if len(file_events) > 100:  # Keep only last 100 events
-        file_events.pop(0)
+    event_data = shared_state.log_event(FILE_EVENTS_KEY, event_data, MAX_FILE_EVENTS)
     socketio.emit('file_event', event_data)
 
-def broadcast_device_event(event_type, data):
-    """Broadcast device events to all connected clients"""
+def log_device_event(event_type, data):
+    """Record a device event for /api/device-events.
+    
+    Not broadcast: clients learn about connects and disconnects from the
+    batched devices_delta, so a burst of N connects isn't N messages to each
+    of N clients. The session token stays out of the log.
+    """
     event_data = {
         'type': event_type,
-        'data': data,
+        'data': {key: value for key, value in data.items() if key != 'session_token'},
         'timestamp': datetime.now().isoformat()
     }
-    device_events.append(event_data)
-    if len(device_events) > 50:  # Keep only last 50 events
-        device_events.pop(0)
-    socketio.emit('device_event', event_data)
+    shared_state.log_event(DEVICE_EVENTS_KEY, event_data, MAX_DEVICE_EVENTS)
 
 def generate_token():
     """Generate a secure random token for session management"""
@@ -197,198 +2068,119 @@ def generate_token():
     return secrets.token_urlsafe(32)
 
 def create_session(device_info):
-    """Create a new session for a device"""
-    global session_counter
-    session_counter += 1
-    
-    # Check if device already has an active session
-    device_ip = device_info.get('ip', 'unknown')
-    if device_ip in session_tokens:
-        existing_token = session_tokens[device_ip]
-        if existing_token in active_sessions:
-            # Update existing session
-            active_sessions[existing_token]['last_activity'] = datetime.now().isoformat()
-            active_sessions[existing_token]['device_info'] = device_info
-            return existing_token
-    
-    # Create new session
-    token = generate_token()
-    session_data = {
-        'session_id': session_counter,
-        'token': token,
-        'device_info': device_info,
-        'created_at': datetime.now().isoformat(),
-        'last_activity': datetime.now().isoformat(),
-        'is_active': True
-    }
-    
-    active_sessions[token] = session_data
-    session_tokens[device_ip] = token
-    
-    return token
+    """Create a session for a device, or refresh the one it already has; returns (session, is_new)"""
+    return session_store.create(generate_token(), device_info)
+
+def validate_session(token):
+    """The session for a token if it is valid, marking it as active; None if unknown or expired"""
+    return session_store.get(token, touch=True) if token else None
+
+# User-Agent classification tables, checked in order; the first matching rule wins
+ANDROID_BRAND_RULES = [
+    # (substrings, default model, [(substring, model)])
+    (('iQOO', 'IQOO'), 'iQOO Phone', []),
+    (('SM-', 'Samsung'), 'Samsung Phone', [
+        ('SM-G', 'Samsung Galaxy S Series'),
+        ('SM-N', 'Samsung Galaxy Note'),
+        ('SM-A', 'Samsung Galaxy A Series'),
+        ('SM-T', 'Samsung Galaxy Tab')
+    ]),
+    (('Xiaomi', 'MI '), 'Xiaomi Phone', [('Redmi', 'Xiaomi Redmi'), ('POCO', 'POCO Phone')]),
+    (('OnePlus',), 'OnePlus Phone', []),
+    (('Huawei',), 'Huawei Phone', []),
+    (('Google', 'Pixel'), 'Google Pixel', []),
+    (('Motorola', 'Moto'), 'Motorola Phone', []),
+    (('OPPO',), 'OPPO Phone', []),
+    (('Vivo',), 'Vivo Phone', []),
+    (('Realme',), 'Realme Phone', [])
+]
+ANDROID_MODEL_PATTERNS = [re.compile(pattern) for pattern in (
+    r'iQOO [0-9]+',    # iQOO models (prioritize iQOO)
+    r'SM-[A-Z0-9]+',   # Samsung models
+    r'MI [0-9]+',      # Xiaomi models
+    r'Pixel [0-9]+',   # Google Pixel models
+    r'iPhone [0-9,]+'  # iPhone models
+)]
+APPLE_DEVICE_RULES = [
+    # (substring, device type, model pattern, fallback name)
+    ('iPhone', 'Mobile', re.compile(r'iPhone [0-9,]+'), 'iPhone'),
+    ('iPad', 'Tablet', re.compile(r'iPad [A-Z0-9]+'), 'iPad')
+]
+DESKTOP_RULES = [
+    # (substring, OS, device name template)
+    ('Windows', 'Windows', "{}'s Windows PC"),
+    ('Mac', 'macOS', "{}'s Mac"),
+    ('Linux', 'Linux', "{}'s Linux PC")
+]
+BROWSER_RULES = [('Firefox', 'Firefox'), ('Safari', 'Safari'), ('Edge', 'Edge')]  # Checked after Chrome
+USER_AGENT_CACHE_SIZE = 1024  # Distinct User-Agent strings remembered
 
-def validate_session(token):
-    """Validate a session token"""
-    if token not in active_sessions:
-        return False
-    
-    session = active_sessions[token]
-    
-    # Check if session is expired (24 hours)
-    created_at = datetime.fromisoformat(session['created_at'])
-    if (datetime.now() - created_at).total_seconds() > 86400:  # 24 hours
-        del active_sessions[token]
-        return False
+def get_pc_username():
+    """Name of the user running the server, shown for desktop devices"""
+    try:
+        import getpass
+        return getpass.getuser()
+    except:
+        return 'Unknown User'
+
+PC_USERNAME = get_pc_username()
+
+def classify_android(user_agent):
+    """Device name for an Android User-Agent"""
+    device_model = 'Android Phone'
+    for substrings, default_model, models in ANDROID_BRAND_RULES:
+        if any(substring in user_agent for substring in substrings):
+            device_model = next((model for substring, model in models if substring in user_agent), default_model)
+            break
     
-    # Update last activity
-    session['last_activity'] = datetime.now().isoformat()
-    return True
+    # Try to extract specific model number
+    for pattern in ANDROID_MODEL_PATTERNS:
+        match = pattern.search(user_agent)
+        if match:
+            # For Samsung, keep the brand name but add model
+            if 'SM-' in match.group() and 'Samsung' in device_model:
+                device_model = f"{device_model} ({match.group()})"
+            else:
+                device_model = match.group()
+            break
+    return device_model
 
-def get_device_info(request):
-    """Extract device information from request with enhanced detection"""
-    user_agent = request.headers.get('User-Agent', 'Unknown')
+@functools.lru_cache(maxsize=USER_AGENT_CACHE_SIZE)
+def classify_user_agent(user_agent):
+    """Device type, OS, device name and browser for a User-Agent string.
     
-    # Enhanced device detection
+    Cached per User-Agent, since a room full of identical phones reconnecting
+    sends the same few strings over and over. Returns a tuple; copy into a dict.
+    """
     device_type = 'Unknown'
     device_name = 'Unknown Device'
     os_name = 'Unknown OS'
-    pc_username = 'Unknown User'
     
-    # Try to get PC username for desktop devices
-    try:
-        import getpass
-        pc_username = getpass.getuser()
-    except:
-        pc_username = 'Unknown User'
-    
-    # Detect operating system and extract specific device info
-    # Check for mobile devices first (Android, iPhone, etc.)
+    # Mobile and tablet devices first, then desktops
     if 'Android' in user_agent:
         os_name = 'Android'
         device_type = 'Mobile'
-        
-        # Enhanced Android device detection
-        device_model = 'Android Phone'
-        
-        # iQOO devices (added support)
-        if 'iQOO' in user_agent or 'IQOO' in user_agent:
-            device_model = 'iQOO Phone'
-        # Samsung devices
-        elif 'SM-' in user_agent or 'Samsung' in user_agent:
-            # Try to extract Samsung model
-            if 'SM-G' in user_agent:
-                device_model = 'Samsung Galaxy S Series'
-            elif 'SM-N' in user_agent:
-                device_model = 'Samsung Galaxy Note'
-            elif 'SM-A' in user_agent:
-                device_model = 'Samsung Galaxy A Series'
-            elif 'SM-T' in user_agent:
-                device_model = 'Samsung Galaxy Tab'
-            else:
-                device_model = 'Samsung Phone'
-        
-        # Xiaomi devices
-        elif 'Xiaomi' in user_agent or 'MI ' in user_agent:
-            if 'Redmi' in user_agent:
-                device_model = 'Xiaomi Redmi'
-            elif 'POCO' in user_agent:
-                device_model = 'POCO Phone'
-            else:
-                device_model = 'Xiaomi Phone'
-        
-        # OnePlus devices
-        elif 'OnePlus' in user_agent:
-            device_model = 'OnePlus Phone'
-        
-        # Huawei devices
-        elif 'Huawei' in user_agent:
-            device_model = 'Huawei Phone'
-        
-        # Google devices
-        elif 'Google' in user_agent or 'Pixel' in user_agent:
-            device_model = 'Google Pixel'
-        
-        # Motorola devices
-        elif 'Motorola' in user_agent or 'Moto' in user_agent:
-            device_model = 'Motorola Phone'
-        
-        # OPPO devices
-        elif 'OPPO' in user_agent:
-            device_model = 'OPPO Phone'
-        
-        # Vivo devices
-        elif 'Vivo' in user_agent:
-            device_model = 'Vivo Phone'
-        
-        # Realme devices
-        elif 'Realme' in user_agent:
-            device_model = 'Realme Phone'
-        
-        # Try to extract specific model number
-        import re
-        model_patterns = [
-            r'iQOO [0-9]+',    # iQOO models (prioritize iQOO)
-            r'SM-[A-Z0-9]+',   # Samsung models
-            r'MI [0-9]+',      # Xiaomi models
-            r'Pixel [0-9]+',   # Google Pixel models
-            r'iPhone [0-9,]+', # iPhone models
-        ]
-        
-        for pattern in model_patterns:
-            match = re.search(pattern, user_agent)
-            if match:
-                # For Samsung, keep the brand name but add model
-                if 'SM-' in match.group() and 'Samsung' in device_model:
-                    device_model = f"{device_model} ({match.group()})"
-                else:
-                    device_model = match.group()
+        device_name = classify_android(user_agent)
+    else:
+        for substring, apple_type, pattern, fallback in APPLE_DEVICE_RULES:
+            if substring in user_agent:
+                os_name = 'iOS'
+                device_type = apple_type
+                match = pattern.search(user_agent)
+                device_name = match.group() if match else fallback
                 break
-        
-        device_name = device_model
-        
-    elif 'iPhone' in user_agent:
-        os_name = 'iOS'
-        device_type = 'Mobile'
-        
-        # Try to extract iPhone model
-        import re
-        iphone_match = re.search(r'iPhone [0-9,]+', user_agent)
-        if iphone_match:
-            device_name = iphone_match.group()
-        else:
-            device_name = 'iPhone'
-            
-    elif 'iPad' in user_agent:
-        os_name = 'iOS'
-        device_type = 'Tablet'
-        
-        # Try to extract iPad model
-        import re
-        ipad_match = re.search(r'iPad [A-Z0-9]+', user_agent)
-        if ipad_match:
-            device_name = ipad_match.group()
         else:
-            device_name = 'iPad'
-            
-    elif 'Tablet' in user_agent:
-        device_type = 'Tablet'
-        device_name = 'Android Tablet'
-    
-    # Desktop detection (after mobile/tablet detection)
-    elif 'Windows' in user_agent:
-        os_name = 'Windows'
-        device_type = 'Desktop'
-        device_name = f"{pc_username}'s Windows PC"
-    elif 'Mac' in user_agent:
-        os_name = 'macOS'
-        device_type = 'Desktop'
-        device_name = f"{pc_username}'s Mac"
-    elif 'Linux' in user_agent:
-        os_name = 'Linux'
-        device_type = 'Desktop'
-        device_name = f"{pc_username}'s Linux PC"
-    
-    # Enhanced browser detection
+            if 'Tablet' in user_agent:
+                device_type = 'Tablet'
+                device_name = 'Android Tablet'
+            else:
+                for substring, desktop_os, name_template in DESKTOP_RULES:
+                    if substring in user_agent:
+                        os_name = desktop_os
+                        device_type = 'Desktop'
+                        device_name = name_template.format(PC_USERNAME)
+                        break
+    
     browser = 'Unknown'
     browser_version = ''
     if 'Chrome' in user_agent:
@@ -401,104 +2193,286 @@ def get_device_info(request):
                 version_end = user_agent.find(';', version_start)
             if version_end != -1:
                 browser_version = user_agent[version_start:version_end]
-    elif 'Firefox' in user_agent:
-        browser = 'Firefox'
-    elif 'Safari' in user_agent and 'Chrome' not in user_agent:
-        browser = 'Safari'
-    elif 'Edge' in user_agent:
-        browser = 'Edge'
-    
-    # Create a friendly display name
-    if device_type == 'Desktop':
-        display_name = f"{device_name} ({browser})"
     else:
-        display_name = f"{device_name} ({browser})"
+        browser = next((name for substring, name in BROWSER_RULES if substring in user_agent), browser)
     
     if browser_version:
         display_name = f"{device_name} ({browser} {browser_version})"
+    else:
+        display_name = f"{device_name} ({browser})"
     
-    return {
-        'type': device_type,
-        'browser': browser,
-        'browser_version': browser_version,
-        'os_name': os_name,
-        'device_name': device_name,
-        'display_name': display_name,
-        'pc_username': pc_username,
+    return (
+        ('type', device_type),
+        ('browser', browser),
+        ('browser_version', browser_version),
+        ('os_name', os_name),
+        ('device_name', device_name),
+        ('display_name', display_name),
+        ('pc_username', PC_USERNAME)
+    )
+
+def get_device_info(request):
+    """Extract device information from request with enhanced detection"""
+    user_agent = request.headers.get('User-Agent', 'Unknown')
+    device_info = dict(classify_user_agent(user_agent))
+    device_info.update({
         'user_agent': user_agent,
         'ip': request.remote_addr,
         'timestamp': datetime.now().isoformat()
-    }
+    })
+    return device_info
 
 def get_config():
     """Get current configuration"""
     return {
-        'max_file_size': app.config['MAX_CONTENT_LENGTH'],
-        'max_file_size_mb': 'Unlimited' if app.config['MAX_CONTENT_LENGTH'] == 0 else app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024),
+        'max_file_size': UPLOAD_MAX_BYTES or 0,
+        'max_file_size_mb': 'Unlimited' if not UPLOAD_MAX_BYTES else UPLOAD_MAX_BYTES // (1024 * 1024),
         'session_enabled': True,  # Session management is enabled
         'auto_refresh_interval': app.config['AUTO_REFRESH_INTERVAL'],
-        'allowed_extensions': list(ALLOWED_EXTENSIONS)
+        'allowed_extensions': list(ALLOWED_EXTENSIONS),
+        'batch_operations': BATCH_OPERATIONS_ENABLED,
+        'batch_upload_max_files': BATCH_UPLOAD_MAX_FILES,
+        'batch_upload_max_bytes': BATCH_UPLOAD_MAX_BYTES,
+        'batch_upload_concurrency': BATCH_UPLOAD_CONCURRENCY
     }
 
+class CountedBody:
+    """Response body wrapper that counts the bytes sent and reports them when the response is closed"""
+    
+    def __init__(self, body, on_close):
+        self.body = body
+        self.on_close = on_close
+        self.sent = 0
+    
+    def __iter__(self):
+        for chunk in self.body:
+            self.sent += len(chunk)
+            yield chunk
+    
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            on_close, self.on_close = self.on_close, None
+            if on_close:
+                on_close(self.sent)
+
+def is_file_body(response):
+    """Whether a response hands the server an open file, through wsgi.file_wrapper or as is"""
+    body = response.response
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+        return True
+    return response.direct_passthrough and hasattr(body, 'fileno') and hasattr(body, 'close')
+
+def start_request_metrics():
+    """Note when a request started and count it in flight"""
+    rule = request.url_rule
+    route = rule.rule if rule else 'unmatched'
+    received = request.content_length or 0
+    g.request_metrics = (time.perf_counter(), route, received)
+    requests_in_flight.inc(route)
+    if received >= TRANSFER_MIN_BYTES:
+        transfers_in_flight.inc('upload')
+
+def finish_request_metrics(response):
+    """Record a request's upload side now and its response once the body has been sent"""
+    started = g.pop('request_metrics', None)
+    if started is None:
+        return response
+    start, route, received = started
+    method, status = request.method, str(response.status_code)
+    if received:
+        request_bytes.inc(route, amount=received)
+    if received >= TRANSFER_MIN_BYTES:
+        transfers_in_flight.dec('upload')
+        transfer_throughput.observe(received / max(time.perf_counter() - start, 1e-6), route, 'upload')
+    
+    length = None if response.is_streamed else response.calculate_content_length()
+    if length is not None and length < TRANSFER_MIN_BYTES:
+        # Small bodies go out in one write; no need to follow them
+        response_bytes.inc(route, amount=length)
+        request_duration.observe(time.perf_counter() - start, route, method, status)
+        requests_in_flight.dec(route)
+        return response
+    
+    transfers_in_flight.inc('download')
+    def body_sent(sent):
+        elapsed = time.perf_counter() - start
+        response_bytes.inc(route, amount=sent)
+        request_duration.observe(elapsed, route, method, status)
+        requests_in_flight.dec(route)
+        transfers_in_flight.dec('download')
+        if sent >= TRANSFER_MIN_BYTES:
+            transfer_throughput.observe(sent / max(elapsed, 1e-6), route, 'download')
+    
+    if is_file_body(response):
+        # Wrapping the file would take it off the server's sendfile() path, so
+        # count its Content-Length once the server is done and closes it
+        body = response.response
+        file_close = body.close
+        def close_file():
+            body.close = file_close
+            try:
+                file_close()
+            finally:
+                body_sent(response.content_length or 0)
+        try:
+            body.close = close_file
+        except AttributeError:
+            body_sent(response.content_length or 0)
+        return response
+    response.response = CountedBody(response.response, body_sent)
+    return response
+
+def abort_request_metrics(exc=None):
+    """Close the books on a request that raised before after_request ran"""
+    started = g.pop('request_metrics', None)
+    if started is None:
+        return
+    start, route, received = started
+    request_duration.observe(time.perf_counter() - start, route, request.method, '500')
+    requests_in_flight.dec(route)
+    if received >= TRANSFER_MIN_BYTES:
+        transfers_in_flight.dec('upload')
+
+def install_socketio_metrics():
+    """Count Socket.IO emits by event and the size of every event packet sent to a client"""
+    server = socketio.server
+    server_emit = server.emit
+    eio_send_packet = server.eio.send_packet
+    
+    def counted_emit(event, *args, **kwargs):
+        socketio_emits.inc(event)
+        return server_emit(event, *args, **kwargs)
+    
+    def measured_send_packet(sid, packet):
+        # Every message to a client passes here, whether sent to one sid or a
+        # room; event packets are encoded as 2[namespace,][id]["event",...]
+        data = packet.data
+        if isinstance(data, str) and data.startswith('2'):
+            start = data.find('["')
+            if start != -1:
+                socketio_packet_bytes.observe(len(data), data[start + 2:data.find('"', start + 2)])
+        return eio_send_packet(sid, packet)
+    
+    server.emit = counted_emit
+    server.eio.send_packet = measured_send_packet
+
+def profiling_allowed():
+    """Profiling is on and the request comes from this machine"""
+    return PROFILING_ENABLED and request.remote_addr in ('127.0.0.1', '::1')
+
+def start_request_profile():
+    """Profile this request with cProfile when it asks for it with PROFILE_HEADER"""
+    if not request.headers.get(PROFILE_HEADER) or not profiling_allowed():
+        return
+    if not request_profile_lock.acquire(blocking=False):
+        g.request_profile = None  # Another request is being profiled
+        return
+    profiler = cProfile.Profile()
+    g.request_profile = profiler
+    profiler.enable()
+
+def finish_request_profile(response):
+    """Stop the request's profile once its body has been sent and save it to TEMP_FOLDER"""
+    if 'request_profile' not in g:
+        return response
+    profiler = g.pop('request_profile')
+    if profiler is None:
+        response.headers[PROFILE_FILE_HEADER] = 'busy'
+        return response
+    endpoint = (request.endpoint or 'unmatched').replace('.', '_')
+    filename = f"request-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{endpoint}.pstats"
+    response.headers[PROFILE_FILE_HEADER] = filename
+    
+    def save_profile():
+        profiler.disable()
+        request_profile_lock.release()
+        try:
+            profiler.dump_stats(os.path.join(TEMP_FOLDER, filename))
+        except OSError as e:
+            print(f"Error saving request profile: {e}")
+    response.call_on_close(save_profile)
+    return response
+
+def abort_request_profile(exc=None):
+    """Drop the profile of a request that raised before after_request ran"""
+    profiler = g.pop('request_profile', None)
+    if profiler is not None:
+        profiler.disable()
+        request_profile_lock.release()
+
+if REQUEST_METRICS_ENABLED:
+    app.before_request(start_request_metrics)
+    app.after_request(finish_request_metrics)
+    app.teardown_request(abort_request_metrics)
+    install_socketio_metrics()
+
+if PROFILING_ENABLED:
+    app.before_request(start_request_profile)
+    app.after_request(finish_request_profile)
+    app.teardown_request(abort_request_profile)
+
+# Build the file catalog at startup
+catalog_rescan()
+
 @app.route('/')
 def index():
     """Main page with QR code and file management"""
-    local_ip = get_local_ip()
-    server_url = f"http://{local_ip}:5000"
+    with server_page_lock:
+        cache = dict(server_page_cache)
+    if 'local_ip' not in cache:
+        cache = refresh_server_page_cache()
     
-    # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(server_url)
-    qr.make(fit=True)
+    if 'index_html' not in cache:
+        cache['index_html'] = render_template('index.html', 
+                                              qr_code=cache['qr_code_b64'], 
+                                              server_url=cache['server_url'],
+                                              local_ip=cache['local_ip'],
+                                              config=get_config())
+        cache['index_etag'] = hashlib.sha1(cache['index_html'].encode()).hexdigest()
+        with server_page_lock:
+            # Only keep it if the address didn't change while rendering
+            if server_page_cache.get('local_ip') == cache['local_ip']:
+                server_page_cache['index_html'] = cache['index_html']
+                server_page_cache['index_etag'] = cache['index_etag']
     
-    # Create QR code image
-    img = qr.make_image(fill_color="cyan", back_color="black")
-    img_buffer = BytesIO()
-    img.save(img_buffer, 'PNG')
-    img_buffer.seek(0)
-    qr_code_b64 = base64.b64encode(img_buffer.getvalue()).decode()
+    response = Response(cache['index_html'], mimetype='text/html')
+    response.set_etag(cache['index_etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/qr.png')
+def get_qr_code():
+    """Connection QR code as a cacheable PNG"""
+    with server_page_lock:
+        cache = dict(server_page_cache)
+    if 'local_ip' not in cache:
+        cache = refresh_server_page_cache()
     
-    return render_template('index.html', 
-                         qr_code=qr_code_b64, 
-                         server_url=server_url,
-                         local_ip=local_ip,
-                         config=get_config())
+    response = Response(cache['qr_png'], mimetype='image/png')
+    response.set_etag(cache['qr_etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/session/create', methods=['POST'])
 def create_session_endpoint():
     """Create a new session for a device"""
     try:
         device_info = get_device_info(request)
-        device_ip = device_info.get('ip', 'unknown')
-        
-        # Check if device already has an active session
-        if device_ip in session_tokens:
-            existing_token = session_tokens[device_ip]
-            if existing_token in active_sessions:
-                # Return existing session
-                session_data = active_sessions[existing_token]
-                session_data['last_activity'] = datetime.now().isoformat()
-                
-                return jsonify({
-                    'success': True,
-                    'token': existing_token,
-                    'device_info': device_info,
-                    'session_id': session_data['session_id'],
-                    'message': 'Existing session found',
-                    'is_new': False
-                })
-        
-        # Create new session
-        token = create_session(device_info)
-        session_data = active_sessions[token]
+        
+        # Reuses the device's active session if it has one
+        session_data, is_new = create_session(device_info)
         
         return jsonify({
             'success': True,
-            'token': token,
+            'token': session_data['token'],
             'device_info': device_info,
             'session_id': session_data['session_id'],
-            'message': 'Session created successfully',
-            'is_new': True
+            'message': 'Session created successfully' if is_new else 'Existing session found',
+            'is_new': is_new
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -510,8 +2484,8 @@ def validate_session_endpoint():
         data = request.get_json()
         token = data.get('token', '')
         
-        if validate_session(token):
-            session_data = active_sessions[token]
+        session_data = validate_session(token)
+        if session_data:
             return jsonify({
                 'success': True,
                 'valid': True,
@@ -532,14 +2506,13 @@ def get_active_sessions():
     """Get all active sessions"""
     try:
         sessions = []
-        for token, session_data in active_sessions.items():
-            if session_data['is_active']:
-                sessions.append({
-                    'token': token,
-                    'device_info': session_data['device_info'],
-                    'created_at': session_data['created_at'],
-                    'last_activity': session_data['last_activity']
-                })
+        for session_data in session_store.all():
+            sessions.append({
+                'token': session_data['token'],
+                'device_info': session_data['device_info'],
+                'created_at': datetime.fromtimestamp(session_data['created_at']).isoformat(),
+                'last_activity': datetime.fromtimestamp(session_data['last_activity']).isoformat()
+            })
         
         return jsonify({
             'success': True,
@@ -556,82 +2529,43 @@ def get_app_config():
 
 @app.route('/api/system-info')
 def get_system_info_api():
-    """Get system information"""
-    return jsonify(get_system_info())
+    """Get system information from the latest snapshot, 304 if the client has it"""
+    snapshot = get_system_info_snapshot()
+    response = Response(snapshot['json'], mimetype='application/json')
+    response.set_etag(snapshot['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/files')
 def get_files():
-    """Get list of downloadable files from both uploads and downloads folders"""
-    files = []
+    """Get list of downloadable files from both uploads and downloads folders.
+    
+    With limit or cursor, returns one page ({files, next_cursor, total, seq});
+    otherwise the whole list as before. sort=name|size|mtime, order=asc|desc
+    and fields=a,b,... apply either way.
+    """
     try:
-        # Get files from both folders
-        folders = [UPLOAD_FOLDER, DOWNLOAD_FOLDER]
-        
-        for folder in folders:
-            if os.path.exists(folder):
-                for filename in os.listdir(folder):
-                    file_path = os.path.join(folder, filename)
-                    if os.path.isfile(file_path):
-                        stat = os.stat(file_path)
-                        # Add folder info to distinguish source
-                        source = 'phone' if folder == UPLOAD_FOLDER else 'pc'
-                        files.append({
-                            'name': filename,
-                            'size': format_file_size(stat.st_size),
-                            'size_bytes': stat.st_size,
-                            'icon': get_file_icon(filename),
-                            'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                            'extension': filename.rsplit('.', 1)[1].lower() if '.' in filename else 'unknown',
-                            'source': source,
-                            'folder': folder
-                        })
-    except Exception as e:
-        print(f"Error reading files: {e}")
+        sort, order, cursor, limit, fields = parse_page_args(MAX_FILES_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        files = []
+        try:
+            files = catalog_page(sort, order, fields=fields)['files']
+        except Exception as e:
+            print(f"Error reading files: {e}")
+        return jsonify(files)
     
-    return jsonify(files)
+    if 'limit' not in request.args:
+        limit = FILES_PAGE_SIZE
+    return jsonify(catalog_page(sort, order, cursor, limit, fields=fields))
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """Handle file upload from phone to PC"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        if file and file.filename and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Add timestamp to avoid conflicts
-            name, ext = os.path.splitext(filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{name}_{timestamp}{ext}"
-            
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
-            
-            file_size = os.path.getsize(file_path)
-            result = {
-                'success': True,
-                'filename': filename,
-                'size': format_file_size(file_size),
-                'size_bytes': file_size,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'icon': get_file_icon(filename)
-            }
-            
-            # Broadcast file event
-            broadcast_file_event('upload', {
-                'filename': filename,
-                'size': format_file_size(file_size),
-                'source': 'phone'
-            })
-            
-            return jsonify(result)
-        else:
-            return jsonify({'error': 'File type not allowed'}), 400
-    
+        return receive_single_upload(UPLOAD_FOLDER, 'phone')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -639,60 +2573,266 @@ def upload_file():
 def download_file(filename):
     """Download file from either uploads or downloads folder"""
     try:
-        # Try downloads folder first (PC files)
-        file_path = os.path.join(DOWNLOAD_FOLDER, filename)
-        if os.path.exists(file_path):
-            return send_from_directory(DOWNLOAD_FOLDER, filename, as_attachment=True)
-        
-        # Try uploads folder (phone files)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.exists(file_path):
-            return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=True)
+        # Try downloads folder first (PC files), then uploads folder (phone files)
+        for folder in [DOWNLOAD_FOLDER, UPLOAD_FOLDER]:
+            response = send_file_ranges(folder, filename)
+            if response is not None:
+                return response
         
         return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 404
 
+@app.route('/api/thumbnail/<filename>')
+def get_thumbnail(filename):
+    """JPEG thumbnail of an image, rendered now if its upload didn't already queue it"""
+    try:
+        entry = catalog_lookup(filename)
+        if not entry or not has_thumbnail(entry):
+            return jsonify({'error': 'No thumbnail for this file'}), 404
+        
+        path = thumbnail_job(entry).result(timeout=THUMBNAIL_TIMEOUT)
+        if not path:
+            return jsonify({'error': 'Image could not be read'}), 415
+        
+        response = send_file(os.path.abspath(path), mimetype='image/jpeg', etag=os.path.basename(path), conditional=True)
+        # Versioned URLs from /api/files never change content; plain ones must revalidate
+        if request.args.get('v'):
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/upload-pc', methods=['POST'])
 def upload_file_pc():
     """Handle file upload from PC to downloads folder"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+        return receive_single_upload(DOWNLOAD_FOLDER, 'pc')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """Handle several files in one request, from the phone or (source=pc) the PC"""
+    if not BATCH_OPERATIONS_ENABLED:
+        return jsonify({'error': 'Batch operations are disabled'}), 404
+    try:
+        source = request.args.get('source', 'phone')
+        if source not in ('phone', 'pc'):
+            return jsonify({'error': 'Invalid upload source'}), 400
+        return receive_batch_upload(UPLOAD_FOLDER if source == 'phone' else DOWNLOAD_FOLDER, source)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/upload/chunked', methods=['POST'])
+def init_chunked_upload():
+    """Start a resumable chunked upload"""
+    try:
+        data = request.get_json() or {}
+        original_name = data.get('filename', '')
+        source = data.get('source', 'phone')
         
-        file = request.files['file']
-        if file.filename == '':
+        if not original_name:
             return jsonify({'error': 'No file selected'}), 400
+        if not allowed_file(original_name):
+            return jsonify({'error': 'File type not allowed'}), 400
+        if source not in ('phone', 'pc'):
+            return jsonify({'error': 'Invalid upload source'}), 400
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'File size required'}), 400
+        if size < 0:
+            return jsonify({'error': 'File size required'}), 400
+        if UPLOAD_MAX_BYTES and size > UPLOAD_MAX_BYTES:
+            return jsonify({'error': 'File too large'}), 413
+        folder = UPLOAD_FOLDER if source == 'phone' else DOWNLOAD_FOLDER
+        try:
+            check_free_space(folder, size)
+        except UploadRejected as e:
+            return jsonify({'error': str(e)}), e.status
+        try:
+            expected = get_expected_digests(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if file and file.filename and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(DOWNLOAD_FOLDER, filename)
-            file.save(file_path)
-            
-            file_size = os.path.getsize(file_path)
-            result = {
-                'success': True,
-                'filename': filename,
-                'size': format_file_size(file_size),
-                'size_bytes': file_size,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'icon': get_file_icon(filename)
+        prune_stale_uploads()
+        
+        # Part file lives in the destination folder so finalize is an atomic rename
+        upload_id = secrets.token_urlsafe(16)
+        part_path = os.path.join(folder, f".{upload_id}{PART_FILE_SUFFIX}")
+        with open(part_path, 'wb') as part_file:
+            if UPLOAD_PREALLOCATE and size:
+                try:
+                    os.posix_fallocate(part_file.fileno(), 0, size)  # Chunks then land in reserved space
+                except OSError:
+                    pass
+        
+        with chunked_uploads_lock:
+            chunked_uploads[upload_id] = {
+                'filename': original_name,
+                'source': source,
+                'folder': folder,
+                'size': size,
+                'part_path': part_path,
+                'received': [],
+                'last_activity': time.time(),
+                'expected': expected,  # Digests the client says the finished file has
+                'hasher': UploadHasher(),
+                'hashed_bytes': 0,  # Prefix of the file already fed to hasher
+                'lock': threading.Lock()
             }
-            
-            # Broadcast file event
-            broadcast_file_event('upload', {
-                'filename': filename,
-                'size': format_file_size(file_size),
-                'source': 'pc'
-            })
-            
-            return jsonify(result)
-        else:
-            return jsonify({'error': 'File type not allowed'}), 400
-    
+        share_chunked_upload(upload_id, chunked_uploads[upload_id])
+        
+        return jsonify({
+            'success': True,
+            'upload_id': upload_id,
+            'chunk_size': CHUNK_SIZE,
+            'received': []
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/upload/chunked/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """Report which byte ranges of a chunked upload have been received"""
+    upload = find_chunked_upload(upload_id)
+    with chunked_uploads_lock:
+        if not upload:
+            return jsonify({'error': 'Upload not found'}), 404
+        return jsonify({
+            'success': True,
+            'upload_id': upload_id,
+            'size': upload['size'],
+            'chunk_size': CHUNK_SIZE,
+            'received': [list(r) for r in upload['received']]
+        })
+
+@app.route('/api/upload/chunked/<upload_id>', methods=['PUT'])
+def put_chunk(upload_id):
+    """Write one chunk at ?offset=N straight into the part file"""
+    try:
+        upload = find_chunked_upload(upload_id)
+        if not upload:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        try:
+            offset = int(request.args.get('offset', ''))
+        except ValueError:
+            return jsonify({'error': 'Chunk offset required'}), 400
+        length = request.content_length
+        if offset < 0 or length is None or offset + length > upload['size']:
+            return jsonify({'error': 'Chunk outside file bounds'}), 400
+        
+        # Stream the body to disk; a dropped connection still keeps what arrived.
+        # In-order bytes are hashed as they pass so finalize needn't re-read them.
+        written = 0
+        with upload['lock']:
+            try:
+                with open(upload['part_path'], 'r+b') as part_file:
+                    part_file.seek(offset)
+                    while written < length:
+                        data = request.stream.read(min(CHUNK_WRITE_BUFFER, length - written))
+                        if not data:
+                            break
+                        run_blocking(part_file.write, data)
+                        position = offset + written
+                        hashed = upload['hashed_bytes']
+                        if position <= hashed < position + len(data):
+                            upload['hasher'].update(data[hashed - position:])
+                            upload['hashed_bytes'] = position + len(data)
+                        written += len(data)
+            finally:
+                if written:
+                    with chunked_uploads_lock:
+                        upload['received'] = add_range(upload['received'], offset, offset + written)
+                        upload['last_activity'] = time.time()
+                    if state_broker_address:
+                        # Merged on the broker, since another worker may be adding a chunk of this upload too
+                        shared = shared_state.hadd_range(CHUNKED_UPLOADS_KEY, upload_id, 'received', offset,
+                                                         offset + written, {'last_activity': upload['last_activity']})
+                        if shared:
+                            with chunked_uploads_lock:
+                                upload['received'] = shared['received']
+        
+        if written < length:
+            return jsonify({'error': 'Incomplete chunk'}), 400
+        
+        with chunked_uploads_lock:
+            received = [list(r) for r in upload['received']]
+        return jsonify({'success': True, 'received': received})
+    except FileNotFoundError:
+        return jsonify({'error': 'Upload not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/upload/chunked/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(upload_id):
+    """Atomically move a fully received part file into place"""
+    try:
+        upload = find_chunked_upload(upload_id)
+        with chunked_uploads_lock:
+            if not upload:
+                return jsonify({'error': 'Upload not found'}), 404
+            if upload['size'] and upload['received'] != [[0, upload['size']]]:
+                return jsonify({
+                    'error': 'Upload incomplete',
+                    'received': [list(r) for r in upload['received']]
+                }), 409
+            chunked_uploads.pop(upload_id, None)
+        if state_broker_address:
+            shared_state.hdel(CHUNKED_UPLOADS_KEY, upload_id)
+        
+        filename = make_upload_filename(upload['filename'], upload['source'])
+        try:
+            with upload['lock']:
+                # Hash whatever arrived out of order
+                hasher = hash_file(upload['part_path'], upload['hasher'], upload['hashed_bytes'])
+            previous = catalog_lookup_in(upload['folder'], filename)
+            digests = hasher.digests()
+            mismatch = digest_mismatch_response(upload['expected'], digests)
+            if mismatch:
+                os.remove(upload['part_path'])
+                return mismatch
+            commit_part_file(upload['part_path'], upload['folder'], filename, digests['sha256'])
+        except Exception:
+            restore_chunked_upload(upload_id, upload)
+            raise
+        if previous:
+            release_blob(previous.get('digest'))
+        
+        return jsonify(finish_upload(upload['folder'], filename, upload['source'], digests))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def restore_chunked_upload(upload_id, upload):
+    """Put back an upload whose finalize failed, so the client can retry it; gives up if the part file is gone"""
+    if not os.path.exists(upload['part_path']):
+        return
+    # The failed attempt fed the hasher, so the retry hashes from the start
+    upload.update(hasher=UploadHasher(), hashed_bytes=0, last_activity=time.time())
+    with chunked_uploads_lock:
+        chunked_uploads[upload_id] = upload
+    share_chunked_upload(upload_id, upload)
+
+@app.route('/api/upload/chunked/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """Cancel a chunked upload and remove its part file"""
+    upload = find_chunked_upload(upload_id)
+    with chunked_uploads_lock:
+        chunked_uploads.pop(upload_id, None)
+    if state_broker_address:
+        shared_state.hdel(CHUNKED_UPLOADS_KEY, upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        os.remove(upload['part_path'])
+    except FileNotFoundError:
+        pass
+    return jsonify({'success': True})
+
 @app.route('/api/delete/<filename>')
 def delete_file(filename):
     """Delete a file from either uploads or downloads folder"""
@@ -701,6 +2841,8 @@ def delete_file(filename):
         file_path = os.path.join(DOWNLOAD_FOLDER, filename)
         if os.path.exists(file_path):
             os.remove(file_path)
+            entry = catalog_remove(DOWNLOAD_FOLDER, filename)
+            release_blob(entry and entry.get('digest'))
             
             # Broadcast file event
             broadcast_file_event('delete', {
@@ -714,6 +2856,8 @@ def delete_file(filename):
         file_path = os.path.join(UPLOAD_FOLDER, filename)
         if os.path.exists(file_path):
             os.remove(file_path)
+            entry = catalog_remove(UPLOAD_FOLDER, filename)
+            release_blob(entry and entry.get('digest'))
             
             # Broadcast file event
             broadcast_file_event('delete', {
@@ -727,20 +2871,114 @@ def delete_file(filename):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def events_response(key, capacity):
+    """Every retained event as a list, or with ?since=<id> the later ones plus last_id and complete"""
+    since = request.args.get('since')
+    if since is None:
+        return jsonify(shared_state.events_since(key, None, capacity)['events'])
+    try:
+        since = int(since)
+    except ValueError:
+        return jsonify({'error': 'Invalid since'}), 400
+    # complete is false when events after since have already been dropped
+    return jsonify(shared_state.events_since(key, since, capacity))
+
 @app.route('/api/events')
 def get_events():
     """Get recent file events"""
-    return jsonify(file_events)
+    return events_response(FILE_EVENTS_KEY, MAX_FILE_EVENTS)
+
+@app.route('/metrics')
+def get_metrics():
+    """Request, transfer and Socket.IO metrics of this process in the Prometheus text format"""
+    if not REQUEST_METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def profiler_unavailable():
+    """Error response when the profiling admin API can't be used for this request, else None"""
+    if not PROFILING_ENABLED:
+        return jsonify({'error': 'Profiling is disabled'}), 404
+    if not profiling_allowed():
+        return jsonify({'error': 'Profiling is only available from this machine'}), 403
+    return None
+
+def list_profiles():
+    """Profile files in TEMP_FOLDER, newest first"""
+    profiles = []
+    for entry in os.scandir(TEMP_FOLDER):
+        if entry.is_file() and entry.name.endswith(('.collapsed', '.pstats')):
+            stat = entry.stat()
+            profiles.append({'name': entry.name, 'size': stat.st_size, 'modified': stat.st_mtime})
+    return sorted(profiles, key=lambda profile: profile['modified'], reverse=True)
+
+@app.route('/api/admin/profiler')
+def get_profiler_status():
+    """Sampling profiler state and the profiles taken so far"""
+    error = profiler_unavailable()
+    if error:
+        return error
+    return jsonify(dict(sampling_profiler.status(), profiles=list_profiles()))
+
+@app.route('/api/admin/profiler/start', methods=['POST'])
+def start_profiler():
+    """Sample every thread's stack for {seconds, interval}; the result is a collapsed-stack file"""
+    error = profiler_unavailable()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', 30))
+        interval = float(data.get('interval', PROFILER_DEFAULT_INTERVAL))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid seconds or interval'}), 400
+    if not 0 < seconds <= PROFILER_MAX_SECONDS or not 0.001 <= interval <= 1:
+        return jsonify({'error': f'seconds must be up to {PROFILER_MAX_SECONDS} and interval 0.001 to 1'}), 400
+    try:
+        return jsonify(sampling_profiler.start(seconds, interval)), 202
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/api/admin/profiler/stop', methods=['POST'])
+def stop_profiler():
+    """Finish the running sampling profile early"""
+    error = profiler_unavailable()
+    if error:
+        return error
+    return jsonify(sampling_profiler.stop())
+
+@app.route('/api/admin/profiler/files/<filename>')
+def download_profile(filename):
+    """A collapsed-stack or pstats profile from TEMP_FOLDER"""
+    error = profiler_unavailable()
+    if error:
+        return error
+    if not filename.endswith(('.collapsed', '.pstats')):
+        return jsonify({'error': 'Not a profile'}), 404
+    return send_from_directory(os.path.abspath(TEMP_FOLDER), filename, as_attachment=True)
+
+@app.route('/api/metrics/history')
+def get_metrics_history():
+    """Recorded resource samples; metrics=a,b,... picks metrics and since=<epoch seconds> skips older samples"""
+    if resource_monitor is None:
+        return jsonify({'error': 'Monitoring is disabled'}), 404
+    metrics = request.args.get('metrics')
+    try:
+        since = float(request.args['since']) if 'since' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'Invalid since'}), 400
+    history = resource_monitor.get_history(metrics.split(',') if metrics else None, since)
+    return jsonify(dict(history, interval=MONITORING_INTERVAL, thresholds=MONITORING_THRESHOLDS))
 
 @app.route('/api/devices')
 def get_devices():
     """Get connected devices"""
-    return jsonify(list(connected_devices.values()))
+    return jsonify(get_connected_devices())
 
 @app.route('/api/device-events')
 def get_device_events():
     """Get recent device events"""
-    return jsonify(device_events)
+    return events_response(DEVICE_EVENTS_KEY, MAX_DEVICE_EVENTS)
 
 @app.route('/api/cleanup-files', methods=['POST'])
 def cleanup_files():
@@ -752,21 +2990,16 @@ def cleanup_files():
         cutoff_time = datetime.now().timestamp() - (hours * 3600)
         deleted_count = 0
         
-        # Clean uploads folder
-        for filename in os.listdir(UPLOAD_FOLDER):
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            if os.path.isfile(file_path):
-                if os.path.getmtime(file_path) < cutoff_time:
-                    os.remove(file_path)
-                    deleted_count += 1
-        
-        # Clean downloads folder
-        for filename in os.listdir(DOWNLOAD_FOLDER):
-            file_path = os.path.join(DOWNLOAD_FOLDER, filename)
-            if os.path.isfile(file_path):
-                if os.path.getmtime(file_path) < cutoff_time:
-                    os.remove(file_path)
+        # Clean both folders using catalog mtimes
+        for entry in catalog_files():
+            if entry['mtime'] < cutoff_time:
+                try:
+                    os.remove(os.path.join(entry['folder'], entry['name']))
                     deleted_count += 1
+                except FileNotFoundError:
+                    pass
+                catalog_remove(entry['folder'], entry['name'])
+                release_blob(entry.get('digest'))
         
         return jsonify({
             'success': True,
@@ -778,48 +3011,57 @@ def cleanup_files():
 
 @app.route('/api/search-files')
 def search_files():
-    """Search files by name, type, or date from both folders"""
+    """Search files by name, type, or date from both folders.
+    
+    With the search index enabled, q is matched by token, prefix, substring and
+    typo-tolerant lookups and results are ranked by relevance unless another sort
+    is given. Results are capped at MAX_SEARCH_RESULTS; pass limit or cursor to
+    page through them with the same parameters and response shape as /api/files.
+    """
     try:
         query = request.args.get('q', '').lower()
         file_type = request.args.get('type', '').lower()
         date_filter = request.args.get('date', '').lower()
+        use_index = SEARCH_INDEX_ENABLED and bool(query.strip())
         
-        files = []
-        folders = [UPLOAD_FOLDER, DOWNLOAD_FOLDER]
-        
-        for folder in folders:
-            if os.path.exists(folder):
-                for filename in os.listdir(folder):
-                    file_path = os.path.join(folder, filename)
-                    if os.path.isfile(file_path):
-                        stat = os.stat(file_path)
-                        
-                        # Apply filters
-                        if query and query not in filename.lower():
-                            continue
-                            
-                        if file_type and not filename.lower().endswith(file_type):
-                            continue
-                        
-                        if date_filter:
-                            file_date = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d')
-                            if date_filter not in file_date:
-                                continue
-                        
-                        # Add folder info to distinguish source
-                        source = 'phone' if folder == UPLOAD_FOLDER else 'pc'
-                        files.append({
-                            'name': filename,
-                            'size': format_file_size(stat.st_size),
-                            'size_bytes': stat.st_size,
-                            'icon': get_file_icon(filename),
-                            'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                            'extension': filename.rsplit('.', 1)[1].lower() if '.' in filename else 'unknown',
-                            'source': source,
-                            'folder': folder
-                        })
+        try:
+            sorts = ('relevance',) + tuple(FILE_SORT_KEYS) if use_index else FILE_SORT_KEYS
+            sort, order, cursor, limit, fields = parse_page_args(MAX_SEARCH_RESULTS, 'relevance' if use_index else 'mtime', sorts)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify(files)
+        hits = None
+        if use_index and sort != 'relevance':
+            with catalog_lock:
+                hits = search_index_query(query)
+        
+        def match(entry):
+            filename = entry['name']
+            
+            # Apply filters
+            if hits is not None:
+                if (entry['folder'], filename) not in hits:
+                    return False
+            elif query and not use_index and query not in filename.lower():
+                return False
+                
+            if file_type and not filename.lower().endswith(file_type):
+                return False
+            
+            if date_filter:
+                file_date = datetime.fromtimestamp(entry['mtime']).strftime('%Y-%m-%d')
+                if date_filter not in file_date:
+                    return False
+            
+            return True
+        
+        if sort == 'relevance':
+            page = catalog_search(query, cursor, limit, match if file_type or date_filter else None, fields)
+        else:
+            page = catalog_page(sort, order, cursor, limit, match, fields)
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            return jsonify(page['files'])
+        return jsonify(page)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -833,30 +3075,26 @@ def download_zip():
         if not selected_files:
             return jsonify({'error': 'No files selected'}), 400
         
-        import zipfile
-        import tempfile
+        # Resolve files up front; the archive itself is built while streaming
+        entries = []
+        seen = set()
+        for filename in selected_files:
+            if filename in seen:
+                continue
+            # Try downloads folder first (PC files), then uploads folder (phone files)
+            for folder in [DOWNLOAD_FOLDER, UPLOAD_FOLDER]:
+                file_path = safe_join(folder, filename)
+                if file_path and os.path.isfile(file_path):
+                    entries.append((filename, file_path, os.stat(file_path)))
+                    seen.add(filename)
+                    break
         
-        # Create temporary zip file
-        temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-        
-        with zipfile.ZipFile(temp_zip.name, 'w') as zipf:
-            for filename in selected_files:
-                # Try downloads folder first (PC files)
-                file_path = os.path.join(DOWNLOAD_FOLDER, filename)
-                if os.path.exists(file_path):
-                    zipf.write(file_path, filename)
-                    continue
-                
-                # Try uploads folder (phone files)
-                file_path = os.path.join(UPLOAD_FOLDER, filename)
-                if os.path.exists(file_path):
-                    zipf.write(file_path, filename)
-        
-        return send_file(
-            temp_zip.name,
-            as_attachment=True,
-            download_name=f'simpleshare_files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip',
-            mimetype='application/zip'
+        download_name = f'simpleshare_files_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+        return Response(
+            iter_zip_stream(entries),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{download_name}"'},
+            direct_passthrough=True
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -875,31 +3113,28 @@ def handle_connect():
     device_info['session_id'] = None  # Will be set when session is created
     device_info['status'] = 'online'
     device_info['last_seen'] = datetime.now().isoformat()
-    
-    # Store device information
-    connected_devices[sid] = device_info
-    device_last_seen[sid] = datetime.now().timestamp()
-    device_status[sid] = 'online'
+    device_info['worker_pid'] = os.getpid()
     
     # Create or update session for this device
-    token = create_session(device_info)
-    device_info['session_token'] = token
-    device_info['session_id'] = active_sessions[token]['session_id']
+    session_data, _ = create_session(device_info)
+    device_info['session_token'] = session_data['token']
+    device_info['session_id'] = session_data['session_id']
     
-    # Update device info with session data
-    connected_devices[sid] = device_info
+    # Store device information
+    shared_state.hset(DEVICES_KEY, sid, device_info)
+    presence_touch(sid)
     
-    # Broadcast device connection
-    broadcast_device_event('connect', device_info)
+    # Record the connection; clients hear about it in the next devices_delta
+    log_device_event('connect', device_info)
     
     emit('connected', {
         'message': 'Connected to SimpleShare',
         'device_info': device_info,
-        'session_token': token
+        'session_token': session_data['token']
     })
     
-    # Send current devices list to all clients
-    socketio.emit('devices_update', list(connected_devices.values()))
+    # Let all clients know about the new device
+    queue_device_change(sid, device_info)
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -907,71 +3142,250 @@ def handle_disconnect():
     sid = request.sid if hasattr(request, 'sid') else request.environ.get('socketio.sid')
     active_connections.discard(sid)
     
-    # Get device info before removing
-    device_info = connected_devices.get(sid, {})
-    
     # IMMEDIATELY REMOVE DEVICE FROM ALL TRACKING
-    if sid in connected_devices:
-        del connected_devices[sid]
-    if sid in device_last_seen:
-        del device_last_seen[sid]
-    if sid in device_status:
-        del device_status[sid]
-    
-    # Broadcast device disconnection and updated devices list
-    if device_info:
-        device_info['status'] = 'offline'
-        broadcast_device_event('disconnect', device_info)
-        socketio.emit('devices_update', list(connected_devices.values()))
+    remove_device(sid)
 
 @socketio.on('request_system_info')
 def handle_system_info_request():
-    """Send system information to client"""
-    emit('system_info', get_system_info())
+    """Send system information to client and keep sending it when it changes"""
+    join_room(SYSTEM_INFO_ROOM)
+    emit('system_info', get_system_info_snapshot()['info'])
+
+@socketio.on('subscribe_files')
+def handle_subscribe_files(data=None):
+    """Subscribe to file list deltas, catching up from the client's last seen sequence"""
+    since = (data or {}).get('since')
+    # Join first so nothing recorded after the catch-up below is missed;
+    # clients drop anything at or below the sequence they already have
+    join_room(FILES_ROOM)
+    changes = catalog_changes_since(since if isinstance(since, int) else None)
+    if changes is None:
+        # Too far behind for deltas: reload the first page over HTTP
+        emit('files_reset', {'seq': catalog_sequence})
+    elif changes:
+        emit('files_delta', {'seq': changes[-1]['seq'], 'changes': changes})
+
+@socketio.on('replay_events')
+def handle_replay_events(data=None):
+    """Resend file and device events after the ids the client last saw.
+    
+    Without an id only the current last id of that log is sent, so a new
+    client knows where to resume from after a reconnect.
+    """
+    replay = {}
+    for name, key, capacity in (('file', FILE_EVENTS_KEY, MAX_FILE_EVENTS), ('device', DEVICE_EVENTS_KEY, MAX_DEVICE_EVENTS)):
+        since = (data or {}).get(f'{name}_since')
+        log = shared_state.events_since(key, since if isinstance(since, int) else None, capacity)
+        if not isinstance(since, int):
+            log['events'] = []
+        replay[name] = log
+    emit('events_replay', replay)
 
 @socketio.on('request_devices')
 def handle_devices_request():
     """Send connected devices list to client"""
-    emit('devices_list', list(connected_devices.values()))
+    emit('devices_list', [device_summary(device) for device in get_connected_devices()])
 
-@socketio.on('heartbeat')
-def handle_heartbeat():
-    """Handle client heartbeat to track online status"""
-    sid = request.sid if hasattr(request, 'sid') else request.environ.get('socketio.sid')
-    if sid and sid in connected_devices:
-        connected_devices[sid]['last_seen'] = datetime.now().isoformat()
-        device_last_seen[sid] = datetime.now().timestamp()
-        device_status[sid] = 'online'
-        connected_devices[sid]['status'] = 'online'
+def use_state_broker(address):
+    """Share devices, events and Socket.IO broadcasts with other processes through the broker at address"""
+    global shared_state, state_broker_address
+    state_broker_address = address
+    shared_state = make_state_backend(address)
+    manager = BrokerManager(address)
+    manager.set_server(socketio.server)
+    socketio.server.manager = manager
 
-if __name__ == '__main__':
-    local_ip = get_local_ip()
-    print(f"🚀 SimpleShare Server Starting...")
-    print(f"📱 Scan QR code to connect from your phone")
-    print(f"🌐 Server URL: http://{local_ip}:5000")
-    print(f"💻 Local URL: http://localhost:5000")
-    print(f"📁 Uploads folder: {UPLOAD_FOLDER}")
-    print(f"📁 Downloads folder: {DOWNLOAD_FOLDER}")
-    print(f"🔐 Authentication: {'Enabled' if app.config['AUTH_ENABLED'] else 'Disabled'}")
-    max_size = "Unlimited" if app.config['MAX_CONTENT_LENGTH'] == 0 else f"{app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB"
-    print(f"📏 Max file size: {max_size}")
-    print(f"⚡ Press Ctrl+C to stop the server")
+def start_background_services():
+    """Start the thumbnail processes, then the presence, session cleanup, folder watcher, network watcher, system info and monitoring threads"""
+    if THUMBNAILS_ENABLED:
+        start_thumbnail_workers()  # Before any thread starts
+    start_presence_watcher()
     
-    # Start periodic cleanup of offline devices
     def periodic_cleanup():
         while True:
             try:
-                cleanup_offline_devices()
+                session_store.purge_expired()
                 time.sleep(10)  # Check every 10 seconds - much faster
             except Exception as e:
                 print(f"Error in periodic cleanup: {e}")
                 time.sleep(10)
     
-    # Start cleanup thread
-    import threading
     cleanup_thread = threading.Thread(target=periodic_cleanup, daemon=True)
     cleanup_thread.start()
     
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    # Watch shared folders for files added outside the app
+    start_catalog_watcher()
+    
+    # Rebuild the QR code if the network address changes
+    start_network_watcher()
+    
+    # Keep the system info snapshot fresh
+    start_system_info_sampler()
+    
+    if MONITORING_ENABLED:
+        start_resource_monitor()
+
+def make_production_server(listener):
+    """gevent WSGI server for listener (a socket or (host, port)) whose file downloads use os.sendfile()"""
+    from gevent import pywsgi
+    from gevent.pool import Pool
+    from gevent.socket import wait_write
+    
+    class SendfileWSGIHandler(pywsgi.WSGIHandler):
+        """Offers wsgi.file_wrapper and sends SendfileWrapper bodies from the page cache to the socket"""
+        
+        def get_environ(self):
+            environ = super().get_environ()
+            if hasattr(os, 'sendfile'):
+                environ['wsgi.file_wrapper'] = SendfileWrapper
+            return environ
+        
+        def process_result(self):
+            if not isinstance(self.result, SendfileWrapper) or self.provided_content_length is None:
+                return super().process_result()
+            self.write(b'')  # Headers
+            count = int(self.provided_content_length)
+            if count and self.code not in (304, 204):
+                sent = sendfile_to_socket(self.socket, self.result.file, count, wait_write)
+                self.response_length += sent
+                if sent < count:
+                    self.close_connection = True  # The file shrank; the body is short
+    
+    # One greenlet per connection, capped at MAX_CONNECTIONS; Socket.IO shares the loop
+    return pywsgi.WSGIServer(listener, app, handler_class=SendfileWSGIHandler, spawn=Pool(config.MAX_CONNECTIONS), log=None)
 
-# Credits: R ! Y 4 Z 
\ No newline at end of file
+def run_worker_processes(count):
+    """Serve from count forked gevent workers sharing one listening socket.
+    
+    Devices, events and Socket.IO broadcasts are shared through STATE_BROKER, or
+    a broker forked here on 127.0.0.1. Sessions need a store every worker can
+    reach, so the memory store is swapped for SQLite. Clients should use the
+    WebSocket transport; long-polling requests could land on different workers.
+    A worker that exits is replaced.
+    """
+    import signal
+    
+    children = set()
+    broker_address = config.STATE_BROKER
+    if not broker_address:
+        broker_listener = make_broker_listener()
+        broker_address = '%s:%d' % broker_listener.getsockname()
+        broker_pid = os.fork()
+        if broker_pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C stops the master, which stops us
+            try:
+                Broker(config.EVENT_LOG_FILE).serve(broker_listener)
+            finally:
+                os._exit(1)
+        broker_listener.close()
+        children.add(broker_pid)
+    
+    if config.SESSION_STORE == 'memory':
+        print("⚠️ Sessions moved to SQLite so all workers share them")
+    
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((SERVER_HOST, SERVER_PORT))
+    listener.listen(1024)
+    
+    def stop_worker(signum, frame):
+        """SIGTERM from the master: take the worker's thumbnail processes down with it"""
+        for child in multiprocessing.active_children():
+            child.terminate()
+        os._exit(0)
+    
+    def spawn_worker():
+        pid = os.fork()
+        if pid == 0:
+            global session_store
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, stop_worker)
+            try:
+                # Nothing opened before the fork may be shared, so connect afresh
+                session_store = make_session_store('sqlite', SESSION_TIMEOUT, MAX_SESSIONS, config.SESSION_DB_PATH)
+                use_state_broker(broker_address)
+                start_background_services()
+                make_production_server(listener).serve_forever()
+            except Exception as e:
+                print(f"Error in worker {os.getpid()}: {e}")
+            finally:
+                os._exit(1)
+        return pid
+    
+    workers = {spawn_worker() for _ in range(count)}
+    children |= workers
+    master_state = None
+    print(f"👷 {count} workers sharing port {SERVER_PORT}, state broker at {broker_address}")
+    try:
+        while True:
+            pid, _ = os.waitpid(-1, 0)
+            if pid in workers:
+                print(f"Worker {pid} exited, starting a replacement")
+                # Its devices can't time out anywhere else
+                master_state = master_state or make_state_backend(broker_address)
+                for device in master_state.hvalues(DEVICES_KEY):
+                    if device.get('worker_pid') == pid:
+                        master_state.hdel(DEVICES_KEY, device['sid'])
+                workers.discard(pid)
+                children.discard(pid)
+                new_pid = spawn_worker()
+                workers.add(new_pid)
+                children.add(new_pid)
+            elif pid in children:
+                print("State broker exited, stopping the server")
+                children.discard(pid)
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+if config.STATE_BROKER:
+    # Servers pointed at a shared broker see each other's devices and broadcasts
+    use_state_broker(config.STATE_BROKER)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='SimpleShare server')
+    parser.add_argument('--production', action='store_true', help='serve on a gevent event loop instead of the dev server')
+    parser.add_argument('--host', default=SERVER_HOST, help='interface to listen on')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='port to listen on')
+    parser.add_argument('--debug', action='store_true', help='enable debug mode on the dev server')
+    parser.add_argument('--workers', type=int, default=config.WORKER_PROCESSES, help='production server processes sharing the port')
+    args = parser.parse_args()
+    SERVER_HOST = args.host
+    SERVER_PORT = args.port
+    if args.workers > 1 and not PRODUCTION_MODE:
+        parser.error('--workers needs --production')
+    
+    local_ip = get_local_ip()
+    print(f"🚀 SimpleShare Server Starting...")
+    print(f"📱 Scan QR code to connect from your phone")
+    print(f"🌐 Server URL: http://{local_ip}:{SERVER_PORT}")
+    print(f"💻 Local URL: http://localhost:{SERVER_PORT}")
+    print(f"📁 Uploads folder: {UPLOAD_FOLDER}")
+    print(f"📁 Downloads folder: {DOWNLOAD_FOLDER}")
+    print(f"🔐 Authentication: {'Enabled' if app.config['AUTH_ENABLED'] else 'Disabled'}")
+    max_size = "Unlimited" if not UPLOAD_MAX_BYTES else f"{UPLOAD_MAX_BYTES // (1024 * 1024)}MB"
+    print(f"📏 Max file size: {max_size}")
+    if PRODUCTION_MODE:
+        print(f"⚙️ Production mode: gevent, {config.MAX_CONNECTIONS} max connections, {config.WORKER_THREADS} I/O threads")
+    print(f"⚡ Press Ctrl+C to stop the server")
+    
+    if args.workers > 1:
+        # Workers start their own background threads after forking
+        run_worker_processes(args.workers)
+        sys.exit(0)
+    
+    start_background_services()
+    
+    if PRODUCTION_MODE:
+        make_production_server((SERVER_HOST, SERVER_PORT)).serve_forever()
+    else:
+        socketio.run(app, host=SERVER_HOST, port=SERVER_PORT, debug=config.DEBUG_MODE or args.debug)
+
+# Credits: R ! Y 4 Z
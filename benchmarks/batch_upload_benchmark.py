@@ -0,0 +1,124 @@
+# Credits: R ! Y 4 Z
+"""Measure uploading many small photos one at a time against batch requests.
+
+Starts app.py --production in a temporary folder and uploads the same set of
+small files three ways: one POST /api/upload per file, the browser's old
+per-file chunked upload (start, one PUT, finalize), and POST /api/upload/batch
+with the client's batch size and concurrency limits from /api/config.
+Reports files per second, HTTP requests made and file events broadcast.
+
+Usage: python benchmarks/batch_upload_benchmark.py [files] [size in KB]
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 60
+
+def http(port, path, data=None, method=None, headers=None):
+    """JSON response of one request"""
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=data, method=method, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+        return json.loads(response.read())
+
+def multipart(field, files):
+    """Body and content type for a multipart upload of (filename, content) pairs"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for filename, content in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                     f'Content-Type: image/jpeg\r\n\r\n'.encode() + content + b'\r\n')
+    return b''.join(parts) + f'--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def upload_single(port, files):
+    for filename, content in files:
+        body, content_type = multipart('file', [(filename, content)])
+        http(port, '/api/upload', data=body, headers={'Content-Type': content_type})
+    return len(files)
+
+def upload_chunked(port, files):
+    for filename, content in files:
+        upload = http(port, '/api/upload/chunked', data=json.dumps({'filename': filename, 'size': len(content)}).encode(),
+                      headers={'Content-Type': 'application/json'})
+        http(port, f"/api/upload/chunked/{upload['upload_id']}?offset=0", data=content, method='PUT')
+        http(port, f"/api/upload/chunked/{upload['upload_id']}/finalize", data=b'', method='POST')
+    return len(files) * 3
+
+def upload_batched(port, files, config):
+    """Batch requests as the browser builds them, config['batch_upload_concurrency'] at a time"""
+    batches, batch, batch_size = [], None, 0
+    for filename, content in files:
+        if (batch is None or len(batch) >= config['batch_upload_max_files']
+                or batch_size + len(content) > config['batch_upload_max_bytes']):
+            batch, batch_size = [], 0
+            batches.append(batch)
+        batch.append((filename, content))
+        batch_size += len(content)
+
+    def runner():
+        while batches:
+            try:
+                body, content_type = multipart('files', batches.pop())
+            except IndexError:
+                return
+            http(port, '/api/upload/batch', data=body, headers={'Content-Type': content_type})
+
+    requests = len(batches)
+    threads = [threading.Thread(target=runner) for _ in range(config['batch_upload_concurrency'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return requests
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'app.py'), '--production',
+                               '--host', '127.0.0.1', '--port', str(port)],
+                              cwd=tempfile.mkdtemp(prefix='simpleshare_bench_'),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + TIMEOUT
+        while True:
+            try:
+                config = http(port, '/api/config')
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise SystemExit('server did not start')
+                time.sleep(0.2)
+
+        print(f"{count} files of {size} KB; batches of up to {config['batch_upload_max_files']} files, "
+              f"{config['batch_upload_concurrency']} in flight")
+        print(f"{'':>16} {'seconds':>8} {'files/s':>8} {'requests':>9} {'file events':>12}")
+        for name, upload in (('one per request', upload_single), ('chunked', upload_chunked),
+                             ('batch', lambda port, files: upload_batched(port, files, config))):
+            files = [(f'{name[:5]}_{i}.jpg', os.urandom(size * 1024)) for i in range(count)]
+            last_id = http(port, '/api/events?since=0')['last_id']
+            start = time.perf_counter()
+            requests = upload(port, files)
+            seconds = time.perf_counter() - start
+            events = http(port, f'/api/events?since={last_id}')['last_id'] - last_id
+            print(f"{name:>16} {seconds:>8.2f} {count / seconds:>8.0f} {requests:>9} {events:>12}")
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait(timeout=TIMEOUT)
+
+if __name__ == '__main__':
+    main()
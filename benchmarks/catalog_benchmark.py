@@ -0,0 +1,58 @@
+# Credits: R ! Y 4 Z
+"""Compare per-request folder scans with catalog lookups for /api/files.
+
+Usage: python benchmarks/catalog_benchmark.py [file counts...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def legacy_scan(folders):
+    """The old /api/files loop: os.listdir plus os.stat per entry"""
+    files = []
+    for folder in folders:
+        for filename in os.listdir(folder):
+            file_path = os.path.join(folder, filename)
+            if os.path.isfile(file_path):
+                stat = os.stat(file_path)
+                files.append((filename, stat.st_size, stat.st_mtime))
+    return files
+
+def best_of(func, repeat=5):
+    """Best wall time of several runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    counts = [int(c) for c in sys.argv[1:]] or [1000, 10000, 100000]
+    workdir = tempfile.mkdtemp(prefix='simpleshare_bench_')
+    os.chdir(workdir)  # app.py creates its folders relative to the cwd
+    import app
+
+    print(f"{'files':>8} {'scan ms':>10} {'catalog ms':>11} {'rescan ms':>10} {'speedup':>8}")
+    populated = 0
+    for count in counts:
+        populate_count = count - populated
+        # Split files between the two shared folders
+        for i in range(populate_count):
+            folder = app.UPLOAD_FOLDER if i % 2 else app.DOWNLOAD_FOLDER
+            with open(os.path.join(folder, f'file_{populated + i:06d}.txt'), 'wb') as f:
+                f.write(b'x')
+        populated = count
+
+        folders = [app.UPLOAD_FOLDER, app.DOWNLOAD_FOLDER]
+        scan_ms = best_of(lambda: legacy_scan(folders))
+        rescan_ms = best_of(app.catalog_rescan, repeat=1)
+        catalog_ms = best_of(app.catalog_files)
+        print(f"{count:>8} {scan_ms:>10.2f} {catalog_ms:>11.3f} {rescan_ms:>10.2f} {scan_ms / catalog_ms:>7.0f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Credits: R ! Y 4 Z
+"""Measure device list broadcast traffic when many devices connect at once.
+
+Connects Socket.IO test clients in-process, as after a Wi-Fi blip where every
+phone reconnects together, then disconnects them again. Counts the device list
+messages every client received, per-connect device_event included, and their
+JSON size, next to what the old full-list devices_update broadcast on each
+connect and disconnect would have sent.
+
+Usage: python benchmarks/device_broadcast_benchmark.py [devices]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Linux; Android 13; SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0',
+]
+DEVICE_MESSAGES = ('devices_delta', 'devices_update', 'device_event')
+
+def received_traffic(clients):
+    """Device list messages and their JSON bytes, summed over every client"""
+    messages = size = 0
+    for client in clients:
+        for packet in client.get_received():
+            if packet['name'] in DEVICE_MESSAGES:
+                messages += 1
+                size += len(json.dumps(packet['args']))
+    return messages, size
+
+def wait_for_flush(app):
+    """Let the batching window run out so queued changes are sent"""
+    app.socketio.sleep(app.DEVICE_BROADCAST_WINDOW * 2 + 0.1)
+    while app.device_broadcast_scheduled:
+        app.socketio.sleep(0.05)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_bench_'))  # app.py creates its folders relative to the cwd
+    import app
+
+    # The old code sent the full device list to every client on each change
+    clients = []
+    legacy = {'connect': [0, 0], 'disconnect': [0, 0]}
+    def count_legacy(phase):
+        devices_json = json.dumps([app.get_connected_devices()])
+        legacy[phase][0] += len(clients)
+        legacy[phase][1] += len(clients) * len(devices_json)
+
+    start = time.perf_counter()
+    for i in range(count):
+        clients.append(app.socketio.test_client(app.app, headers={'User-Agent': USER_AGENTS[i % len(USER_AGENTS)]}))
+        count_legacy('connect')
+    connect_seconds = time.perf_counter() - start
+    wait_for_flush(app)
+    measured = {'connect': received_traffic(clients)}
+
+    # Half of them drop off again; the other half watch
+    for _ in range(count // 2):
+        clients.pop().disconnect()
+        count_legacy('disconnect')
+    wait_for_flush(app)
+    measured['disconnect'] = received_traffic(clients)
+    for client in clients:
+        client.disconnect()
+
+    print(f"{count} devices connected in {connect_seconds:.2f} s, then {count // 2} disconnected; "
+          f"batching window {app.DEVICE_BROADCAST_WINDOW} s")
+    print(f"{'':>12} {'device msgs':>11} {'device bytes':>14} {'full-list msgs':>15} {'full-list bytes':>16}")
+    for phase in ('connect', 'disconnect'):
+        messages, size = measured[phase]
+        legacy_messages, legacy_bytes = legacy[phase]
+        print(f"{phase:>12} {messages:>11} {size:>14,} {legacy_messages:>15} {legacy_bytes:>16,}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Credits: R ! Y 4 Z
+"""Index page latency: per-request QR rendering vs the cached page.
+
+Usage: python benchmarks/index_benchmark.py [requests]
+"""
+import base64
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_bench_'))
+    import app
+    import jinja2
+    import qrcode
+    from flask import render_template
+
+    # The shipped template is obfuscated and doesn't compile under Jinja, so
+    # render a stand-in page of similar size with the same variables
+    stand_in = ('<html><body><h1>{{ server_url }}</h1><p>{{ local_ip }}</p>'
+                '<img src="data:image/png;base64,{{ qr_code }}"><pre>{{ config }}</pre>'
+                + '<div>' + 'x' * 50000 + '</div></body></html>')
+    app.app.jinja_loader = jinja2.DictLoader({'index.html': stand_in})
+
+    def legacy_index():
+        """The old index(): probe the IP and rebuild the QR code every time"""
+        local_ip = app.probe_local_ip()
+        server_url = f"http://{local_ip}:{app.SERVER_PORT}"
+        qr = qrcode.QRCode(version=1, box_size=10, border=5)
+        qr.add_data(server_url)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color="cyan", back_color="black")
+        img_buffer = BytesIO()
+        img.save(img_buffer, 'PNG')
+        qr_code_b64 = base64.b64encode(img_buffer.getvalue()).decode()
+        return render_template('index.html', qr_code=qr_code_b64, server_url=server_url,
+                               local_ip=local_ip, config=app.get_config())
+
+    app.app.add_url_rule('/legacy-index', 'legacy_index', legacy_index)
+    client = app.app.test_client()
+    client.get('/')  # Warm the cache
+
+    def measure(path, headers=None):
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            client.get(path, headers=headers or {})
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+    etag = client.get('/').headers['ETag']
+    print(f"{'variant':<22} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, path, headers in [
+        ('legacy index', '/legacy-index', None),
+        ('cached index', '/', None),
+        ('cached index (304)', '/', {'If-None-Match': etag}),
+        ('qr.png', '/api/qr.png', None),
+    ]:
+        p50, p99 = measure(path, headers)
+        print(f"{label:<22} {p50:>8.3f} {p99:>8.3f}")
+
+if __name__ == '__main__':
+    main()
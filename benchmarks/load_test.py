@@ -0,0 +1,146 @@
+# Credits: R ! Y 4 Z
+"""Concurrent transfer load test against a real SimpleShare server.
+
+Starts app.py in a scratch directory, then runs rounds of N concurrent
+clients that each download a shared file and push one chunked upload.
+
+Usage: python benchmarks/load_test.py [--dev] [--clients 50 100 250 500]
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, 'app.py')
+
+def free_port():
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, timeout=30):
+    """Block until the server accepts connections"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Server did not start')
+
+def download(port, filename):
+    """Download a file, returning bytes received"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    conn.request('GET', f'/api/download/{filename}')
+    response = conn.getresponse()
+    received = 0
+    while True:
+        data = response.read(256 * 1024)
+        if not data:
+            break
+        received += len(data)
+    conn.close()
+    if response.status != 200:
+        raise RuntimeError(f'HTTP {response.status}')
+    return received
+
+def chunked_upload(port, size):
+    """Upload size bytes through the chunked upload API, returning bytes sent"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    body = json.dumps({'filename': 'load.txt', 'size': size, 'source': 'phone'})
+    conn.request('POST', '/api/upload/chunked', body, {'Content-Type': 'application/json'})
+    upload_id = json.loads(conn.getresponse().read())['upload_id']
+    conn.request('PUT', f'/api/upload/chunked/{upload_id}?offset=0', b'x' * size,
+                 {'Content-Type': 'application/octet-stream'})
+    conn.getresponse().read()
+    conn.request('POST', f'/api/upload/chunked/{upload_id}/finalize')
+    result = json.loads(conn.getresponse().read())
+    conn.close()
+    if not result.get('success'):
+        raise RuntimeError(result.get('error'))
+    return size
+
+def run_round(port, clients, filename, upload_size):
+    """Run one round of concurrent clients and summarize it"""
+    latencies = []
+    errors = []
+    total_bytes = [0]
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients)
+
+    def client():
+        start_barrier.wait()
+        start = time.perf_counter()
+        try:
+            transferred = download(port, filename) + chunked_upload(port, upload_size)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            total_bytes[0] += transferred
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float('nan')
+    return {
+        'clients': clients,
+        'seconds': elapsed,
+        'mb_per_s': total_bytes[0] / elapsed / (1024 * 1024),
+        'p50': percentile(0.50),
+        'p99': percentile(0.99),
+        'errors': len(errors)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dev', action='store_true', help='test the development server instead of --production')
+    parser.add_argument('--clients', type=int, nargs='+', default=[50, 100, 250, 500])
+    parser.add_argument('--file-mb', type=int, default=8, help='size of the shared download')
+    parser.add_argument('--upload-kb', type=int, default=512, help='size of each client upload')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='simpleshare_load_')
+    os.makedirs(os.path.join(workdir, 'static', 'downloads'))
+    with open(os.path.join(workdir, 'static', 'downloads', 'load.bin'), 'wb') as f:
+        f.write(os.urandom(args.file_mb * 1024 * 1024))
+
+    port = free_port()
+    command = [sys.executable, APP_PATH, '--port', str(port), '--host', '127.0.0.1']
+    if not args.dev:
+        command.append('--production')
+    env = dict(os.environ, FLASK_DEBUG='0')
+    server = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        wait_for_port(port)
+        print(f"mode: {'dev' if args.dev else 'production'}, download {args.file_mb}MB + upload {args.upload_kb}KB per client")
+        print(f"{'clients':>8} {'seconds':>8} {'MB/s':>8} {'p50 s':>8} {'p99 s':>8} {'errors':>7}")
+        for clients in args.clients:
+            r = run_round(port, clients, 'load.bin', args.upload_kb * 1024)
+            print(f"{r['clients']:>8} {r['seconds']:>8.2f} {r['mb_per_s']:>8.1f} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['errors']:>7}")
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# Credits: R ! Y 4 Z
+"""Run the server with several workers and check they share state.
+
+Starts app.py --production --workers N in a temporary folder and connects
+Socket.IO clients over WebSocket until they are spread over at least two
+workers. Then it checks that every worker reports every device, that an
+upload handled by one worker reaches clients on all of them, and that a
+chunked upload can hop between workers. Exits 1 on the first failure.
+
+Usage: python benchmarks/multi_worker_check.py [workers] [clients]
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+import simple_websocket
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 10  # seconds to wait for anything
+
+class SocketIOClient:
+    """Bare-bones Socket.IO v5 client over a single WebSocket"""
+
+    def __init__(self, port):
+        self.ws = simple_websocket.Client(f'ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket')
+        self.events = []
+        self.arrivals = []  # perf_counter() when each event arrived, aligned with events
+        self.condition = threading.Condition()
+        # Join the default namespace before reading the Engine.IO open packet:
+        # when the open packet arrives together with the handshake response,
+        # simple_websocket only hands it over once more data comes in, so
+        # waiting for it first could sit out the whole TIMEOUT
+        self.ws.send('40')
+        while True:
+            packet = self.ws.receive(timeout=TIMEOUT)
+            if packet is None:
+                raise AssertionError(f"no Socket.IO connect ack within {TIMEOUT}s")
+            if packet.startswith('40'):
+                self.sid = json.loads(packet[2:])['sid']
+                break
+            if packet.startswith('42'):
+                self.events.append(json.loads(packet[2:]))  # The connect handler emits before the ack
+                self.arrivals.append(time.perf_counter())
+        threading.Thread(target=self.read_loop, daemon=True).start()
+
+    def read_loop(self):
+        try:
+            while True:
+                packet = self.ws.receive()
+                if packet == '2':
+                    self.ws.send('3')  # Engine.IO pong
+                elif packet.startswith('42'):
+                    with self.condition:
+                        self.events.append(json.loads(packet[2:]))
+                        self.arrivals.append(time.perf_counter())
+                        self.condition.notify_all()
+        except simple_websocket.ConnectionClosed:
+            pass
+
+    def emit(self, event, data=None):
+        self.ws.send('42' + json.dumps([event] if data is None else [event, data]))
+
+    def wait_for(self, event, predicate=lambda data: True):
+        """Data of the first matching event, waiting up to TIMEOUT"""
+        deadline = time.time() + TIMEOUT
+        with self.condition:
+            while True:
+                for name, *args in self.events:
+                    if name == event and predicate(args[0] if args else None):
+                        return args[0] if args else None
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise AssertionError(f"no {event} event within {TIMEOUT}s")
+                self.condition.wait(remaining)
+
+    def close(self):
+        self.ws.close()
+
+def http(port, path, data=None, method=None, headers=None):
+    """JSON response of a request on a new connection, so it may land on any worker"""
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=data, method=method, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+        return json.loads(response.read())
+
+def multipart_file(filename, content):
+    """Body and content type for a one-file multipart upload"""
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print(f"ok   {message}")
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    client_count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix='simpleshare_workers_')
+    server = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'app.py'), '--production',
+                               '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port)],
+                              cwd=workdir, stdout=subprocess.DEVNULL)
+    clients = []
+    try:
+        deadline = time.time() + TIMEOUT
+        while True:
+            try:
+                http(port, '/api/config')
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise AssertionError('server did not start')
+                time.sleep(0.2)
+
+        # Connect until the clients are spread over more than one worker
+        worker_of = {}
+        while len(clients) < client_count or len(set(worker_of.values())) < min(workers, 2):
+            if len(clients) >= client_count * 4:
+                raise AssertionError('could not reach more than one worker')
+            client = SocketIOClient(port)
+            client.emit('request_system_info')
+            worker_of[client.sid] = client.wait_for('system_info')['worker_pid']
+            clients.append(client)
+        check(True, f"{len(clients)} clients on workers {sorted(set(worker_of.values()))}")
+
+        for _ in range(workers * 2):
+            devices = http(port, '/api/devices')
+            check({device['sid'] for device in devices} == set(worker_of),
+                  f"/api/devices lists all {len(clients)} devices")
+
+        body, content_type = multipart_file('shared.txt', b'hello from one worker')
+        http(port, '/api/upload', data=body, headers={'Content-Type': content_type})
+        for client in clients:
+            client.wait_for('file_event', lambda event: event['type'] == 'upload')
+        check(True, f"upload broadcast reached clients on every worker")
+        check(any(event['type'] == 'upload' for event in http(port, '/api/events')), '/api/events has the upload')
+
+        content = os.urandom(3 * 1024)
+        upload = http(port, '/api/upload/chunked', data=json.dumps({'filename': 'hop.txt', 'size': len(content)}).encode(),
+                      headers={'Content-Type': 'application/json'})
+        for offset in range(0, len(content), 1024):
+            http(port, f"/api/upload/chunked/{upload['upload_id']}?offset={offset}",
+                 data=content[offset:offset + 1024], method='PUT')
+        result = http(port, f"/api/upload/chunked/{upload['upload_id']}/finalize", data=b'', method='POST')
+        with open(os.path.join(workdir, 'static', 'uploads', result['filename']), 'rb') as f:
+            check(f.read() == content, 'chunked upload spread over separate connections assembles correctly')
+
+        for client in clients:
+            client.close()
+        clients = []
+        deadline = time.time() + TIMEOUT
+        while http(port, '/api/devices') and time.time() < deadline:
+            time.sleep(0.2)
+        check(http(port, '/api/devices') == [], 'disconnected devices are gone from every worker')
+        print('PASS')
+    except AssertionError as e:
+        print(f"FAIL {e}")
+        sys.exit(1)
+    finally:
+        for client in clients:
+            client.close()
+        server.send_signal(signal.SIGINT)
+        server.wait(timeout=TIMEOUT)
+
+if __name__ == '__main__':
+    main()
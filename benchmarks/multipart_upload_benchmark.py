@@ -0,0 +1,75 @@
+# Credits: R ! Y 4 Z
+"""Measure multipart upload ingestion: werkzeug's form parser against streaming.
+
+The old upload route let werkzeug parse the form, which spools the file to a
+temp file, and then copied that into a PartFileWriter, so every byte was
+written twice. receive_multipart_files() decodes the body as it is read and
+writes file data straight to its part file. Both compute the upload digests
+and run on the same in-memory multipart body inside a Flask request context,
+so the numbers are parsing, hashing and disk writes without the network.
+
+Usage: python benchmarks/multipart_upload_benchmark.py [size in MB...]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def best_of(func, repeat=3):
+    """Best wall time of several runs, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def multipart_body(content):
+    """Body and content type for a one-file multipart upload"""
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.txt"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [16, 128, 512]
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_bench_'))  # app.py creates its folders relative to the cwd
+    import app
+
+    target = os.path.join(app.UPLOAD_FOLDER, 'bench.txt')
+    print(f"{'MB':>6} {'form parse + copy MB/s':>23} {'streaming MB/s':>15} {'speedup':>8}")
+    for size in sizes:
+        body, content_type = multipart_body(os.urandom(1024 * 1024) * size)
+
+        def request_context():
+            return app.app.test_request_context('/api/upload', method='POST', input_stream=io.BytesIO(body),
+                                                 content_type=content_type, content_length=len(body))
+
+        def form_parse_copy():
+            with request_context():
+                stream = app.request.files['file'].stream
+                writer = app.PartFileWriter(target)
+                while True:
+                    data = stream.read(app.CHUNK_WRITE_BUFFER)
+                    if not data:
+                        break
+                    writer.write(data)
+                writer.close()
+
+        def streaming():
+            with request_context():
+                files, _ = app.receive_multipart_files(app.UPLOAD_FOLDER)
+                os.replace(files[0]['part_path'], target)
+
+        legacy = best_of(form_parse_copy)
+        streamed = best_of(streaming)
+        os.remove(target)
+        print(f"{size:>6} {size / legacy:>23.0f} {size / streamed:>15.0f} {legacy / streamed:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Credits: R ! Y 4 Z
+"""Check that downloads return byte-exact ranges of a file larger than one read.
+
+Runs every case twice: through the Flask test client, where bodies are read
+in DOWNLOAD_READ_SIZE pieces, and against app.py --production over a real
+socket, where full and single-range bodies go out with os.sendfile(). Covers
+full downloads, single, open-ended and suffix ranges, multi-range
+multipart/byteranges responses, unsatisfiable ranges (416) and If-Range with
+matching and stale validators. Exits 1 on the first failure.
+
+Usage: python benchmarks/range_check.py
+"""
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from email.utils import formatdate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+TIMEOUT = 30
+FILENAME = 'ranges.bin'
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print(f"ok   {message}")
+
+def parse_byteranges(body, content_type):
+    """[(Content-Range, data)] of a multipart/byteranges body"""
+    boundary = content_type.split('boundary=')[1].encode()
+    parts = []
+    for chunk in body.split(b'--' + boundary)[1:]:
+        if chunk.startswith(b'--'):
+            break
+        head, data = chunk.split(b'\r\n\r\n', 1)
+        headers = dict(line.split(': ', 1) for line in head.decode().strip().split('\r\n'))
+        parts.append((headers['Content-Range'], data[:-2]))  # Drop the CRLF before the next boundary
+    return parts
+
+def run_cases(label, get, content):
+    """Every range case through get(headers) -> (status, headers, body)"""
+    size = len(content)
+    status, headers, body = get({})
+    check(status == 200 and body == content and int(headers['Content-Length']) == size, f"{label}: full download")
+    etag, last_modified = headers['ETag'], headers['Last-Modified']
+
+    cases = (
+        ('single range', 'bytes=1000-600000', 1000, 600001),
+        ('open-ended range', 'bytes=500000-', 500000, size),
+        ('suffix range', 'bytes=-70000', size - 70000, size),
+        ('range past the end', f'bytes={size - 10}-{size + 1000}', size - 10, size)
+    )
+    for name, header, start, end in cases:
+        status, headers, body = get({'Range': header})
+        check(status == 206 and body == content[start:end]
+              and headers['Content-Range'] == f'bytes {start}-{end - 1}/{size}'
+              and int(headers['Content-Length']) == end - start, f"{label}: {name} ({header})")
+
+    status, headers, body = get({'Range': 'bytes=0-99,300000-700000,-10'})
+    parts = parse_byteranges(body, headers['Content-Type'])
+    expected = [(f'bytes 0-99/{size}', content[:100]), (f'bytes 300000-700000/{size}', content[300000:700001]),
+                (f'bytes {size - 10}-{size - 1}/{size}', content[-10:])]
+    check(status == 206 and parts == expected and int(headers['Content-Length']) == len(body),
+          f"{label}: multi-range multipart/byteranges")
+
+    status, headers, body = get({'Range': f'bytes={size}-'})
+    check(status == 416 and headers['Content-Range'] == f'bytes */{size}', f"{label}: unsatisfiable range is 416")
+
+    for name, validator, ranged in (('matching ETag', etag, True), ('stale ETag', '"stale"', False),
+                                    ('matching date', last_modified, True),
+                                    ('older date', formatdate(0, usegmt=True), False)):
+        status, headers, body = get({'Range': 'bytes=100-199', 'If-Range': validator})
+        if ranged:
+            check(status == 206 and body == content[100:200], f"{label}: If-Range with {name} sends the range")
+        else:
+            check(status == 200 and body == content, f"{label}: If-Range with {name} sends the whole file")
+
+def check_test_client(content):
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_ranges_'))  # app.py creates its folders relative to the cwd
+    import app
+    check(len(content) > 3 * app.DOWNLOAD_READ_SIZE, "file spans several reads")
+    with open(os.path.join(app.DOWNLOAD_FOLDER, FILENAME), 'wb') as f:
+        f.write(content)
+    client = app.app.test_client()
+
+    def get(headers):
+        response = client.get(f'/api/download/{FILENAME}', headers=headers)
+        body = response.get_data()
+        response.close()
+        return response.status_code, response.headers, body
+
+    run_cases('test client', get, content)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def check_production_server(content):
+    workdir = tempfile.mkdtemp(prefix='simpleshare_ranges_')
+    os.makedirs(os.path.join(workdir, 'static', 'downloads'))
+    with open(os.path.join(workdir, 'static', 'downloads', FILENAME), 'wb') as f:
+        f.write(content)
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'app.py'), '--production',
+                               '--host', '127.0.0.1', '--port', str(port)],
+                              cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + TIMEOUT
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise AssertionError('server did not start')
+                time.sleep(0.2)
+
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=TIMEOUT)
+
+        def get(headers):
+            # One keep-alive connection, so a wrong Content-Length breaks the next case
+            conn.request('GET', f'/api/download/{FILENAME}', headers=headers)
+            response = conn.getresponse()
+            return response.status, response.headers, response.read()
+
+        run_cases('production server', get, content)
+        conn.close()
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait(timeout=TIMEOUT)
+
+def main():
+    content = os.urandom(3 * 256 * 1024 + 12345)
+    check_production_server(content)
+    check_test_client(content)
+
+if __name__ == '__main__':
+    main()
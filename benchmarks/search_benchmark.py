@@ -0,0 +1,83 @@
+# Credits: R ! Y 4 Z
+"""Compare the linear filename scan with the search index behind /api/search-files.
+
+Builds a synthetic in-memory catalog, so no files are written.
+
+Usage: python benchmarks/search_benchmark.py [file counts...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+WORDS = ['holiday', 'report', 'invoice', 'budget', 'meeting', 'notes', 'scan', 'backup', 'family',
+         'draft', 'final', 'summary', 'project', 'photo', 'video', 'receipt', 'contract', 'slides']
+PREFIXES = ['IMG', 'VID', 'DOC', 'Screenshot', 'export', 'Copy']
+EXTENSIONS = ['jpg', 'png', 'mp4', 'pdf', 'docx', 'txt', 'xlsx', 'zip']
+QUERIES = ['holiday', 'invoice 2023', 'rep', 'recipt', 'screenshot', 'zzzz']
+
+def make_filename(rng, i):
+    """Camera, screenshot and document style names"""
+    parts = [rng.choice(PREFIXES), str(rng.randint(2015, 2025)), rng.choice(WORDS)]
+    if rng.random() < 0.5:
+        parts.append(rng.choice(WORDS).capitalize() + rng.choice(WORDS).capitalize())
+    parts.append(f'{i:06d}')
+    return '_'.join(parts) + '.' + rng.choice(EXTENSIONS)
+
+def linear_search(entries, query):
+    """The old search loop: substring test on every filename"""
+    return [entry for entry in entries if query in entry['name'].lower()]
+
+def best_of(func, repeat=20):
+    """Best wall time of several runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    counts = [int(c) for c in sys.argv[1:]] or [1000, 10000, 100000]
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_bench_'))  # app.py creates its folders relative to the cwd
+    import app
+
+    rng = random.Random(42)
+    now = time.time()
+    for count in counts:
+        catalog = {app.UPLOAD_FOLDER: {}, app.DOWNLOAD_FOLDER: {}}
+        for i in range(count):
+            folder = app.UPLOAD_FOLDER if i % 2 else app.DOWNLOAD_FOLDER
+            name = make_filename(rng, i)
+            catalog[folder][name] = {
+                'name': name,
+                'size_bytes': rng.randint(1, 10 ** 8),
+                'mtime': now - rng.randint(0, 10 ** 8),
+                'file_mtime': now,
+                'extension': name.rsplit('.', 1)[1],
+                'source': 'phone' if folder == app.UPLOAD_FOLDER else 'pc',
+                'folder': folder,
+                'digest': None
+            }
+        with app.catalog_lock:
+            app.file_catalog.update(catalog)
+            start = time.perf_counter()
+            app.rebuild_sort_index()
+            build_ms = (time.perf_counter() - start) * 1000
+        entries = app.catalog_files()
+
+        print(f"\n{count} files, {len(app.search_vocabulary)} distinct tokens, index built in {build_ms:.0f} ms")
+        print(f"{'query':>14} {'scan ms':>9} {'index ms':>9} {'scan hits':>10} {'index hits':>11}")
+        for query in QUERIES:
+            scan_ms = best_of(lambda: linear_search(entries, query))
+            index_ms = best_of(lambda: app.search_index_query(query))
+            scan_hits = len(linear_search(entries, query))
+            index_hits = len(app.search_index_query(query))
+            print(f"{query:>14} {scan_ms:>9.3f} {index_ms:>9.3f} {scan_hits:>10} {index_hits:>11}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,454 @@
+# Credits: R ! Y 4 Z
+"""Benchmark suite for SimpleShare's transfer and API hot paths.
+
+Runs a fixed set of scenarios and saves their results as JSON, tagged with
+the commit they ran on, so two commits can be compared:
+
+  files    /api/files (whole list and one page), /api/search-files and
+           /api/download-zip on synthetic trees of 1 KB files, through the
+           Flask test client in this process
+  upload   POST /api/upload of one file per size, streamed over a real
+           socket to app.py running in a scratch folder
+  download GET /api/download/<file> of the files just uploaded
+  swarm    Socket.IO devices connecting over WebSocket, then the time until
+           every device has the file_event of an upload
+
+Every case reports throughput, p50 and p99 latency, and the peak RSS of
+the process serving it (this process for files, the server and its workers
+otherwise). The default sizes finish in a few minutes; --full goes up to
+100,000 files, 4 GB transfers and 500 devices, which needs about 8 GB of
+free disk space.
+
+Usage: python benchmarks/suite.py [--full] [--scenarios files upload ...] [--dev] [--output results.json]
+       python benchmarks/suite.py --compare old.json new.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import psutil
+
+from multi_worker_check import SocketIOClient
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+RESULTS_FOLDER = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+TIMEOUT = 600  # seconds for any single request
+BLOCK_SIZE = 1024 * 1024
+SCENARIOS = ('files', 'upload', 'download', 'swarm')
+PRESETS = {
+    'default': {'tree_files': [10, 1000, 10000], 'sizes': ['1KB', '1MB', '64MB'], 'devices': [10, 50]},
+    'full': {'tree_files': [10, 1000, 10000, 100000], 'sizes': ['1KB', '1MB', '64MB', '1GB', '4GB'],
+             'devices': [10, 100, 500]}
+}
+COMPARED = (('throughput', 'higher'), ('p50_ms', 'lower'), ('p99_ms', 'lower'), ('peak_rss_mb', 'lower'))
+
+def parse_size(text):
+    """Bytes in a size such as 1KB, 64MB or 4GB"""
+    units = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+    text = text.strip().upper()
+    for unit, factor in units.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+class PeakRSS:
+    """Peak resident memory of a process and its children while the with block runs"""
+
+    def __init__(self, pid, interval=0.02):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self.done = threading.Event()
+
+    def measure(self):
+        try:
+            processes = [self.process] + self.process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        self.peak = max(self.peak, total)
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.measure()
+
+    def __enter__(self):
+        self.measure()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+        self.measure()
+
+def case_result(scenario, case, latencies, seconds, rss, amount=None, unit='requests/s', **extra):
+    """One result row: throughput of amount (default: one per latency) over seconds, percentiles in ms"""
+    ordered = sorted(latencies)
+    amount = len(ordered) if amount is None else amount
+    result = {
+        'scenario': scenario,
+        'case': case,
+        'samples': len(ordered),
+        'seconds': round(seconds, 4),
+        'throughput': round(amount / seconds, 2) if seconds else None,
+        'unit': unit,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3) if ordered else None,
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3) if ordered else None,
+        'peak_rss_mb': round(rss.peak / 1024 ** 2, 1)
+    }
+    result.update(extra)
+    print(f"{scenario:>9} {case:<28} {result['throughput'] or 0:>12.1f} {unit:<13} "
+          f"p50 {result['p50_ms'] or 0:>9.2f} ms  p99 {result['p99_ms'] or 0:>9.2f} ms  "
+          f"rss {result['peak_rss_mb']:>7.1f} MB")
+    return result
+
+def failed_case(scenario, case, error):
+    print(f"{scenario:>9} {case:<28} FAILED: {error}")
+    return {'scenario': scenario, 'case': case, 'error': str(error)}
+
+def timed_requests(count, request):
+    """Latencies of count sequential calls to request, and their total time"""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(count):
+        start = time.perf_counter()
+        request()
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - started
+
+# In-process scenarios (Flask test client)
+
+def make_tree(folder, count, size=1024):
+    """Replace folder's contents with count files of size bytes"""
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    content = os.urandom(size)
+    extensions = ('txt', 'jpg', 'pdf', 'mp4', 'zip')
+    for i in range(count):
+        with open(os.path.join(folder, f'file_{i:06d}.{extensions[i % len(extensions)]}'), 'wb') as f:
+            f.write(content)
+
+def run_files(settings):
+    """File listing, search and zip download on trees of each size"""
+    import app
+    client = app.app.test_client()
+
+    def fetch(method, path, **kwargs):
+        response = client.open(path, method=method, **kwargs)
+        body = response.get_data()
+        response.close()
+        if response.status_code != 200:
+            raise RuntimeError(f'{path}: HTTP {response.status_code}')
+        return len(body)
+
+    results = []
+    for count in settings['tree_files']:
+        make_tree(app.UPLOAD_FOLDER, count)
+        app.catalog_rescan()
+        repeats = max(5, min(200, 200000 // count))
+        zip_files = [f"file_{i:06d}.{('txt', 'jpg', 'pdf', 'mp4', 'zip')[i % 5]}" for i in range(min(count, 1000))]
+        cases = (
+            (f'list {count} files', repeats, lambda: fetch('GET', '/api/files')),
+            (f'page of 100 of {count}', 200, lambda: fetch('GET', '/api/files?limit=100')),
+            (f'search {count} files', 200, lambda: fetch('GET', '/api/search-files?q=file_00')),
+            (f'zip {len(zip_files)} of {count}', 5, lambda: fetch('POST', '/api/download-zip', json={'files': zip_files}))
+        )
+        for case, repeat, request in cases:
+            try:
+                with PeakRSS(os.getpid()) as rss:
+                    latencies, seconds = timed_requests(repeat, request)
+                results.append(case_result('files', case, latencies, seconds, rss, files=count))
+            except Exception as e:
+                results.append(failed_case('files', case, e))
+    return results
+
+# Real-socket scenarios (app.py in a scratch folder)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def http_json(port, path, data=None, method=None, headers=None):
+    """JSON response of one request"""
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=data, method=method, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+        return json.loads(response.read())
+
+def start_server(production):
+    """app.py on a free port in a scratch folder; returns (process, port)"""
+    port = free_port()
+    command = [sys.executable, os.path.join(REPO_ROOT, 'app.py'), '--host', '127.0.0.1', '--port', str(port)]
+    if production:
+        command.append('--production')
+    server = subprocess.Popen(command, cwd=tempfile.mkdtemp(prefix='simpleshare_suite_'),
+                              env=dict(os.environ, FLASK_DEBUG='0'), stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.time() + 30
+    while True:
+        try:
+            http_json(port, '/api/config')
+            return server, port
+        except OSError:
+            if time.time() > deadline or server.poll() is not None:
+                stop_server(server)
+                raise RuntimeError('server did not start')
+            time.sleep(0.2)
+
+def stop_server(server):
+    try:
+        os.killpg(server.pid, signal.SIGINT)
+        server.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(server.pid, signal.SIGKILL)
+        server.wait()
+
+def stream_upload(port, filename, size, block):
+    """POST /api/upload of size bytes sent block by block; returns the stored filename"""
+    boundary = uuid.uuid4().hex
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=TIMEOUT)
+    try:
+        conn.putrequest('POST', '/api/upload')
+        conn.putheader('Content-Type', f'multipart/form-data; boundary={boundary}')
+        conn.putheader('Content-Length', str(len(head) + size + len(tail)))
+        conn.endheaders()
+        conn.send(head)
+        remaining = size
+        while remaining:
+            piece = block if remaining >= len(block) else block[:remaining]
+            conn.send(piece)
+            remaining -= len(piece)
+        conn.send(tail)
+        response = conn.getresponse()
+        result = json.loads(response.read())
+    finally:
+        conn.close()
+    if response.status != 200 or not result.get('success'):
+        raise RuntimeError(f"HTTP {response.status}: {result.get('error')}")
+    return result['filename']
+
+def download(port, filename):
+    """Bytes received downloading a file"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=TIMEOUT)
+    try:
+        conn.request('GET', f'/api/download/{filename}')
+        response = conn.getresponse()
+        received = 0
+        while True:
+            data = response.read(BLOCK_SIZE)
+            if not data:
+                break
+            received += len(data)
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise RuntimeError(f'HTTP {response.status}')
+    return received
+
+def run_transfers(server, port, settings, scenarios):
+    """Upload, then download, several files of each size one after another"""
+    block = os.urandom(BLOCK_SIZE)
+    results = []
+    for text in settings['sizes']:
+        size = parse_size(text)
+        repeats = max(1, min(50, 256 * 1024 ** 2 // size))
+        case = f'{text} x {repeats}'
+        stored = []
+
+        def upload_one():
+            stored.append(stream_upload(port, f'suite_{text}_{len(stored)}.zip', size, block))
+
+        try:
+            with PeakRSS(server.pid) as rss:
+                latencies, seconds = timed_requests(repeats, upload_one)
+            if 'upload' in scenarios:
+                results.append(case_result('upload', case, latencies, seconds, rss, amount=size * repeats / 1024 ** 2,
+                                           unit='MB/s', size_bytes=size))
+            if 'download' in scenarios:
+                names = iter(stored)
+                with PeakRSS(server.pid) as rss:
+                    latencies, seconds = timed_requests(repeats, lambda: download(port, next(names)))
+                results.append(case_result('download', case, latencies, seconds, rss,
+                                           amount=size * repeats / 1024 ** 2, unit='MB/s', size_bytes=size))
+        except Exception as e:
+            for scenario in ('upload', 'download'):
+                if scenario in scenarios:
+                    results.append(failed_case(scenario, case, e))
+        for filename in stored:
+            http_json(port, f'/api/delete/{filename}')
+    return results
+
+def arrival_of(client, event, predicate):
+    """When the first matching event reached a client"""
+    client.wait_for(event, predicate)
+    with client.condition:
+        for (name, *args), arrived in zip(client.events, client.arrivals):
+            if name == event and predicate(args[0] if args else None):
+                return arrived
+
+def run_swarm(server, port, settings):
+    """Connect swarms of devices, then time file_event delivery to all of them"""
+    results = []
+    block = os.urandom(1024)
+    for count in settings['devices']:
+        clients = []
+        try:
+            def connect(_):
+                start = time.perf_counter()
+                client = SocketIOClient(port)
+                clients.append(client)
+                return time.perf_counter() - start
+
+            with PeakRSS(server.pid) as rss:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(16) as pool:
+                    latencies = list(pool.map(connect, range(count)))
+                seconds = time.perf_counter() - started
+            results.append(case_result('swarm', f'connect {count} devices', latencies, seconds, rss,
+                                       unit='connects/s', devices=count))
+
+            # Each delivery latency is from sending the upload to one device receiving its event
+            latencies, seconds = [], 0
+            with PeakRSS(server.pid) as rss:
+                for round_number in range(5):
+                    start = time.perf_counter()
+                    filename = stream_upload(port, f'swarm_{count}_{round_number}.txt', len(block), block)
+                    is_upload = lambda data: data.get('type') == 'upload' and data['data']['filename'] == filename
+                    arrivals = [arrival_of(client, 'file_event', is_upload) for client in clients]
+                    latencies.extend(arrived - start for arrived in arrivals)
+                    seconds += max(arrivals) - start
+                    http_json(port, f'/api/delete/{filename}')
+            results.append(case_result('swarm', f'broadcast to {count} devices', latencies, seconds, rss,
+                                       unit='deliveries/s', devices=count))
+        except Exception as e:
+            results.append(failed_case('swarm', f'{count} devices', e))
+        finally:
+            for client in clients:
+                client.close()
+            time.sleep(1)  # Let the server drop the devices before the next swarm
+    return results
+
+# Results
+
+def run_metadata(args, settings):
+    """Commit, machine and settings a result file was produced with"""
+    def git(*command):
+        try:
+            return subprocess.run(['git', *command], cwd=REPO_ROOT, capture_output=True, text=True,
+                                  timeout=60).stdout.strip()
+        except (OSError, subprocess.TimeoutExpired):
+            return ''
+    return {
+        'commit': git('rev-parse', 'HEAD') or None,
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'memory_gb': round(psutil.virtual_memory().total / 1024 ** 3, 1),
+        'server': 'dev' if args.dev else 'production',
+        'settings': settings
+    }
+
+def compare(old_path, new_path):
+    """Print the change of every metric between two result files"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old: {old['meta']['commit']} ({old['meta']['date']})")
+    print(f"new: {new['meta']['commit']} ({new['meta']['date']})")
+    before = {(r['scenario'], r['case']): r for r in old['results'] if 'error' not in r}
+    for result in new['results']:
+        previous = before.get((result['scenario'], result['case']))
+        if previous is None or 'error' in result:
+            continue
+        changes = []
+        for metric, better in COMPARED:
+            a, b = previous.get(metric), result.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a * 100
+            mark = '' if abs(change) < 5 else ('+' if (change > 0) == (better == 'higher') else '-')
+            changes.append(f"{metric} {a:g} -> {b:g} ({change:+.1f}%){mark}")
+        print(f"{result['scenario']:>9} {result['case']:<28} " + '  '.join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--full', action='store_true', help='up to 100k files, 4 GB transfers and 500 devices')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--tree-files', type=int, nargs='+', help='file counts of the synthetic trees')
+    parser.add_argument('--sizes', nargs='+', help='transfer sizes, e.g. 1KB 1MB 4GB')
+    parser.add_argument('--devices', type=int, nargs='+', help='swarm sizes')
+    parser.add_argument('--dev', action='store_true', help='test the development server instead of --production')
+    parser.add_argument('--output', help=f'result file (default: a new file in {RESULTS_FOLDER})')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files and exit')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    settings = dict(PRESETS['full' if args.full else 'default'])
+    for name in ('tree_files', 'sizes', 'devices'):
+        if getattr(args, name):
+            settings[name] = getattr(args, name)
+    meta = run_metadata(args, settings)
+
+    # app.py creates its folders relative to the cwd
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_suite_'))
+    results = []
+    if 'files' in args.scenarios:
+        results.extend(run_files(settings))
+    if set(args.scenarios) & {'upload', 'download', 'swarm'}:
+        server, port = start_server(not args.dev)
+        try:
+            if set(args.scenarios) & {'upload', 'download'}:
+                results.extend(run_transfers(server, port, settings, args.scenarios))
+            if 'swarm' in args.scenarios:
+                results.extend(run_swarm(server, port, settings))
+        finally:
+            stop_server(server)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        name = f"{(meta['commit'] or 'unknown')[:10]}{'-dirty' if meta['dirty'] else ''}-{datetime.now():%Y%m%d-%H%M%S}.json"
+        output = os.path.join(RESULTS_FOLDER, name)
+    with open(output, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f"results saved to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Credits: R ! Y 4 Z
+"""Measure /api/system-info under a request storm.
+
+Compares sampling system information on every request, as the route used to,
+with serving the background sampler's snapshot from memory, both as a full
+200 response and as a 304 for a client revalidating with its ETag. Each
+request runs the view in a Flask request context, so the numbers are
+per-request server work without the network or WSGI.
+
+With --shared the app is set up as a worker of app.py --workers N is: devices
+live in a state broker (started here) and sessions in SQLite, so sampling
+costs socket round trips and a database query.
+
+Usage: python benchmarks/system_info_benchmark.py [--shared] [requests]
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def main():
+    args = sys.argv[1:]
+    shared = '--shared' in args
+    args = [arg for arg in args if arg != '--shared']
+    count = int(args[0]) if args else 5000
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_bench_'))  # app.py creates its folders relative to the cwd
+    import app
+    from session_store import make_session_store
+
+    broker = None
+    if shared:
+        port = free_port()
+        broker = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'shared_state.py'), '--port', str(port)],
+                                  stdout=subprocess.DEVNULL)
+        time.sleep(1)
+        app.use_state_broker(f'127.0.0.1:{port}')
+        app.session_store = make_session_store('sqlite', app.SESSION_TIMEOUT, app.MAX_SESSIONS, 'sessions.db')
+
+    client = app.app.test_client()
+    etag = client.get('/api/system-info').headers['ETag']
+
+    def sample_per_request():
+        with app.app.test_request_context('/api/system-info'):
+            app.jsonify(app.sample_system_info())
+
+    def snapshot():
+        with app.app.test_request_context('/api/system-info'):
+            app.get_system_info_api()
+
+    def revalidate():
+        with app.app.test_request_context('/api/system-info', headers={'If-None-Match': etag}):
+            app.get_system_info_api()
+
+    print(f"{count} requests, {'state broker and SQLite sessions' if shared else 'in-process state'}")
+    print(f"{'':>20} {'requests/s':>11} {'us/request':>11}")
+    for name, request in (('sample per request', sample_per_request), ('snapshot (200)', snapshot),
+                          ('revalidate (304)', revalidate)):
+        start = time.perf_counter()
+        for _ in range(count):
+            request()
+        seconds = time.perf_counter() - start
+        print(f"{name:>20} {count / seconds:>11.0f} {seconds / count * 1e6:>11.1f}")
+    if broker:
+        broker.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Credits: R ! Y 4 Z
+"""Measure what hashing uploads while they stream to disk costs.
+
+Compares werkzeug's FileStorage.save() (the old upload path, no digests)
+with PartFileWriter, which computes SHA-256 and CRC32 as it writes. The
+upload body is an in-memory stream, so the numbers are disk write speed
+plus hashing, without the network.
+
+Usage: python benchmarks/upload_digest_benchmark.py [size in MB...]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def best_of(func, repeat=3):
+    """Best wall time of several runs, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [16, 128, 512]
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_bench_'))  # app.py creates its folders relative to the cwd
+    import app
+    from werkzeug.datastructures import FileStorage
+
+    target = os.path.join(app.UPLOAD_FOLDER, 'bench.part')
+    print(f"{'MB':>6} {'save() MB/s':>12} {'digests MB/s':>13} {'hash only MB/s':>15} {'overhead':>9}")
+    for size in sizes:
+        body = os.urandom(1024 * 1024) * size  # Repeated block; hashing can't tell
+
+        def plain_save():
+            FileStorage(io.BytesIO(body), 'bench.bin').save(target)
+
+        def digest_save():
+            stream = io.BytesIO(body)
+            writer = app.PartFileWriter(target)
+            while True:
+                data = stream.read(app.CHUNK_WRITE_BUFFER)
+                if not data:
+                    break
+                writer.write(data)
+            writer.close()
+
+        def hash_only():
+            hasher = app.UploadHasher()
+            view = memoryview(body)
+            for offset in range(0, len(body), app.CHUNK_WRITE_BUFFER):
+                hasher.update(view[offset:offset + app.CHUNK_WRITE_BUFFER])
+            hasher.digests()
+
+        plain = best_of(plain_save)
+        digest = best_of(digest_save)
+        hashing = best_of(hash_only)
+        os.remove(target)
+        print(f"{size:>6} {size / plain:>12.0f} {size / digest:>13.0f} {size / hashing:>15.0f} "
+              f"{(digest / plain - 1) * 100:>8.0f}%")
+
+if __name__ == '__main__':
+    main()
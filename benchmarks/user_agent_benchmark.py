@@ -0,0 +1,353 @@
+# Credits: R ! Y 4 Z
+"""Check the cached User-Agent classifier against a golden corpus and time it.
+
+Every corpus entry must classify exactly as recorded (and as the old
+get_device_info() did) before any timings are printed; a mismatch exits 1.
+
+Usage: python benchmarks/user_agent_benchmark.py [requests]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# (User-Agent, (type, os_name, device_name, browser, browser_version)); {user} is the PC username
+GOLDEN_USER_AGENTS = [
+    ('Mozilla/5.0 (Linux; Android 13; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Samsung Phone (SM-S918B)', 'Chrome', '116.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 12; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.5615.136 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Samsung Galaxy S Series (SM-G991B)', 'Chrome', '112.0.5615.136')),
+    ('Mozilla/5.0 (Linux; Android 10; SM-N975F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Samsung Galaxy Note (SM-N975F)', 'Chrome', '108.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 13; SM-A536B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.5790.166 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Samsung Galaxy A Series (SM-A536B)', 'Chrome', '115.0.5790.166')),
+    ('Mozilla/5.0 (Linux; Android 11; SM-T870) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36',
+     ('Mobile', 'Android', 'Samsung Galaxy Tab (SM-T870)', 'Chrome', '104.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 13; SAMSUNG SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/22.0 Chrome/111.0.5563.116 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Samsung Phone (SM-S911B)', 'Chrome', '111.0.5563.116')),
+    ('Mozilla/5.0 (Linux; Android 13; I2203) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Mobile Safari/537.36 iQOO 11',
+     ('Mobile', 'Android', 'iQOO 11', 'Chrome', '114.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 12; 2201117TG) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Mobile Safari/537.36 XiaoMi/MiuiBrowser/13.28',
+     ('Mobile', 'Android', 'Android Phone', 'Chrome', '110.0.0.0')),
+    ('Mozilla/5.0 (Linux; U; Android 11; en-us; Redmi Note 10 Pro Build/RKQ1.200826.002) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/100.0.4896.127 Mobile Safari/537.36 Xiaomi',
+     ('Mobile', 'Android', 'Xiaomi Redmi', 'Chrome', '100.0.4896.127')),
+    ('Mozilla/5.0 (Linux; Android 12; POCO F4 Build/SKQ1.211006.001; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/113.0.5672.77 Mobile Safari/537.36 Xiaomi',
+     ('Mobile', 'Android', 'POCO Phone', 'Chrome', '113.0.5672.77')),
+    ('Mozilla/5.0 (Linux; Android 10; MI 9 Build/QKQ1.190825.002) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.104 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'MI 9', 'Chrome', '96.0.4664.104')),
+    ('Mozilla/5.0 (Linux; Android 13; OnePlus CPH2449) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'OnePlus Phone', 'Chrome', '116.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 10; Huawei P30 Pro) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.88 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Huawei Phone', 'Chrome', '99.0.4844.88')),
+    ('Mozilla/5.0 (Linux; Android 14; Pixel 8 Pro) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.6045.163 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Pixel 8', 'Chrome', '119.0.6045.163')),
+    ('Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Pixel 7', 'Chrome', '116.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 12; moto g(60)) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Android Phone', 'Chrome', '112.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 11; Motorola Moto G Power) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/101.0.4951.61 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Motorola Phone', 'Chrome', '101.0.4951.61')),
+    ('Mozilla/5.0 (Linux; Android 12; OPPO CPH2269) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'OPPO Phone', 'Chrome', '109.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 13; Vivo V2227) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Vivo Phone', 'Chrome', '114.0.0.0')),
+    ('Mozilla/5.0 (Linux; Android 13; Realme RMX3630) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Realme Phone', 'Chrome', '115.0.0.0')),
+    ('Mozilla/5.0 (Android 13; Mobile; rv:109.0) Gecko/118.0 Firefox/118.0',
+     ('Mobile', 'Android', 'Android Phone', 'Firefox', '')),
+    ('Mozilla/5.0 (Linux; Android 9; Nokia 7.1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.210 Mobile Safari/537.36',
+     ('Mobile', 'Android', 'Android Phone', 'Chrome', '90.0.4430.210')),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1',
+     ('Mobile', 'iOS', 'iPhone', 'Safari', '')),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/117.0.5938.108 Mobile/15E148 Safari/604.1',
+     ('Mobile', 'iOS', 'iPhone', 'Safari', '')),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 16_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) FxiOS/115.0 Mobile/15E148 Safari/605.1.15',
+     ('Mobile', 'iOS', 'iPhone', 'Safari', '')),
+    ('Mozilla/5.0 (iPhone12,1; U; CPU iPhone OS 13_0 like Mac OS X) AppleWebKit/602.1.50 (KHTML, like Gecko) Version/10.0 Mobile/15E148 Safari/602.1',
+     ('Mobile', 'iOS', 'iPhone', 'Safari', '')),
+    ('Mozilla/5.0 (iPad; CPU OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Mobile/15E148 Safari/604.1',
+     ('Tablet', 'iOS', 'iPad', 'Safari', '')),
+    ('Mozilla/5.0 (Linux; Android 12; Lenovo TB-X606F Tablet) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36',
+     ('Mobile', 'Android', 'Android Phone', 'Chrome', '110.0.0.0')),
+    ('Mozilla/5.0 (Tablet; rv:26.0) Gecko/26.0 Firefox/26.0',
+     ('Tablet', 'Unknown OS', 'Android Tablet', 'Firefox', '')),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36',
+     ('Desktop', 'Windows', "{user}'s Windows PC", 'Chrome', '117.0.0.0')),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36 Edg/117.0.2045.43',
+     ('Desktop', 'Windows', "{user}'s Windows PC", 'Chrome', '117.0.0.0')),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/118.0',
+     ('Desktop', 'Windows', "{user}'s Windows PC", 'Firefox', '')),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/70.0.3538.102 Safari/537.36 Edge/18.19045',
+     ('Desktop', 'Windows', "{user}'s Windows PC", 'Chrome', '70.0.3538.102')),
+    ('Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko',
+     ('Desktop', 'Windows', "{user}'s Windows PC", 'Unknown', '')),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15',
+     ('Desktop', 'macOS', "{user}'s Mac", 'Safari', '')),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36',
+     ('Desktop', 'macOS', "{user}'s Mac", 'Chrome', '117.0.0.0')),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 14.0; rv:109.0) Gecko/20100101 Firefox/118.0',
+     ('Desktop', 'macOS', "{user}'s Mac", 'Firefox', '')),
+    ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36',
+     ('Desktop', 'Linux', "{user}'s Linux PC", 'Chrome', '117.0.0.0')),
+    ('Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/118.0',
+     ('Desktop', 'Linux', "{user}'s Linux PC", 'Firefox', '')),
+    ('Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36',
+     ('Unknown', 'Unknown OS', 'Unknown Device', 'Chrome', '116.0.0.0')),
+    ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) HeadlessChrome/117.0.5938.62 Safari/537.36',
+     ('Desktop', 'Linux', "{user}'s Linux PC", 'Chrome', '117.0.5938.62')),
+    ('python-requests/2.31.0',
+     ('Unknown', 'Unknown OS', 'Unknown Device', 'Unknown', '')),
+    ('curl/8.1.2',
+     ('Unknown', 'Unknown OS', 'Unknown Device', 'Unknown', '')),
+    ('Unknown',
+     ('Unknown', 'Unknown OS', 'Unknown Device', 'Unknown', '')),
+    ('',
+     ('Unknown', 'Unknown OS', 'Unknown Device', 'Unknown', '')),
+    ('Mozilla/5.0 Chrome/120.0.0.0',
+     ('Unknown', 'Unknown OS', 'Unknown Device', 'Chrome', '')),
+    ('Mozilla/5.0 (Linux; Android 13) Chrome/120.0.0.0;wv',
+     ('Mobile', 'Android', 'Android Phone', 'Chrome', '120.0.0.0')),
+]
+
+class FakeRequest:
+    """Just enough of a Flask request for get_device_info()"""
+    def __init__(self, user_agent):
+        self.headers = {'User-Agent': user_agent}
+        self.remote_addr = '192.168.1.20'
+
+def legacy_get_device_info(request):
+    """The old get_device_info(), kept verbatim as the baseline"""
+    user_agent = request.headers.get('User-Agent', 'Unknown')
+    
+    # Enhanced device detection
+    device_type = 'Unknown'
+    device_name = 'Unknown Device'
+    os_name = 'Unknown OS'
+    pc_username = 'Unknown User'
+    
+    # Try to get PC username for desktop devices
+    try:
+        import getpass
+        pc_username = getpass.getuser()
+    except:
+        pc_username = 'Unknown User'
+    
+    # Detect operating system and extract specific device info
+    # Check for mobile devices first (Android, iPhone, etc.)
+    if 'Android' in user_agent:
+        os_name = 'Android'
+        device_type = 'Mobile'
+        
+        # Enhanced Android device detection
+        device_model = 'Android Phone'
+        
+        # iQOO devices (added support)
+        if 'iQOO' in user_agent or 'IQOO' in user_agent:
+            device_model = 'iQOO Phone'
+        # Samsung devices
+        elif 'SM-' in user_agent or 'Samsung' in user_agent:
+            # Try to extract Samsung model
+            if 'SM-G' in user_agent:
+                device_model = 'Samsung Galaxy S Series'
+            elif 'SM-N' in user_agent:
+                device_model = 'Samsung Galaxy Note'
+            elif 'SM-A' in user_agent:
+                device_model = 'Samsung Galaxy A Series'
+            elif 'SM-T' in user_agent:
+                device_model = 'Samsung Galaxy Tab'
+            else:
+                device_model = 'Samsung Phone'
+        
+        # Xiaomi devices
+        elif 'Xiaomi' in user_agent or 'MI ' in user_agent:
+            if 'Redmi' in user_agent:
+                device_model = 'Xiaomi Redmi'
+            elif 'POCO' in user_agent:
+                device_model = 'POCO Phone'
+            else:
+                device_model = 'Xiaomi Phone'
+        
+        # OnePlus devices
+        elif 'OnePlus' in user_agent:
+            device_model = 'OnePlus Phone'
+        
+        # Huawei devices
+        elif 'Huawei' in user_agent:
+            device_model = 'Huawei Phone'
+        
+        # Google devices
+        elif 'Google' in user_agent or 'Pixel' in user_agent:
+            device_model = 'Google Pixel'
+        
+        # Motorola devices
+        elif 'Motorola' in user_agent or 'Moto' in user_agent:
+            device_model = 'Motorola Phone'
+        
+        # OPPO devices
+        elif 'OPPO' in user_agent:
+            device_model = 'OPPO Phone'
+        
+        # Vivo devices
+        elif 'Vivo' in user_agent:
+            device_model = 'Vivo Phone'
+        
+        # Realme devices
+        elif 'Realme' in user_agent:
+            device_model = 'Realme Phone'
+        
+        # Try to extract specific model number
+        import re
+        model_patterns = [
+            r'iQOO [0-9]+',    # iQOO models (prioritize iQOO)
+            r'SM-[A-Z0-9]+',   # Samsung models
+            r'MI [0-9]+',      # Xiaomi models
+            r'Pixel [0-9]+',   # Google Pixel models
+            r'iPhone [0-9,]+', # iPhone models
+        ]
+        
+        for pattern in model_patterns:
+            match = re.search(pattern, user_agent)
+            if match:
+                # For Samsung, keep the brand name but add model
+                if 'SM-' in match.group() and 'Samsung' in device_model:
+                    device_model = f"{device_model} ({match.group()})"
+                else:
+                    device_model = match.group()
+                break
+        
+        device_name = device_model
+        
+    elif 'iPhone' in user_agent:
+        os_name = 'iOS'
+        device_type = 'Mobile'
+        
+        # Try to extract iPhone model
+        import re
+        iphone_match = re.search(r'iPhone [0-9,]+', user_agent)
+        if iphone_match:
+            device_name = iphone_match.group()
+        else:
+            device_name = 'iPhone'
+            
+    elif 'iPad' in user_agent:
+        os_name = 'iOS'
+        device_type = 'Tablet'
+        
+        # Try to extract iPad model
+        import re
+        ipad_match = re.search(r'iPad [A-Z0-9]+', user_agent)
+        if ipad_match:
+            device_name = ipad_match.group()
+        else:
+            device_name = 'iPad'
+            
+    elif 'Tablet' in user_agent:
+        device_type = 'Tablet'
+        device_name = 'Android Tablet'
+    
+    # Desktop detection (after mobile/tablet detection)
+    elif 'Windows' in user_agent:
+        os_name = 'Windows'
+        device_type = 'Desktop'
+        device_name = f"{pc_username}'s Windows PC"
+    elif 'Mac' in user_agent:
+        os_name = 'macOS'
+        device_type = 'Desktop'
+        device_name = f"{pc_username}'s Mac"
+    elif 'Linux' in user_agent:
+        os_name = 'Linux'
+        device_type = 'Desktop'
+        device_name = f"{pc_username}'s Linux PC"
+    
+    # Enhanced browser detection
+    browser = 'Unknown'
+    browser_version = ''
+    if 'Chrome' in user_agent:
+        browser = 'Chrome'
+        # Try to extract version
+        if 'Chrome/' in user_agent:
+            version_start = user_agent.find('Chrome/') + 7
+            version_end = user_agent.find(' ', version_start)
+            if version_end == -1:
+                version_end = user_agent.find(';', version_start)
+            if version_end != -1:
+                browser_version = user_agent[version_start:version_end]
+    elif 'Firefox' in user_agent:
+        browser = 'Firefox'
+    elif 'Safari' in user_agent and 'Chrome' not in user_agent:
+        browser = 'Safari'
+    elif 'Edge' in user_agent:
+        browser = 'Edge'
+    
+    # Create a friendly display name
+    if device_type == 'Desktop':
+        display_name = f"{device_name} ({browser})"
+    else:
+        display_name = f"{device_name} ({browser})"
+    
+    if browser_version:
+        display_name = f"{device_name} ({browser} {browser_version})"
+    
+    return {
+        'type': device_type,
+        'browser': browser,
+        'browser_version': browser_version,
+        'os_name': os_name,
+        'device_name': device_name,
+        'display_name': display_name,
+        'pc_username': pc_username,
+        'user_agent': user_agent,
+        'ip': request.remote_addr,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def check_golden(app):
+    """Compare the classifier with the golden corpus and the old implementation; returns mismatches"""
+    failures = []
+    for user_agent, expected in GOLDEN_USER_AGENTS:
+        expected_type, os_name, device_name, browser, browser_version = expected
+        expected = (expected_type, os_name, device_name.format(user=app.PC_USERNAME), browser, browser_version)
+        info = app.get_device_info(FakeRequest(user_agent))
+        legacy = legacy_get_device_info(FakeRequest(user_agent))
+        got = (info['type'], info['os_name'], info['device_name'], info['browser'], info['browser_version'])
+        info.pop('timestamp')
+        legacy.pop('timestamp')
+        if got != expected or info != legacy:
+            failures.append((user_agent, expected, got))
+    return failures
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    os.chdir(tempfile.mkdtemp(prefix='simpleshare_bench_'))  # app.py creates its folders relative to the cwd
+    import app
+
+    failures = check_golden(app)
+    for user_agent, expected, got in failures:
+        print(f"MISMATCH {user_agent!r}\n  expected {expected}\n  got      {got}")
+    if failures:
+        sys.exit(1)
+    print(f"{len(GOLDEN_USER_AGENTS)} golden User-Agents classify identically")
+
+    # A classroom reconnecting: many requests from a handful of distinct phones
+    burst = [FakeRequest(GOLDEN_USER_AGENTS[i % 8][0]) for i in range(requests)]
+    distinct = [FakeRequest(user_agent) for user_agent, _ in GOLDEN_USER_AGENTS]
+    print(f"{'workload':>22} {'legacy us':>10} {'cached us':>10} {'speedup':>8}")
+    for label, workload in ((f'{requests} reconnects', burst), ('distinct (cold)', distinct)):
+        start = time.perf_counter()
+        for request in workload:
+            legacy_get_device_info(request)
+        legacy_us = (time.perf_counter() - start) / len(workload) * 1e6
+        if label.startswith('distinct'):
+            app.classify_user_agent.cache_clear()
+        start = time.perf_counter()
+        for request in workload:
+            app.get_device_info(request)
+        cached_us = (time.perf_counter() - start) / len(workload) * 1e6
+        print(f"{label:>22} {legacy_us:>10.1f} {cached_us:>10.1f} {legacy_us / cached_us:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
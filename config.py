@@ -19,11 +19,14 @@ ALLOWED_EXTENSIONS = {
 SESSION_ENABLED = True    # Enable/disable session management
 SESSION_TIMEOUT = 86400   # Session timeout in seconds (24 hours)
 MAX_SESSIONS = 100        # Maximum number of active sessions
+SESSION_STORE = 'memory'  # 'memory', or 'sqlite' to keep sessions across restarts and share them between processes
+SESSION_DB_PATH = 'storage/sessions.db'  # SQLite session database used when SESSION_STORE = 'sqlite'
 
 # Real-time Updates Configuration
 AUTO_REFRESH_INTERVAL = 10  # File list refresh interval in seconds
 REALTIME_UPDATES = True   # Enable real-time file event updates
-SYSTEM_INFO_UPDATE_INTERVAL = 30  # System info update interval in seconds
+SYSTEM_INFO_UPDATE_INTERVAL = 30  # Seconds between system info samples; changes are pushed to open pages
+DEVICE_BROADCAST_WINDOW = 0.25  # Seconds of device list changes batched into one devices_delta message
 
 # UI Configuration
 DEFAULT_THEME = 'sci-fi-theme'  # Default theme: sci-fi-theme, day-theme, night-theme
@@ -49,6 +52,9 @@ APP_DESCRIPTION = 'Futuristic File Transfer Application'
 UPLOAD_FOLDER = 'static/uploads'
 DOWNLOAD_FOLDER = 'static/downloads'
 TEMP_FOLDER = 'temp'  # Temporary files folder
+DEDUP_STORAGE = False  # Store identical uploads once (shared files become hard links into BLOB_FOLDER)
+BLOB_FOLDER = 'storage/blobs'  # Content-addressed blob store used when DEDUP_STORAGE is on
+THUMBNAIL_FOLDER = 'storage/thumbnails'  # Image thumbnail cache used when ENABLE_FILE_PREVIEW is on
 
 # Logging Configuration
 LOG_LEVEL = 'INFO'  # DEBUG, INFO, WARNING, ERROR
@@ -61,20 +67,33 @@ CORS_ENABLED = True     # Enable CORS for cross-origin requests
 CORS_ORIGINS = ['*']    # Allowed CORS origins
 
 # Performance Configuration
+PRODUCTION_SERVER = False  # Serve on a gevent event loop (same as running app.py --production)
 WORKER_THREADS = 4      # Number of worker threads
+WORKER_PROCESSES = 1    # Production server processes sharing the port (app.py --workers N); needs fork, so not on Windows
+STATE_BROKER = None     # 'host:port' of a shared state broker (python shared_state.py); one is started locally for WORKER_PROCESSES > 1
 CONNECTION_TIMEOUT = 30  # Connection timeout in seconds
 UPLOAD_TIMEOUT = 300    # Upload timeout in seconds
+UPLOAD_BUFFER_SIZE = 1024 * 1024  # Bytes of an upload read from the network per disk write
+UPLOAD_PREALLOCATE = True  # Reserve disk space for an upload before writing it; turn off on FAT/exFAT drives, where reserving means writing zeros
+UPLOAD_MIN_FREE_MB = 512  # Refuse uploads that would leave less free disk space than this (0 = no check)
 
 # Feature Flags
 ENABLE_QR_CODE = True    # Enable QR code generation
 ENABLE_SYSTEM_INFO = True  # Enable system information display
-ENABLE_FILE_PREVIEW = False  # Enable file preview (experimental)
+ENABLE_FILE_PREVIEW = False  # Show image thumbnails in the file list
+THUMBNAIL_SIZE = 256      # Longest side of a thumbnail in pixels
+THUMBNAIL_WORKERS = 2     # Processes rendering thumbnails
 ENABLE_BATCH_OPERATIONS = True  # Enable batch file operations
+BATCH_UPLOAD_MAX_FILES = 200  # Most files accepted in one batch upload request
+BATCH_UPLOAD_MAX_MB = 32  # Browsers put small files into batch requests of up to this size; larger files upload in chunks
+BATCH_UPLOAD_CONCURRENCY = 3  # Batch requests a browser keeps in flight at once
 ENABLE_SEARCH = True     # Enable file search functionality
 
 # Device Tracking Configuration
 DEVICE_TRACKING_ENABLED = True  # Enable device tracking
 MAX_DEVICE_HISTORY = 50  # Maximum number of device events to store
+MAX_FILE_EVENT_HISTORY = 100  # Maximum number of file events to store
+EVENT_LOG_FILE = None  # e.g. 'storage/events.log': append-only file that keeps event history across restarts
 DEVICE_TIMEOUT_SECONDS = 30  # Timeout for device connection status
 DEVICE_DETECTION_ENABLED = True  # Enable automatic device type detection
 
@@ -107,9 +126,13 @@ BACKUP_RETENTION = 7     # Number of days to keep backups
 
 # Monitoring Configuration
 ENABLE_MONITORING = True  # Enable system monitoring
-MONITORING_INTERVAL = 60  # Monitoring update interval in seconds
+MONITORING_INTERVAL = 10  # Seconds between resource samples
+MONITORING_HISTORY = 360  # Samples kept per metric (an hour at the default interval)
 ALERT_THRESHOLD_CPU = 80  # CPU usage alert threshold
 ALERT_THRESHOLD_MEMORY = 80  # Memory usage alert threshold
 ALERT_THRESHOLD_DISK = 90  # Disk usage alert threshold
+ENABLE_REQUEST_METRICS = True  # Time requests, count transferred bytes and Socket.IO traffic, served at /metrics
+ENABLE_PROFILING = False  # Sampling profiler admin API and per-request cProfile on request, for requests from this machine
+PROFILER_MAX_SECONDS = 300  # Longest sampling profile the admin API will take
 
 # Owner: R ! Y 4 Z 
\ No newline at end of file
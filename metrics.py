@@ -0,0 +1,129 @@
+# Credits: R ! Y 4 Z
+"""In-process metrics for SimpleShare in the Prometheus text format.
+
+Counter, Gauge and Histogram keep a value (or a set of bucket counts) per
+combination of label values; MetricsRegistry renders every metric for a
+/metrics endpoint. Updates take one lock and a dict lookup, cheap enough for
+every request and every Socket.IO packet. Numbers are per process, so with
+several workers each reports only what it served itself.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)  # seconds
+THROUGHPUT_BUCKETS = tuple(2 ** n for n in range(16, 33, 2))  # 64 KiB/s to 4 GiB/s
+SIZE_BUCKETS = tuple(4 ** n for n in range(3, 12))  # 64 B to 4 MiB
+
+def format_labels(names, values):
+    """{name="value",...} for a metric line, escaped as the text format requires"""
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def format_value(value):
+    """A sample value or bucket bound as the text format writes it"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base class: a named metric with a fixed list of label names"""
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # tuple of label values -> value
+        self.lock = threading.Lock()
+
+    def render(self):
+        """Text format lines of this metric"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, label_values)} {format_value(value)}')
+        return lines
+
+class Counter(Metric):
+    """A value that only goes up"""
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+class Gauge(Metric):
+    """A value that goes up and down, such as requests in flight"""
+    kind = 'gauge'
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(Metric):
+    """Observations counted into buckets, with their count and sum"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                # One count per bucket plus +Inf, then the sum
+                counts = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self):
+        """Text format lines: cumulative buckets, sum and count per label combination"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self.lock:
+            for label_values, counts in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{format_labels(names, label_values + (format_value(bound),))} {cumulative}')
+                labels = format_labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {format_value(counts[-1])}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+class MetricsRegistry:
+    """A set of metrics rendered together"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
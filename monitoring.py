@@ -0,0 +1,135 @@
+# Credits: R ! Y 4 Z
+"""Resource monitoring for SimpleShare.
+
+ResourceMonitor samples CPU, memory, free space on the volumes holding the
+shared folders, network throughput and this process's own usage with psutil.
+Each metric keeps its last history_size samples in a fixed-size ring buffer,
+aligned with a ring of sample timestamps, so memory use does not grow with
+uptime. Samples are compared against percent thresholds; an alert fires when
+a metric reaches its threshold and resolves once it has dropped
+ALERT_HYSTERESIS points below it, so a value hovering at the line doesn't
+flap.
+"""
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+
+import psutil
+
+ALERT_HYSTERESIS = 5  # Percentage points below the threshold before an alert resolves
+
+class ResourceMonitor:
+    """Samples system and process metrics into ring buffers and tracks threshold alerts"""
+
+    def __init__(self, folders, history_size, thresholds):
+        """folders maps a name to a folder whose volume is watched; thresholds maps 'cpu', 'memory' and 'disk' to percents"""
+        self.history_size = history_size
+        self.timestamps = deque(maxlen=history_size)
+        self.history = {}  # metric -> deque of values, aligned with timestamps
+        self.lock = threading.Lock()
+        self.process = psutil.Process()
+        self.last_network = None  # (time, psutil net_io_counters) of the previous sample
+        self.firing = set()  # Metrics currently over their threshold
+
+        # Folders on the same volume would report the same numbers twice
+        self.disks = {}
+        devices = set()
+        for name, folder in folders.items():
+            device = os.stat(folder).st_dev
+            if device not in devices:
+                devices.add(device)
+                self.disks[name] = folder
+
+        self.thresholds = {'cpu_percent': thresholds.get('cpu'), 'memory_percent': thresholds.get('memory')}
+        self.labels = {'cpu_percent': 'CPU usage', 'memory_percent': 'Memory usage'}
+        for name in self.disks:
+            self.thresholds[f'disk_{name}_percent'] = thresholds.get('disk')
+            self.labels[f'disk_{name}_percent'] = f'Disk usage ({name})'
+
+        # The first percent readings only start the measurement
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+
+    def sample(self):
+        """Take and record one sample of every metric; returns {metric: value}"""
+        now = time.time()
+        memory = psutil.virtual_memory()
+        values = {
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': memory.percent,
+            'memory_available': memory.available
+        }
+        for name, folder in self.disks.items():
+            usage = psutil.disk_usage(folder)
+            values[f'disk_{name}_percent'] = usage.percent
+            values[f'disk_{name}_free'] = usage.free
+
+        network = psutil.net_io_counters()
+        if network and self.last_network:
+            elapsed = now - self.last_network[0]
+            if elapsed > 0:
+                values['network_sent_rate'] = (network.bytes_sent - self.last_network[1].bytes_sent) / elapsed
+                values['network_recv_rate'] = (network.bytes_recv - self.last_network[1].bytes_recv) / elapsed
+        self.last_network = (now, network) if network else None
+
+        with self.process.oneshot():
+            values['process_cpu_percent'] = self.process.cpu_percent(interval=None)
+            values['process_rss'] = self.process.memory_info().rss
+            values['process_threads'] = self.process.num_threads()
+            if hasattr(self.process, 'num_fds'):
+                values['process_fds'] = self.process.num_fds()
+
+        self.record(now, values)
+        return values
+
+    def record(self, timestamp, values):
+        """Append a sample; metrics missing from it get None so every ring stays aligned"""
+        with self.lock:
+            for metric in values:
+                if metric not in self.history:
+                    self.history[metric] = deque([None] * len(self.timestamps), maxlen=self.history_size)
+            self.timestamps.append(timestamp)
+            for metric, ring in self.history.items():
+                ring.append(values.get(metric))
+
+    def check_thresholds(self, values):
+        """Alerts for metrics that crossed their threshold, or dropped back under it, in this sample"""
+        alerts = []
+        for metric, threshold in self.thresholds.items():
+            value = values.get(metric)
+            if threshold is None or value is None:
+                continue
+            if metric not in self.firing and value >= threshold:
+                self.firing.add(metric)
+                state = 'firing'
+            elif metric in self.firing and value < threshold - ALERT_HYSTERESIS:
+                self.firing.discard(metric)
+                state = 'resolved'
+            else:
+                continue
+            alerts.append({
+                'metric': metric,
+                'label': self.labels[metric],
+                'value': value,
+                'threshold': threshold,
+                'state': state,
+                'timestamp': time.time()
+            })
+        return alerts
+
+    def get_history(self, metrics=None, since=None):
+        """Recorded samples newer than since (epoch seconds), optionally only some metrics.
+
+        Returns {'timestamps': [...], 'metrics': {metric: [...]}} with one value,
+        or None, per timestamp.
+        """
+        with self.lock:
+            timestamps = list(self.timestamps)
+            start = bisect_right(timestamps, since) if since is not None else 0
+            names = self.history.keys() if metrics is None else [m for m in metrics if m in self.history]
+            return {
+                'timestamps': timestamps[start:],
+                'metrics': {name: list(self.history[name])[start:] for name in names}
+            }
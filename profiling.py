@@ -0,0 +1,123 @@
+# Credits: R ! Y 4 Z
+"""Sampling profiler for SimpleShare.
+
+SamplingProfiler records the Python stack of every thread at a fixed
+interval for a limited time and writes how often each stack was seen as
+collapsed stacks: one "frame;frame;...;frame count" line per stack, the
+format flamegraph.pl, speedscope and similar tools read. It samples from a
+real OS thread with sys._current_frames(), so under gevent it sees whichever
+greenlet holds the main thread at each tick, including the hub when the
+server is idle or waiting on I/O. Nothing runs while no profile is being
+taken.
+"""
+import _thread
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+def real_thread_primitives():
+    """start_new_thread, allocate_lock, get_ident and sleep of the OS, even where gevent has patched them"""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return (monkey.get_original('_thread', 'start_new_thread'), monkey.get_original('_thread', 'allocate_lock'),
+                    monkey.get_original('_thread', 'get_ident'), monkey.get_original('time', 'sleep'))
+    except ImportError:
+        pass
+    return _thread.start_new_thread, _thread.allocate_lock, _thread.get_ident, time.sleep
+
+def frame_label(frame):
+    """function (file:line) of a frame's code, safe to use in a collapsed stack"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+def collapse_stack(frame, thread_name):
+    """The collapsed-stack line key for a frame: thread name, then frames from the outermost in"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name.replace(';', ':'))
+    return ';'.join(reversed(labels))
+
+class SamplingProfiler:
+    """Samples every thread's stack for a while and writes the counts to output_folder"""
+
+    def __init__(self, output_folder):
+        """Create it on the main thread, which gevent's patched threading can't name"""
+        self.output_folder = output_folder
+        self.start_thread, allocate_lock, self.get_ident, self.sleep = real_thread_primitives()
+        self.main_ident = self.get_ident()
+        self.lock = allocate_lock()
+        self.current = None  # The profile being taken
+        self.last_result = None  # Summary of the last finished profile
+
+    def start(self, seconds, interval):
+        """Start sampling every interval seconds for at most seconds; raises RuntimeError if already running"""
+        with self.lock:
+            if self.current:
+                raise RuntimeError('A profile is already running')
+            self.current = {'started': time.time(), 'seconds': seconds, 'interval': interval,
+                            'samples': 0, 'stop': False, 'stacks': Counter()}
+            run = self.current
+        self.start_thread(self.sample, (run,))
+        return self.status()
+
+    def stop(self):
+        """Ask a running profile to finish; its results are written within one interval"""
+        with self.lock:
+            if self.current:
+                self.current['stop'] = True
+        return self.status()
+
+    def status(self):
+        """Whether a profile is running, its progress and the last finished profile"""
+        with self.lock:
+            run = self.current
+            status = {'running': run is not None, 'last_result': self.last_result}
+            if run:
+                status.update({key: run[key] for key in ('started', 'seconds', 'interval', 'samples')})
+            return status
+
+    def sample(self, run):
+        """Sampling loop, on its own OS thread"""
+        own_ident = self.get_ident()
+        deadline = time.monotonic() + run['seconds']
+        try:
+            while not run['stop'] and time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                names.setdefault(self.main_ident, 'MainThread')
+                for ident, frame in sys._current_frames().items():
+                    if ident != own_ident:
+                        run['stacks'][collapse_stack(frame, names.get(ident, f'thread-{ident}'))] += 1
+                run['samples'] += 1
+                self.sleep(run['interval'])
+            result = self.write_result(run)
+        except Exception as e:
+            result = {'error': str(e)}
+        with self.lock:
+            self.current = None
+            self.last_result = result
+
+    def write_result(self, run):
+        """Write the collapsed stacks of a finished run; returns its summary"""
+        os.makedirs(self.output_folder, exist_ok=True)
+        filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed"
+        with open(os.path.join(self.output_folder, filename), 'w') as f:
+            for stack, count in run['stacks'].most_common():
+                f.write(f'{stack} {count}\n')
+
+        # Innermost frames with the most samples: where the time actually went
+        leaves = Counter()
+        for stack, count in run['stacks'].items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return {
+            'file': filename,
+            'started': run['started'],
+            'duration': time.time() - run['started'],
+            'samples': run['samples'],
+            'top_frames': leaves.most_common(20)
+        }
@@ -0,0 +1,271 @@
+# Credits: R ! Y 4 Z
+"""Session storage for SimpleShare.
+
+Sessions are plain dicts with numeric (epoch seconds) timestamps:
+session_id, token, device_ip, device_info, created_at, last_activity and
+expires_at. A session expires a fixed time after it was created; when the
+store is full the least recently active session is evicted.
+
+MemorySessionStore keeps everything in-process. SqliteSessionStore keeps
+sessions in a SQLite file so they survive restarts and can be shared by
+several worker processes on one machine.
+"""
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class MemorySessionStore:
+    """In-process sessions: O(1) lookup by token and by device, LRU order and an expiry heap"""
+
+    def __init__(self, timeout, max_sessions):
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # token -> session, least recently active first
+        self.device_tokens = {}  # device IP -> token
+        self.expiry_heap = []  # (expires_at, token)
+        self.session_counter = 0
+        self.lock = threading.Lock()
+
+    def _remove(self, token):
+        session = self.sessions.pop(token, None)
+        if session and self.device_tokens.get(session['device_ip']) == token:
+            del self.device_tokens[session['device_ip']]
+        return session
+
+    def _purge_expired(self, now):
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            expires_at, token = heapq.heappop(self.expiry_heap)
+            session = self.sessions.get(token)
+            if session and session['expires_at'] == expires_at:
+                self._remove(token)
+
+    def _touch(self, session, now, device_info=None):
+        session['last_activity'] = now
+        if device_info is not None:
+            session['device_info'] = device_info
+        self.sessions.move_to_end(session['token'])
+        return session
+
+    def purge_expired(self):
+        """Drop every session past its expiry time"""
+        with self.lock:
+            self._purge_expired(time.time())
+
+    def get(self, token, touch=False):
+        """The live session for a token, or None; touch marks it as active"""
+        now = time.time()
+        with self.lock:
+            self._purge_expired(now)
+            session = self.sessions.get(token)
+            if session and touch:
+                self._touch(session, now)
+            return session
+
+    def get_by_device(self, device_ip, touch=False):
+        """The live session of a device, or None; touch marks it as active"""
+        with self.lock:
+            token = self.device_tokens.get(device_ip)
+        return self.get(token, touch) if token else None
+
+    def create(self, token, device_info):
+        """Return the device's live session, refreshed, or start a new one under token.
+
+        Returns (session, is_new). Evicts the least recently active sessions to
+        stay within max_sessions.
+        """
+        device_ip = device_info.get('ip') or 'unknown'
+        now = time.time()
+        with self.lock:
+            self._purge_expired(now)
+            existing = self.sessions.get(self.device_tokens.get(device_ip))
+            if existing:
+                return self._touch(existing, now, device_info), False
+
+            while self.max_sessions and len(self.sessions) >= self.max_sessions:
+                self._remove(next(iter(self.sessions)))
+
+            self.session_counter += 1
+            session = {
+                'session_id': self.session_counter,
+                'token': token,
+                'device_ip': device_ip,
+                'device_info': device_info,
+                'created_at': now,
+                'last_activity': now,
+                'expires_at': now + self.timeout
+            }
+            self.sessions[token] = session
+            self.device_tokens[device_ip] = token
+            heapq.heappush(self.expiry_heap, (session['expires_at'], token))
+            return session, True
+
+    def remove(self, token):
+        """End a session"""
+        with self.lock:
+            return self._remove(token)
+
+    def all(self):
+        """Every live session, least recently active first"""
+        with self.lock:
+            self._purge_expired(time.time())
+            return list(self.sessions.values())
+
+    def count(self):
+        """Number of live sessions"""
+        with self.lock:
+            self._purge_expired(time.time())
+            return len(self.sessions)
+
+class SqliteSessionStore:
+    """Sessions in a SQLite database file, shared by every process that opens it.
+
+    Indexes on device, expiry and last activity give the same lookups, expiry
+    sweep and LRU eviction as the in-memory store. WAL mode lets several
+    processes read while one writes.
+    """
+
+    def __init__(self, path, timeout, max_sessions):
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                token TEXT NOT NULL UNIQUE,
+                device_ip TEXT NOT NULL,
+                device_info TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_activity REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_device ON sessions (device_ip);
+            CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at);
+            CREATE INDEX IF NOT EXISTS sessions_activity ON sessions (last_activity);
+        ''')
+
+    def _row_to_session(self, row):
+        session = dict(row)
+        session['device_info'] = json.loads(session['device_info'])
+        return session
+
+    def _purge_expired(self, now):
+        self.db.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+
+    def _touch(self, session, now, device_info=None):
+        session['last_activity'] = now
+        if device_info is None:
+            self.db.execute('UPDATE sessions SET last_activity = ? WHERE token = ?', (now, session['token']))
+        else:
+            session['device_info'] = device_info
+            self.db.execute('UPDATE sessions SET last_activity = ?, device_info = ? WHERE token = ?',
+                            (now, json.dumps(device_info), session['token']))
+        return session
+
+    def _fetch(self, column, value, now):
+        row = self.db.execute(f'SELECT * FROM sessions WHERE {column} = ? AND expires_at > ? ORDER BY session_id DESC LIMIT 1',
+                              (value, now)).fetchone()
+        return self._row_to_session(row) if row else None
+
+    def purge_expired(self):
+        """Drop every session past its expiry time"""
+        with self.lock:
+            self._purge_expired(time.time())
+
+    def get(self, token, touch=False):
+        """The live session for a token, or None; touch marks it as active"""
+        now = time.time()
+        with self.lock:
+            session = self._fetch('token', token, now)
+            if session and touch:
+                self._touch(session, now)
+            return session
+
+    def get_by_device(self, device_ip, touch=False):
+        """The live session of a device, or None; touch marks it as active"""
+        now = time.time()
+        with self.lock:
+            session = self._fetch('device_ip', device_ip, now)
+            if session and touch:
+                self._touch(session, now)
+            return session
+
+    def create(self, token, device_info):
+        """Return the device's live session, refreshed, or start a new one under token.
+
+        Returns (session, is_new). Evicts the least recently active sessions to
+        stay within max_sessions.
+        """
+        device_ip = device_info.get('ip') or 'unknown'
+        now = time.time()
+        with self.lock:
+            # IMMEDIATE takes the write lock up front, so two processes can't both create
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                self._purge_expired(now)
+                existing = self._fetch('device_ip', device_ip, now)
+                if existing:
+                    session, is_new = self._touch(existing, now, device_info), False
+                else:
+                    if self.max_sessions:
+                        self.db.execute('''
+                            DELETE FROM sessions WHERE token IN (
+                                SELECT token FROM sessions ORDER BY last_activity
+                                LIMIT max(0, (SELECT count(*) FROM sessions) - ? + 1))
+                        ''', (self.max_sessions,))
+                    cursor = self.db.execute('''
+                        INSERT INTO sessions (token, device_ip, device_info, created_at, last_activity, expires_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (token, device_ip, json.dumps(device_info), now, now, now + self.timeout))
+                    session = {
+                        'session_id': cursor.lastrowid,
+                        'token': token,
+                        'device_ip': device_ip,
+                        'device_info': device_info,
+                        'created_at': now,
+                        'last_activity': now,
+                        'expires_at': now + self.timeout
+                    }
+                    is_new = True
+                self.db.execute('COMMIT')
+            except Exception:
+                self.db.execute('ROLLBACK')
+                raise
+            return session, is_new
+
+    def remove(self, token):
+        """End a session"""
+        with self.lock:
+            session = self._fetch('token', token, 0)
+            self.db.execute('DELETE FROM sessions WHERE token = ?', (token,))
+            return session
+
+    def all(self):
+        """Every live session, least recently active first"""
+        with self.lock:
+            rows = self.db.execute('SELECT * FROM sessions WHERE expires_at > ? ORDER BY last_activity',
+                                   (time.time(),)).fetchall()
+            return [self._row_to_session(row) for row in rows]
+
+    def count(self):
+        """Number of live sessions"""
+        with self.lock:
+            return self.db.execute('SELECT count(*) FROM sessions WHERE expires_at > ?', (time.time(),)).fetchone()[0]
+
+def make_session_store(backend, timeout, max_sessions, db_path=None):
+    """Session store for the configured backend: 'memory' or 'sqlite'"""
+    if backend == 'sqlite':
+        return SqliteSessionStore(db_path, timeout, max_sessions)
+    if backend == 'memory':
+        return MemorySessionStore(timeout, max_sessions)
+    raise ValueError(f"Unknown session store '{backend}'")
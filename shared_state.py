@@ -0,0 +1,436 @@
+# Credits: R ! Y 4 Z
+"""State shared between SimpleShare server processes.
+
+MemoryState holds hashes and event logs in-process; it is what a single
+server uses. BrokerState exposes the same calls but keeps the data in a
+broker process, so every worker sees the same devices and events.
+BrokerManager is a Socket.IO client manager that fans broadcasts out to
+every worker through the same broker.
+
+The broker is a small stand-in for something like Redis: length-prefixed
+JSON frames over TCP, one thread per connection. app.py starts one on
+127.0.0.1 when run with several workers. To share one between machines,
+run it on its own and point STATE_BROKER at it:
+
+    python shared_state.py --host 0.0.0.0 --port 5055
+"""
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+from socketio.pubsub_manager import PubSubManager
+
+FRAME_HEADER = struct.Struct('>I')
+BROKER_RECONNECT_DELAY = 1  # seconds between attempts to reach the broker
+EVENT_LOG_COMPACT_LINES = 10000  # Rewrite the event log file after this many appends
+
+def add_range(ranges, start, end):
+    """Merge the range [start, end) into a sorted list of [start, end] ranges"""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+class EventLog:
+    """Fixed-capacity ring buffer of events numbered with increasing ids"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.count = 0
+        self.last_id = 0
+
+    def append(self, event):
+        """Number an event with the next id and store it, overwriting the oldest when full"""
+        self.last_id += 1
+        event['id'] = self.last_id
+        self.slots[self.last_id % self.capacity] = event
+        self.count = min(self.count + 1, self.capacity)
+        return event
+
+    def restore(self, event):
+        """Put back an event that already has an id, e.g. one read from the log file"""
+        self.last_id = event['id'] - 1
+        self.append(event)
+
+    def since(self, since=None):
+        """Events after id since (all retained ones when None), and whether none are missing"""
+        first_id = self.last_id - self.count + 1
+        start = first_id if since is None else max(since + 1, first_id)
+        events = [self.slots[event_id % self.capacity] for event_id in range(start, self.last_id + 1)]
+        return {
+            'events': events,
+            'last_id': self.last_id,
+            'complete': since is None or since >= first_id - 1
+        }
+
+    def resized(self, capacity):
+        """Copy keeping the newest events that fit in capacity"""
+        log = EventLog(capacity)
+        for event in self.since()['events'][-capacity:]:
+            log.restore(event)
+        log.last_id = self.last_id
+        return log
+
+class MemoryState:
+    """Hashes and event logs held in this process.
+    
+    With event_log_path, every logged event is also appended to that file as a
+    JSON line, and the logs are refilled from it on startup.
+    """
+
+    def __init__(self, event_log_path=None):
+        self.hashes = {}  # name -> {key: value}
+        self.logs = {}  # name -> EventLog
+        self.lock = threading.Lock()
+        self.event_log_path = event_log_path
+        self.event_log_file = None
+        self.event_log_lines = 0
+        if event_log_path:
+            self._load_event_log()
+
+    def _load_event_log(self):
+        directory = os.path.dirname(self.event_log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        loaded = {}
+        try:
+            with open(self.event_log_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn write from a crash
+                    loaded.setdefault(record.pop('log'), []).append(record)
+                    self.event_log_lines += 1
+        except FileNotFoundError:
+            pass
+        for name, events in loaded.items():
+            # Capacity isn't known until the log is used; the first call trims it
+            log = self.logs[name] = EventLog(max(len(events), 1))
+            for event in events:
+                log.restore(event)
+        self.event_log_file = open(self.event_log_path, 'a')
+
+    def _write_event(self, name, event):
+        self.event_log_file.write(json.dumps(dict(event, log=name), separators=(',', ':')) + '\n')
+        self.event_log_file.flush()
+        self.event_log_lines += 1
+        if self.event_log_lines > EVENT_LOG_COMPACT_LINES:
+            # Keep only what the ring buffers still hold
+            temp_path = self.event_log_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                for log_name, log in self.logs.items():
+                    for logged in log.since()['events']:
+                        f.write(json.dumps(dict(logged, log=log_name), separators=(',', ':')) + '\n')
+            self.event_log_file.close()
+            os.replace(temp_path, self.event_log_path)
+            self.event_log_file = open(self.event_log_path, 'a')
+            self.event_log_lines = sum(log.count for log in self.logs.values())
+
+    def _get_log(self, name, capacity):
+        log = self.logs.get(name)
+        if log is None:
+            log = self.logs[name] = EventLog(capacity)
+        elif log.capacity != capacity:
+            log = self.logs[name] = log.resized(capacity)
+        return log
+
+    def hset(self, name, key, value):
+        """Store value under key in hash name"""
+        with self.lock:
+            self.hashes.setdefault(name, {})[key] = value
+
+    def hget(self, name, key):
+        """Value under key in hash name, or None"""
+        with self.lock:
+            return self.hashes.get(name, {}).get(key)
+
+    def hdel(self, name, key):
+        """Remove key from hash name; returns the removed value or None"""
+        with self.lock:
+            return self.hashes.get(name, {}).pop(key, None)
+
+    def hdel_older(self, name, key, field, cutoff):
+        """Remove key from hash name if its value[field] is below cutoff, in one step; returns the removed value or None"""
+        with self.lock:
+            value = self.hashes.get(name, {}).get(key)
+            if value is None or value.get(field, cutoff) >= cutoff:
+                return None
+            return self.hashes[name].pop(key)
+
+    def hupdate(self, name, key, updates):
+        """Apply updates to the value under key in hash name, in one step; returns it, or None if key isn't there"""
+        with self.lock:
+            value = self.hashes.get(name, {}).get(key)
+            if value is None:
+                return None
+            value.update(updates)
+            return dict(value)
+
+    def hadd_range(self, name, key, field, start, end, updates=None):
+        """Merge [start, end) into the range list value[field] of key in hash name and apply updates, in one step.
+        
+        Returns the updated value, or None if key isn't there.
+        """
+        with self.lock:
+            value = self.hashes.get(name, {}).get(key)
+            if value is None:
+                return None
+            value[field] = add_range(value.get(field, []), start, end)
+            value.update(updates or {})
+            return dict(value)
+
+    def hvalues(self, name):
+        """All values in hash name"""
+        with self.lock:
+            return list(self.hashes.get(name, {}).values())
+
+    def hlen(self, name):
+        """Number of keys in hash name"""
+        with self.lock:
+            return len(self.hashes.get(name, {}))
+
+    def log_event(self, name, event, capacity):
+        """Add an event to log name, keeping the newest capacity events; returns it with its id"""
+        with self.lock:
+            event = self._get_log(name, capacity).append(event)
+            if self.event_log_file:
+                self._write_event(name, event)
+            return event
+
+    def events_since(self, name, since, capacity):
+        """Events in log name after id since, as {events, last_id, complete}; see EventLog.since"""
+        with self.lock:
+            return self._get_log(name, capacity).since(since)
+
+# Calls the broker answers on behalf of its MemoryState
+BROKER_STATE_OPS = {'hset', 'hget', 'hdel', 'hdel_older', 'hupdate', 'hadd_range', 'hvalues', 'hlen', 'log_event', 'events_since'}
+
+def send_frame(sock, message):
+    """Send one JSON message"""
+    data = json.dumps(message, separators=(',', ':')).encode()
+    sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+def recv_exact(sock, size):
+    """Read exactly size bytes, or None if the connection closed"""
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def recv_frame(sock):
+    """Receive one JSON message, or None if the connection closed"""
+    header = recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    data = recv_exact(sock, FRAME_HEADER.unpack(header)[0])
+    return None if data is None else json.loads(data)
+
+def parse_address(address):
+    """'host:port' -> (host, port)"""
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+class Broker:
+    """Serves a MemoryState and pub/sub channels to BrokerClient connections"""
+
+    def __init__(self, event_log_path=None):
+        self.state = MemoryState(event_log_path)
+        self.subscribers = {}  # channel -> {socket: send lock}
+        self.lock = threading.Lock()
+
+    def serve(self, listener):
+        """Accept connections forever, one thread each"""
+        while True:
+            conn, _ = listener.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def publish(self, channel, message):
+        """Forward a message to every subscriber of channel"""
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, {}).items())
+        for conn, send_lock in subscribers:
+            try:
+                with send_lock:
+                    send_frame(conn, {'channel': channel, 'message': message})
+            except OSError:
+                pass  # Its own handler thread cleans up
+
+    def handle(self, conn):
+        """Answer requests from one connection until it closes"""
+        channels = []
+        try:
+            while True:
+                request = recv_frame(conn)
+                if request is None:
+                    break
+                op, args = request['op'], request['args']
+                if op == 'subscribe':
+                    with self.lock:
+                        self.subscribers.setdefault(args[0], {})[conn] = threading.Lock()
+                    channels.append(args[0])
+                elif op == 'publish':
+                    self.publish(*args)  # Fire and forget, no reply
+                elif op in BROKER_STATE_OPS:
+                    send_frame(conn, {'result': getattr(self.state, op)(*args)})
+                else:
+                    send_frame(conn, {'error': f"Unknown operation '{op}'"})
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error in state broker connection: {e}")
+        finally:
+            with self.lock:
+                for channel in channels:
+                    self.subscribers.get(channel, {}).pop(conn, None)
+            conn.close()
+
+def make_broker_listener(host='127.0.0.1', port=0):
+    """Listening socket for a broker; port 0 picks a free one"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    return listener
+
+def connect_to_broker(address):
+    """Open a connection to the broker at 'host:port'"""
+    sock = socket.create_connection(parse_address(address))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+class BrokerClient:
+    """Request/response connection to a broker, reconnecting after errors"""
+
+    def __init__(self, address):
+        self.address = address
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def call(self, op, *args, reply=True):
+        """Run op on the broker and return its result"""
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.sock = connect_to_broker(self.address)
+                send_frame(self.sock, {'op': op, 'args': args})
+                if not reply:
+                    return None
+                response = recv_frame(self.sock)
+            except OSError:
+                self.close()
+                raise
+            if response is None:
+                self.close()
+                raise ConnectionError('State broker closed the connection')
+            if 'error' in response:
+                raise RuntimeError(response['error'])
+            return response['result']
+
+    def close(self):
+        """Drop the connection; the next call reconnects"""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class BrokerState:
+    """MemoryState calls answered by a broker, shared by every process using it"""
+
+    def __init__(self, address):
+        self.client = BrokerClient(address)
+
+    def hset(self, name, key, value):
+        """Store value under key in hash name"""
+        self.client.call('hset', name, key, value)
+
+    def hget(self, name, key):
+        """Value under key in hash name, or None"""
+        return self.client.call('hget', name, key)
+
+    def hdel(self, name, key):
+        """Remove key from hash name; returns the removed value or None"""
+        return self.client.call('hdel', name, key)
+
+    def hdel_older(self, name, key, field, cutoff):
+        """Remove key from hash name if its value[field] is below cutoff, atomically on the broker; returns it or None"""
+        return self.client.call('hdel_older', name, key, field, cutoff)
+
+    def hupdate(self, name, key, updates):
+        """Apply updates to the value under key in hash name, atomically on the broker; None if key isn't there"""
+        return self.client.call('hupdate', name, key, updates)
+
+    def hadd_range(self, name, key, field, start, end, updates=None):
+        """Merge [start, end) into value[field] of key in hash name and apply updates, atomically on the broker"""
+        return self.client.call('hadd_range', name, key, field, start, end, updates)
+
+    def hvalues(self, name):
+        """All values in hash name"""
+        return self.client.call('hvalues', name)
+
+    def hlen(self, name):
+        """Number of keys in hash name"""
+        return self.client.call('hlen', name)
+
+    def log_event(self, name, event, capacity):
+        """Add an event to log name, keeping the newest capacity events; returns it with its id"""
+        return self.client.call('log_event', name, event, capacity)
+
+    def events_since(self, name, since, capacity):
+        """Events in log name after id since, as {events, last_id, complete}; see EventLog.since"""
+        return self.client.call('events_since', name, since, capacity)
+
+class BrokerManager(PubSubManager):
+    """Socket.IO client manager that relays emits to other workers through a broker"""
+    name = 'simpleshare-broker'
+
+    def __init__(self, address, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = address
+        self.publisher = BrokerClient(address)
+
+    def _publish(self, data):
+        self.publisher.call('publish', self.channel, data, reply=False)
+
+    def _listen(self):
+        while True:
+            try:
+                sock = connect_to_broker(self.address)
+            except OSError:
+                time.sleep(BROKER_RECONNECT_DELAY)
+                continue
+            try:
+                send_frame(sock, {'op': 'subscribe', 'args': [self.channel]})
+                while True:
+                    frame = recv_frame(sock)
+                    if frame is None:
+                        break
+                    yield frame['message']
+            except OSError:
+                pass
+            finally:
+                sock.close()
+            time.sleep(BROKER_RECONNECT_DELAY)
+
+def make_state_backend(broker_address=None, event_log_path=None):
+    """Shared state through the broker at broker_address, or in-process state when None"""
+    return BrokerState(broker_address) if broker_address else MemoryState(event_log_path)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='SimpleShare state broker')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on')
+    parser.add_argument('--port', type=int, default=5055, help='port to listen on')
+    parser.add_argument('--event-log', help='append-only file that keeps event history across restarts')
+    args = parser.parse_args()
+    print(f"State broker listening on {args.host}:{args.port}")
+    Broker(args.event_log).serve(make_broker_listener(args.host, args.port))
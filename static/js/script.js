@@ -6,10 +6,7 @@ class SimpleShare {
         this.setupEventListeners();
         this.setupSocketIO();
         this.checkSession();
-        this.loadFiles();
-        this.setupAutoRefresh();
         this.setupSystemInfo();
-        this.requestDevices();
     }
 
     initializeElements() {
@@ -30,6 +27,27 @@ class SimpleShare {
         this.uploadResults = document.getElementById('uploadResults');
         this.fileList = document.getElementById('fileList');
         
+        // File list: loaded a page at a time and kept in sync by Socket.IO deltas
+        this.fileMap = new Map();
+        this.fileSeq = null;
+        this.fileCursor = null;
+        this.loadingMoreFiles = false;
+        this.fileSort = 'mtime';
+        this.fileOrder = 'desc';
+        this.filePageSize = 100;
+        this.searchActive = false;
+        // Search results: also loaded a page at a time
+        this.searchParams = null;
+        this.searchCursor = null;
+        this.searchResults = [];
+        this.searchRequest = 0; // Bumped per search, so a slow older response is dropped
+        
+        // Last file and device event ids seen, so a reconnect only replays what was missed
+        this.lastEventIds = { file: null };
+        
+        // Connected devices by sid, kept in sync by devices_delta messages
+        this.devices = new Map();
+        
         // Theme toggle
         this.themeToggle = document.getElementById('themeToggle');
         this.toggleIcon = this.themeToggle.querySelector('.toggle-icon');
@@ -72,6 +90,14 @@ class SimpleShare {
         this.fileInput.addEventListener('change', (e) => this.handleFileSelect(e, 'phone'));
         this.pcFileInput.addEventListener('change', (e) => this.handleFileSelect(e, 'pc'));
         
+        // Lazy-load more files when scrolling near the end of the list
+        this.fileList.addEventListener('scroll', () => {
+            const { scrollTop, clientHeight, scrollHeight } = this.fileList;
+            if (scrollTop + clientHeight >= scrollHeight - 200) {
+                this.loadMoreFiles();
+            }
+        });
+        
         // Drag and drop events
         this.setupDragAndDrop(this.uploadArea, 'phone');
         this.setupDragAndDrop(this.pcUploadArea, 'pc');
@@ -131,8 +157,15 @@ class SimpleShare {
         this.showLoading();
         
         try {
-            for (let i = 0; i < files.length; i++) {
-                const file = files[i];
+            const config = await this.getConfig();
+            let large = Array.from(files);
+            if (config.batch_operations) {
+                // Small files share batch requests; large ones keep the resumable chunked upload
+                const small = large.filter(file => file.size < config.batch_upload_max_bytes);
+                large = large.filter(file => file.size >= config.batch_upload_max_bytes);
+                await this.uploadBatches(small, type === 'phone' ? 'phone' : 'pc', config);
+            }
+            for (const file of large) {
                 await this.uploadFile(file, type);
             }
         } catch (error) {
@@ -166,17 +199,107 @@ class SimpleShare {
         }, 5000);
     }
 
+    filePageParams(cursor = null) {
+        const params = new URLSearchParams({
+            limit: this.filePageSize,
+            sort: this.fileSort,
+            order: this.fileOrder
+        });
+        if (cursor) params.append('cursor', cursor);
+        return params;
+    }
+
     async loadFiles() {
+        // First page over HTTP, then deltas from its sequence number onwards
         try {
-            const response = await fetch('/api/files');
-            const files = await response.json();
-            this.displayFiles(files);
+            const response = await fetch(`/api/files?${this.filePageParams()}`);
+            const page = await response.json();
+            this.fileMap = new Map(page.files.map(file => [`${file.folder}/${file.name}`, file]));
+            this.fileCursor = page.next_cursor;
+            this.fileSeq = page.seq;
+            this.renderFileMap();
+            if (this.socket && this.socket.connected) {
+                this.subscribeFiles();
+            }
         } catch (error) {
             this.showToast('Error loading files', 'error');
             this.displayFiles([]);
         }
     }
 
+    async loadMoreFiles() {
+        if (this.searchActive) return this.loadMoreSearchResults();
+        if (!this.fileCursor || this.loadingMoreFiles) return;
+        this.loadingMoreFiles = true;
+
+        try {
+            const response = await fetch(`/api/files?${this.filePageParams(this.fileCursor)}`);
+            const page = await response.json();
+            page.files.forEach(file => this.fileMap.set(`${file.folder}/${file.name}`, file));
+            this.fileCursor = page.next_cursor;
+            this.renderFileMap();
+        } catch (error) {
+            this.showToast('Error loading files', 'error');
+        } finally {
+            this.loadingMoreFiles = false;
+        }
+    }
+
+    subscribeFiles() {
+        this.socket.emit('subscribe_files', { since: this.fileSeq });
+    }
+
+    applyFilesDelta(delta) {
+        if (this.fileSeq === null) return; // First page still on its way
+
+        const changes = delta.changes.filter(change => change.seq > this.fileSeq);
+        if (changes.length === 0) return;
+        if (changes[0].seq !== this.fileSeq + 1) {
+            // Missed something: catch up from where we are
+            this.subscribeFiles();
+            return;
+        }
+
+        // Files past the last loaded page arrive with later pages instead
+        const loaded = Array.from(this.fileMap.values());
+        const lastLoaded = this.fileCursor && loaded.length ? loaded.sort((a, b) => this.compareFiles(a, b))[loaded.length - 1] : null;
+
+        changes.forEach(change => {
+            const key = `${change.folder}/${change.name}`;
+            if (change.op === 'remove') {
+                this.fileMap.delete(key);
+            } else if (this.fileMap.has(key) || !lastLoaded || this.compareFiles(change.file, lastLoaded) <= 0) {
+                this.fileMap.set(key, change.file);
+            }
+        });
+        this.fileSeq = delta.seq;
+        this.renderFileMap();
+    }
+
+    compareFiles(a, b) {
+        // Same ordering as the server's sort index: sort value, then folder, then name
+        const sortValue = (file) => {
+            if (this.fileSort === 'name') return file.name.toLowerCase();
+            if (this.fileSort === 'size') return file.size_bytes;
+            return file.mtime;
+        };
+        const keysA = [sortValue(a), a.folder, a.name];
+        const keysB = [sortValue(b), b.folder, b.name];
+        const direction = this.fileOrder === 'asc' ? 1 : -1;
+        for (let i = 0; i < keysA.length; i++) {
+            if (keysA[i] < keysB[i]) return -direction;
+            if (keysA[i] > keysB[i]) return direction;
+        }
+        return 0;
+    }
+
+    renderFileMap() {
+        // Search results stay on screen until the search is cleared
+        if (!this.searchActive) {
+            this.displayFiles(Array.from(this.fileMap.values()).sort((a, b) => this.compareFiles(a, b)));
+        }
+    }
+
     displayFiles(files) {
         if (files.length === 0) {
             this.fileList.innerHTML = `
@@ -202,7 +325,9 @@ class SimpleShare {
                         <input type="checkbox" class="file-checkbox" value="${file.name}" id="file-${file.name.replace(/[^a-zA-Z0-9]/g, '')}">
                         <label for="file-${file.name.replace(/[^a-zA-Z0-9]/g, '')}"></label>
                     </div>
-                    <div class="file-icon">${file.icon}</div>
+                    <div class="file-icon">${file.thumbnail
+                        ? `<img class="file-thumbnail" src="${file.thumbnail}" alt="${file.icon}" loading="lazy">`
+                        : file.icon}</div>
                     <div class="file-info">
                         <div class="file-name" title="${file.name}">${file.name}</div>
                         <div class="file-details">
@@ -305,30 +430,16 @@ class SimpleShare {
         });
     }
 
-    async downloadFile(filename) {
-        try {
-            this.showLoading();
-            const response = await fetch(`/api/download/${filename}`);
-            
-            if (response.ok) {
-                const blob = await response.blob();
-                const url = window.URL.createObjectURL(blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = filename;
-                document.body.appendChild(a);
-                a.click();
-                window.URL.revokeObjectURL(url);
-                document.body.removeChild(a);
-                this.showToast(`${filename} downloaded successfully!`, 'success');
-            } else {
-                this.showToast(`Error downloading ${filename}`, 'error');
-            }
-        } catch (error) {
-            this.showToast(`Error downloading ${filename}`, 'error');
-        } finally {
-            this.hideLoading();
-        }
+    downloadFile(filename) {
+        // Let the browser's download manager fetch the file directly so it
+        // can stream to disk and resume with Range requests
+        const a = document.createElement('a');
+        a.href = `/api/download/${encodeURIComponent(filename)}`;
+        a.download = filename;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        this.showToast(`Downloading ${filename}...`, 'success');
     }
 
     async deleteFile(filename) {
@@ -342,7 +453,6 @@ class SimpleShare {
 
             if (result.success) {
                 this.showToast(`${filename} deleted successfully!`, 'success');
-                this.loadFiles(); // Refresh the list
             } else {
                 this.showToast(`Error deleting ${filename}`, 'error');
             }
@@ -351,13 +461,6 @@ class SimpleShare {
         }
     }
 
-    setupAutoRefresh() {
-        // Auto-refresh file list every 30 seconds
-        setInterval(() => {
-            this.loadFiles();
-        }, 30000);
-    }
-
     showLoading() {
         this.loadingOverlay.classList.add('show');
     }
@@ -412,10 +515,17 @@ class SimpleShare {
         }
     }
 
+    async getConfig() {
+        if (!this.config) {
+            const response = await fetch('/api/config');
+            this.config = await response.json();
+        }
+        return this.config;
+    }
+
     async checkSession() {
         try {
-            const response = await fetch('/api/config');
-            const config = await response.json();
+            const config = await this.getConfig();
             
             if (config.session_enabled) {
                 // Check if we already have a valid token
@@ -552,56 +662,76 @@ class SimpleShare {
 
     // Real-time Updates
     setupSocketIO() {
-        this.socket = io();
+        // WebSocket first: with several server workers, a polling client's
+        // requests could be spread across workers that don't know its session
+        this.socket = io({ transports: ['websocket', 'polling'] });
+        this.socket.on('connect_error', () => {
+            // No WebSocket on this network: fall back to long-polling
+            this.socket.io.opts.transports = ['polling', 'websocket'];
+        });
         
         this.socket.on('connect', () => {
             console.log('Connected to server');
             this.createRealtimeIndicator(true);
+            if (this.fileSeq === null) {
+                this.loadFiles();
+            } else {
+                this.subscribeFiles();
+            }
+            this.socket.emit('replay_events', { file_since: this.lastEventIds.file });
             this.socket.emit('request_system_info');
-            this.startHeartbeat();
+            this.requestDevices(); // Deltas sent while disconnected were missed
         });
 
         this.socket.on('disconnect', () => {
             console.log('Disconnected from server');
             this.createRealtimeIndicator(false);
-            this.stopHeartbeat();
         });
 
         this.socket.on('file_event', (event) => {
-            this.handleFileEvent(event);
+            this.handleLoggedEvent('file', event);
+        });
+
+        this.socket.on('events_replay', (replay) => {
+            replay.file.events.forEach(event => this.handleLoggedEvent('file', event));
+            // Also resets the id if the server's event log started over
+            this.lastEventIds.file = replay.file.last_id;
+        });
+
+        this.socket.on('files_delta', (delta) => {
+            this.applyFilesDelta(delta);
+        });
+
+        this.socket.on('files_reset', () => {
+            this.loadFiles();
         });
 
         this.socket.on('system_info', (info) => {
             this.updateSystemInfo(info);
         });
 
-        this.socket.on('devices_update', (devices) => {
-            this.updateDevicesList(devices);
+        this.socket.on('resource_alert', (alert) => {
+            if (alert.state === 'firing') {
+                this.showNotification(`${alert.label} at ${Math.round(alert.value)}% (alert threshold ${alert.threshold}%)`, 'warning');
+            } else {
+                this.showNotification(`${alert.label} back to ${Math.round(alert.value)}%`, 'info');
+            }
         });
 
-        this.socket.on('devices_list', (devices) => {
-            this.updateDevicesList(devices);
+        this.socket.on('devices_delta', (delta) => {
+            this.applyDevicesDelta(delta);
         });
 
-        this.socket.on('device_event', (event) => {
-            this.handleDeviceEvent(event);
+        this.socket.on('devices_list', (devices) => {
+            this.setDevices(devices);
         });
     }
-    
-    startHeartbeat() {
-        // Send heartbeat every 5 seconds to keep connection alive (more frequent)
-        this.heartbeatInterval = setInterval(() => {
-            if (this.socket && this.socket.connected) {
-                this.socket.emit('heartbeat');
-            }
-        }, 5000); // Every 5 seconds instead of 10
-    }
-    
-    stopHeartbeat() {
-        if (this.heartbeatInterval) {
-            clearInterval(this.heartbeatInterval);
-            this.heartbeatInterval = null;
-        }
+
+    handleLoggedEvent(name, event) {
+        const lastId = this.lastEventIds[name];
+        if (lastId !== null && event.id <= lastId) return; // Already seen, e.g. live and in a replay
+        this.lastEventIds[name] = event.id;
+        this.handleFileEvent(event);
     }
 
     setupFileControls() {
@@ -706,14 +836,18 @@ class SimpleShare {
                     `File uploaded: ${data.filename} (${data.size})`,
                     'success'
                 );
-                this.loadFiles(); // Refresh file list
+                break;
+            case 'batch_upload':
+                this.showNotification(
+                    `${data.count} files uploaded (${data.size})`,
+                    'success'
+                );
                 break;
             case 'delete':
                 this.showNotification(
                     `File deleted: ${data.filename}`,
                     'warning'
                 );
-                this.loadFiles(); // Refresh file list
                 break;
         }
     }
@@ -724,18 +858,18 @@ class SimpleShare {
     }
 
     async updateSystemInfoPeriodically() {
-        try {
-            const response = await fetch('/api/system-info');
-            const info = await response.json();
-            this.updateSystemInfo(info);
-            
-            // Also request devices list
-            this.requestDevices();
-        } catch (error) {
-            console.error('Error updating system info:', error);
+        // While connected the server pushes system_info when it changes; poll only without a socket
+        if (!this.socket || !this.socket.connected) {
+            try {
+                const response = await fetch('/api/system-info');
+                const info = await response.json();
+                this.updateSystemInfo(info);
+            } catch (error) {
+                console.error('Error updating system info:', error);
+            }
         }
 
-        // Update every 30 seconds
+        // Check again in 30 seconds
         setTimeout(() => this.updateSystemInfoPeriodically(), 30000);
     }
 
@@ -746,17 +880,15 @@ class SimpleShare {
             this.maxFileSize.textContent = maxSize === 'Unlimited' ? 'Unlimited' : maxSize;
         }
         if (this.activeSessions) this.activeSessions.textContent = info.active_sessions || '--';
-        if (this.connectedDevices) this.connectedDevices.textContent = info.connected_devices || '--';
+        // The device count follows the live device list instead of the sampled snapshot
+        if (this.connectedDevices && this.devices.size === 0) {
+            this.connectedDevices.textContent = info.connected_devices || '--';
+        }
         
         // Start uptime timer only once, not on every update
         if (this.serverUptime && !this._uptimeStarted) {
             this.startGuaranteedUptimeTimer(info.server_start_time);
         }
-        
-        // Update devices list if available
-        if (info.devices_list) {
-            this.updateDevicesList(info.devices_list);
-        }
     }
 
     startGuaranteedUptimeTimer(serverStartTime) {
@@ -850,30 +982,27 @@ class SimpleShare {
         }
     }
 
-    // Enhanced file upload with progress
+    // Enhanced file upload with real progress over the chunked upload API
     async uploadFile(file, type) {
-        const formData = new FormData();
-        formData.append('file', file);
-
-        const endpoint = type === 'phone' ? '/api/upload' : '/api/upload-pc';
+        const source = type === 'phone' ? 'phone' : 'pc';
+        const resumeKey = `simpleShareUpload:${source}:${file.name}:${file.size}:${file.lastModified}`;
         
         try {
-            // Show progress
             this.showUploadProgress(file.name);
             
-            const response = await fetch(endpoint, {
-                method: 'POST',
-                body: formData
+            const upload = await this.startChunkedUpload(file, source, resumeKey);
+            await this.sendChunks(file, upload);
+            
+            const response = await fetch(`/api/upload/chunked/${upload.upload_id}/finalize`, {
+                method: 'POST'
             });
-
             const result = await response.json();
+            localStorage.removeItem(resumeKey);
 
             if (result.success) {
                 this.hideUploadProgress();
                 this.showNotification(`${file.name} uploaded successfully!`, 'success');
-                if (type === 'pc') {
-                    this.loadFiles(); // Refresh file list for PC uploads
-                } else {
+                if (type !== 'pc') {
                     this.addUploadResult(file.name, result.size, result.timestamp);
                 }
             } else {
@@ -882,31 +1011,181 @@ class SimpleShare {
             }
         } catch (error) {
             this.hideUploadProgress();
-            this.showNotification(`Error uploading ${file.name}`, 'error');
+            this.showNotification(`Error uploading ${file.name}: ${error.message || error}`, 'error');
+        }
+    }
+
+    async startChunkedUpload(file, source, resumeKey) {
+        // Resume an earlier attempt for the same file if the server still has it
+        const existingId = localStorage.getItem(resumeKey);
+        if (existingId) {
+            const response = await fetch(`/api/upload/chunked/${existingId}`);
+            if (response.ok) {
+                return await response.json();
+            }
+            localStorage.removeItem(resumeKey);
+        }
+
+        const response = await fetch('/api/upload/chunked', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ filename: file.name, size: file.size, source })
+        });
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error || 'Could not start upload');
+        }
+        localStorage.setItem(resumeKey, result.upload_id);
+        return result;
+    }
+
+    async sendChunks(file, upload) {
+        const maxRetries = 5;
+        let received = upload.received || [];
+        let retries = 0;
+
+        while (true) {
+            const gap = this.findMissingRange(received, file.size);
+            if (!gap) return;
+
+            const start = gap[0];
+            const end = Math.min(gap[1], start + upload.chunk_size);
+            const doneBefore = received.reduce((sum, r) => sum + (r[1] - r[0]), 0);
+
+            try {
+                const result = await this.putChunk(upload.upload_id, file.slice(start, end), start, (loaded) => {
+                    this.updateUploadProgress(doneBefore + loaded, file.size);
+                });
+                received = result.received;
+                retries = 0;
+            } catch (error) {
+                // Link dropped: ask the server what it kept and continue from there
+                if (++retries > maxRetries) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                const response = await fetch(`/api/upload/chunked/${upload.upload_id}`);
+                if (!response.ok) throw error;
+                received = (await response.json()).received;
+            }
+            this.updateUploadProgress(received.reduce((sum, r) => sum + (r[1] - r[0]), 0), file.size);
+        }
+    }
+
+    findMissingRange(received, size) {
+        let position = 0;
+        for (const [start, end] of received) {
+            if (start > position) return [position, start];
+            position = Math.max(position, end);
+        }
+        return position < size ? [position, size] : null;
+    }
+
+    putChunk(uploadId, blob, offset, onProgress) {
+        return this.sendWithProgress('PUT', `/api/upload/chunked/${uploadId}?offset=${offset}`, blob, onProgress,
+                                     'application/octet-stream');
+    }
+
+    // Small files in batch requests, a few in flight at once, with one progress bar for all
+    async uploadBatches(files, source, config) {
+        const allowed = new Set(config.allowed_extensions);
+        const batches = [];
+        let batch = null;
+        for (const file of files) {
+            const extension = file.name.includes('.') ? file.name.split('.').pop().toLowerCase() : '';
+            if (!allowed.has(extension)) {
+                this.showNotification(`Error uploading ${file.name}: File type not allowed`, 'error');
+                continue;
+            }
+            if (!batch || batch.files.length >= config.batch_upload_max_files ||
+                    batch.size + file.size > config.batch_upload_max_bytes) {
+                batch = { files: [], size: 0 };
+                batches.push(batch);
+            }
+            batch.files.push(file);
+            batch.size += file.size;
         }
+        if (batches.length === 0) return;
+
+        const total = batches.reduce((sum, b) => sum + b.size, 0);
+        const loaded = batches.map(() => 0);
+        let uploaded = 0;
+        this.showUploadProgress(`${files.length} files`);
+        await this.runQueue(batches.map((batch, index) => async () => {
+            const form = new FormData();
+            batch.files.forEach(file => form.append('files', file, file.name));
+            try {
+                const result = await this.sendWithProgress('POST', `/api/upload/batch?source=${source}`, form, (bytes) => {
+                    loaded[index] = bytes;
+                    this.updateUploadProgress(loaded.reduce((sum, n) => sum + n, 0), total);
+                });
+                uploaded += result.count;
+                if (source === 'phone') {
+                    result.files.forEach(file => this.addUploadResult(file.filename, file.size, file.timestamp));
+                }
+            } catch (error) {
+                this.showNotification(`Error uploading ${batch.files.length} files: ${error.message || error}`, 'error');
+            }
+        }), config.batch_upload_concurrency);
+        this.hideUploadProgress();
+        if (uploaded > 0) {
+            this.showNotification(`${uploaded} files uploaded successfully!`, 'success');
+        }
+    }
+
+    async runQueue(tasks, limit) {
+        // Each runner starts the next task as soon as its previous one settles
+        let next = 0;
+        const runner = async () => {
+            while (next < tasks.length) {
+                await tasks[next++]();
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(limit, tasks.length) }, runner));
+    }
+
+    sendWithProgress(method, url, body, onProgress, contentType = null) {
+        // XHR rather than fetch so we get upload progress events
+        return new Promise((resolve, reject) => {
+            const xhr = new XMLHttpRequest();
+            xhr.open(method, url);
+            if (contentType) {
+                xhr.setRequestHeader('Content-Type', contentType);
+            }
+            xhr.upload.onprogress = (e) => onProgress(e.loaded);
+            xhr.onload = () => {
+                let result = {};
+                try {
+                    result = JSON.parse(xhr.responseText);
+                } catch (error) {
+                    // Non-JSON body, handled below
+                }
+                if (xhr.status === 200 && result.success) {
+                    resolve(result);
+                } else {
+                    reject(new Error(result.error || `HTTP ${xhr.status}`));
+                }
+            };
+            xhr.onerror = () => reject(new Error('Network error'));
+            xhr.send(body);
+        });
     }
 
     showUploadProgress(filename) {
         this.uploadProgress.style.display = 'block';
         this.progressText.textContent = `Uploading ${filename}...`;
         this.progressFill.style.width = '0%';
-        
-        // Simulate progress (since we can't get real progress from fetch)
-        let progress = 0;
-        const progressInterval = setInterval(() => {
-            progress += Math.random() * 15;
-            if (progress > 90) progress = 90;
-            this.progressFill.style.width = `${progress}%`;
-        }, 200);
-        
-        this.currentProgressInterval = progressInterval;
+        this.currentUploadName = filename;
+    }
+
+    updateUploadProgress(loaded, total) {
+        const percent = total > 0 ? Math.min(100, (loaded / total) * 100) : 100;
+        this.progressFill.style.width = `${percent}%`;
+        this.progressText.textContent = `Uploading ${this.currentUploadName}... ${Math.floor(percent)}%`;
     }
 
     hideUploadProgress() {
         this.uploadProgress.style.display = 'none';
-        if (this.currentProgressInterval) {
-            clearInterval(this.currentProgressInterval);
-        }
         this.progressFill.style.width = '100%';
         setTimeout(() => {
             this.progressFill.style.width = '0%';
@@ -914,7 +1193,26 @@ class SimpleShare {
     }
 
     // Device Tracking Methods
+    setDevices(devices) {
+        this.devices = new Map(devices.map(device => [device.sid, device]));
+        this.updateDevicesList(Array.from(this.devices.values()));
+    }
+
+    applyDevicesDelta(delta) {
+        Object.entries(delta.updated).forEach(([sid, device]) => {
+            if (!this.devices.has(sid)) this.handleDeviceEvent('connect', device);
+            this.devices.set(sid, device);
+        });
+        delta.removed.forEach(sid => {
+            const device = this.devices.get(sid);
+            if (device) this.handleDeviceEvent('disconnect', device);
+            this.devices.delete(sid);
+        });
+        this.updateDevicesList(Array.from(this.devices.values()));
+    }
+
     updateDevicesList(devices) {
+        if (this.connectedDevices) this.connectedDevices.textContent = devices.length || '--';
         if (!this.devicesGrid) return;
 
         if (devices.length === 0) {
@@ -991,9 +1289,7 @@ class SimpleShare {
         return icons[deviceType] || icons['Unknown'];
     }
 
-    handleDeviceEvent(event) {
-        const { type, data, timestamp } = event;
-        
+    handleDeviceEvent(type, data) {
         switch (type) {
             case 'connect':
                 this.showNotification(
@@ -1027,17 +1323,51 @@ class SimpleShare {
 
     // Enhanced File Management
     async searchFiles(query, type = '', date = '') {
+        if (!query && !type && !date) {
+            this.searchActive = false;
+            this.searchRequest++;
+            this.renderFileMap();
+            return;
+        }
+        this.searchActive = true;
+        const request = ++this.searchRequest;
+
         try {
-            const params = new URLSearchParams();
+            const params = new URLSearchParams({ limit: this.filePageSize });
             if (query) params.append('q', query);
             if (type) params.append('type', type);
             if (date) params.append('date', date);
             
             const response = await fetch(`/api/search-files?${params}`);
-            const files = await response.json();
-            this.displayFiles(files);
+            const page = await response.json();
+            if (request !== this.searchRequest) return; // A newer search has started
+            this.searchParams = params;
+            this.searchResults = page.files;
+            this.searchCursor = page.next_cursor;
+            this.displayFiles(this.searchResults);
+        } catch (error) {
+            this.showNotification('Error searching files', 'error');
+        }
+    }
+
+    async loadMoreSearchResults() {
+        if (!this.searchCursor || this.loadingMoreFiles) return;
+        this.loadingMoreFiles = true;
+        const request = this.searchRequest;
+
+        try {
+            const params = new URLSearchParams(this.searchParams);
+            params.append('cursor', this.searchCursor);
+            const response = await fetch(`/api/search-files?${params}`);
+            const page = await response.json();
+            if (request !== this.searchRequest || !this.searchActive) return;
+            this.searchResults = this.searchResults.concat(page.files);
+            this.searchCursor = page.next_cursor;
+            this.displayFiles(this.searchResults);
         } catch (error) {
             this.showNotification('Error searching files', 'error');
+        } finally {
+            this.loadingMoreFiles = false;
         }
     }
 
@@ -1089,7 +1419,6 @@ class SimpleShare {
 
             if (result.success) {
                 this.showNotification(result.message, 'success');
-                this.loadFiles(); // Refresh file list
             } else {
                 this.showNotification('Error cleaning up files', 'error');
             }
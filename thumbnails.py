@@ -0,0 +1,64 @@
+# Credits: R ! Y 4 Z
+"""Image thumbnails for SimpleShare.
+
+render_thumbnail runs in a worker process, so this module imports only
+Pillow and the standard library. Thumbnails are JPEGs cached on disk under
+the SHA-256 of the source file and the thumbnail size, so identical images
+share one thumbnail and a changed file gets a new one.
+"""
+import hashlib
+import os
+
+from PIL import Image, ImageOps
+
+THUMBNAIL_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'tif', 'tiff'}
+THUMBNAIL_QUALITY = 80
+READ_SIZE = 1024 * 1024
+
+def thumbnail_path(cache_folder, digest, size):
+    """Cache location of the thumbnail of content digest at size pixels"""
+    return os.path.join(cache_folder, digest[:2], f'{digest}-{size}.jpg')
+
+def file_digest(path):
+    """SHA-256 of a file, read in blocks"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher.hexdigest()
+
+def render_thumbnail(source_path, cache_folder, size, digest=None):
+    """Make the thumbnail of an image, at most size pixels on a side, unless it is cached.
+
+    Returns the thumbnail's path, or None if Pillow can't read the image.
+    digest is the source's SHA-256 when the caller already knows it.
+    """
+    digest = digest or file_digest(source_path)
+    path = thumbnail_path(cache_folder, digest, size)
+    if os.path.exists(path):
+        return path
+
+    try:
+        with Image.open(source_path) as image:
+            image.draft('RGB', (size, size))  # JPEGs decode straight at a reduced scale
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+                # Flatten transparency onto white, JPEG has no alpha
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    image.save(temp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    os.replace(temp_path, path)  # Another worker may be writing the same thumbnail
+    return path